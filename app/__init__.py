@@ -5,21 +5,33 @@ from flasgger import Swagger
 from flask_sqlalchemy import SQLAlchemy
 from flask_security import Security, SQLAlchemyUserDatastore
 from flask_jwt_extended import JWTManager
-from werkzeug.security import generate_password_hash
 
 from dotenv import load_dotenv
 from config import ProdConfig, TestConfig
+from app.utils.events import EventBroker
+from app.utils.json_provider import FastJSONProvider
+from app.utils.metrics import MetricsRegistry, pool_status
+from app.utils.passwords import PasswordHasher
+from app.utils.profiling import RequestProfiler
+from app.utils.sqlite import register_sqlite_pragmas
 
 load_dotenv()
 
 db = SQLAlchemy()
 jwt = JWTManager()
+password_hasher = PasswordHasher()
+event_broker = EventBroker()
+request_profiler = RequestProfiler()
+metrics = MetricsRegistry()
 
 def create_app(config_name=None):
     if config_name is None:
         config_name = os.getenv('FLASK_ENV', 'prod')
 
     app = Flask(__name__)
+    # Before Security, which extends the provider class set at that point.
+    app.json_provider_class = FastJSONProvider
+    app.json = FastJSONProvider(app)
     swagger = Swagger(app, template={
         "swagger": "2.0",
         "info": {
@@ -43,41 +55,52 @@ def create_app(config_name=None):
     else:
         app.config.from_object(ProdConfig)
     
+    # Before the database, so that the pool times its checkouts.
+    metrics.init_app(app)
     db.init_app(app)
     jwt.init_app(app)
+    from app.utils.token_revocation import is_token_revoked
+    jwt.token_in_blocklist_loader(is_token_revoked)
+    password_hasher.init_app(app)
+    event_broker.init_app(app)
+    metrics.gauge('jouerflux_db_pool_checked_out', 'Pooled connections in use.',
+                  lambda: pool_status(db.engine.pool, 'checkedout'))
+    metrics.gauge('jouerflux_db_pool_size', 'Connections kept in the pool.',
+                  lambda: pool_status(db.engine.pool, 'size'))
+    metrics.gauge('jouerflux_db_pool_overflow', 'Connections opened beyond the pool size.',
+                  lambda: pool_status(db.engine.pool, 'overflow'))
+    metrics.gauge('jouerflux_password_hash_queue_depth', 'Password hashes running or waiting.',
+                  lambda: password_hasher.queue_depth)
+    metrics.gauge('jouerflux_event_subscribers', 'Open event streams.',
+                  lambda: event_broker.subscriber_count)
 
     from app.models.user import Role, User
     user_datastore = SQLAlchemyUserDatastore(db, User, Role)
     Security(app, user_datastore)
+    # After Security, which installs its own JSON provider.
+    request_profiler.init_app(app)
 
+    # The schema and the default users are set up once by the init-db and
+    # seed commands, not by every process start.
     with app.app_context():
-        from .models.firewall import Firewall
-        from .models.policy import Policy
-        from .models.rule import Rule
-        db.create_all() 
-        if not user_datastore.find_role("admin"):
-            user_datastore.create_role(name="admin", description="Admin Role")
-        if not user_datastore.find_role("user"):
-            user_datastore.create_role(name="user", description="User Role")
-        if not user_datastore.find_user(email="admin@example.com"):
-            user_datastore.create_user(
-                email="admin@example.com",
-                password=generate_password_hash("password", method='pbkdf2:sha256'),
-                roles=["admin"],
-                fs_uniquifier="admin@example.com"
-            )
-        db.session.commit()
-        print("Database initialized and default user created.")
+        register_sqlite_pragmas(db.engine, app.config['SQLITE_PRAGMAS'])
 
     from app.routes.firewall_route import firewall_bp
     from app.routes.policy_route import policy_bp    
     from app.routes.rule_route import rule_bp
     from app.routes.user_route import user_bp 
+    from app.routes.event_route import event_bp
+    from app.routes.metrics_route import metrics_bp
 
     API_VERSION = "/api/v1"
     app.register_blueprint(firewall_bp, url_prefix=f"{API_VERSION}/firewalls")
     app.register_blueprint(policy_bp, url_prefix=f"{API_VERSION}/firewalls")
     app.register_blueprint(rule_bp, url_prefix=f"{API_VERSION}/firewalls")
     app.register_blueprint(user_bp, url_prefix=f"{API_VERSION}/users")
+    app.register_blueprint(event_bp, url_prefix=f"{API_VERSION}/events")
+    app.register_blueprint(metrics_bp, url_prefix="/metrics")
+
+    from app.cli import register_commands
+    register_commands(app)
 
     return app
\ No newline at end of file
@@ -0,0 +1,63 @@
+import json
+import click
+from flask.cli import with_appcontext
+from app.migrations import init_db, upgrade
+from app.services.analysis_service import analyze_policy
+from app.services.firewall_service import export_config
+from app.services.user_service import seed_default_users
+from app.utils.serialization import to_ndjson
+
+
+@click.command('export-config')
+@click.option('--output', '-o', type=click.File('w'), default='-', help='Destination file, stdout by default.')
+@with_appcontext
+def export_config_command(output):
+    """Export the whole firewall configuration as NDJSON."""
+    for line in to_ndjson(export_config()):
+        output.write(line)
+
+
+@click.command('upgrade-db')
+@with_appcontext
+def upgrade_db_command():
+    """Bring the schema of an existing database up to date."""
+    changes = upgrade()
+    click.echo(f"Applied: {', '.join(changes)}" if changes else "Database already up to date.")
+
+
+@click.command('init-db')
+@with_appcontext
+def init_db_command():
+    """Create the database schema, or bring an existing one up to date."""
+    changes = init_db()
+    click.echo(f"Schema ready. Upgraded: {', '.join(changes)}" if changes else "Schema ready.")
+
+
+@click.command('seed')
+@click.option('--admin-email', envvar='ADMIN_EMAIL', default='admin@example.com', show_default=True)
+@click.option('--admin-password', envvar='ADMIN_PASSWORD', default='password', show_default=True)
+@with_appcontext
+def seed_command(admin_email, admin_password):
+    """Create the default roles and admin user, unless they exist."""
+    created = seed_default_users(admin_email, admin_password)
+    click.echo(f"Created: {', '.join(created)}" if created else "Nothing to seed.")
+
+
+@click.command('analyze-policy')
+@click.argument('policy_id', type=int)
+@with_appcontext
+def analyze_policy_command(policy_id):
+    """Report the duplicate, shadowed and mergeable rules of a policy as JSON."""
+    try:
+        report = analyze_policy(policy_id)
+    except ValueError as error:
+        raise click.ClickException(str(error))
+    click.echo(json.dumps(report, indent=2))
+
+
+def register_commands(app):
+    app.cli.add_command(export_config_command)
+    app.cli.add_command(init_db_command)
+    app.cli.add_command(seed_command)
+    app.cli.add_command(upgrade_db_command)
+    app.cli.add_command(analyze_policy_command)
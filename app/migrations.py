@@ -0,0 +1,113 @@
+"""
+Idempotent schema upgrades for databases created by older versions.
+
+``db.create_all()`` only creates missing tables; the steps below bring
+existing tables up to date and can safely run on every start.
+"""
+from app import db
+
+
+def add_missing_columns():
+    """
+    Add the model columns that existing tables lack. Columns are added as
+    nullable unless they declare a server default.
+    """
+    inspector = db.inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    added = []
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            definition = f'{column.name} {column.type.compile(dialect=db.engine.dialect)}'
+            if column.server_default is not None:
+                definition += f' NOT NULL DEFAULT {column.server_default.arg}'
+            with db.engine.begin() as connection:
+                connection.execute(db.text(f'ALTER TABLE {table.name} ADD COLUMN {definition}'))
+            added.append(f'{table.name}.{column.name}')
+    return added
+
+
+def widen_string_columns():
+    """
+    Enlarge the VARCHAR columns shorter in the database than in the models.
+    SQLite does not enforce lengths, so there is nothing to do there.
+    """
+    if db.engine.dialect.name == 'sqlite':
+        return []
+    inspector = db.inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    widened = []
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = {column['name']: column['type'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            length = getattr(column.type, 'length', None)
+            current = getattr(existing.get(column.name), 'length', None)
+            if isinstance(column.type, db.String) and length and current and current < length:
+                with db.engine.begin() as connection:
+                    connection.execute(db.text(
+                        f'ALTER TABLE {table.name} ALTER COLUMN {column.name} TYPE VARCHAR({length})'
+                    ))
+                widened.append(f'{table.name}.{column.name}')
+    return widened
+
+
+def create_missing_indexes():
+    """Create the indexes declared on the models that the database lacks."""
+    inspector = db.inspect(db.engine)
+    created = []
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            if not inspector.has_index(table.name, index.name):
+                index.create(bind=db.engine)
+                created.append(index.name)
+    return created
+
+
+def backfill_rule_networks():
+    """Fill the network columns of the rules created before they existed."""
+    from app.models.rule import Rule, network_columns
+    rows = db.session.execute(
+        db.select(Rule.id, Rule.destination_ip)
+        .where(Rule.destination_ip.isnot(None), Rule.network_start.is_(None))
+    ).all()
+    values = [{"id": rule_id, **network_columns(destination_ip)} for rule_id, destination_ip in rows]
+    values = [value for value in values if value["network_start"] is not None]
+    if not values:
+        return []
+    db.session.execute(db.update(Rule), values)
+    db.session.commit()
+    return [f'rule.network_start ({len(values)} rows)']
+
+
+def sync_revision_counter():
+    """Move the revision counter past the changes recorded before it existed."""
+    from app.models.change import Change, RevisionCounter
+    latest = db.session.execute(db.select(db.func.max(Change.id))).scalar() or 0
+    counter = db.session.get(RevisionCounter, 1)
+    if counter is None:
+        db.session.add(RevisionCounter(id=1, revision=latest))
+    elif counter.revision < latest:
+        counter.revision = latest
+    else:
+        return []
+    db.session.commit()
+    return [f'revision_counter.revision ({latest})']
+
+
+def upgrade():
+    """Apply every upgrade step and return the names of the changes made."""
+    return (add_missing_columns() + widen_string_columns() + create_missing_indexes()
+            + backfill_rule_networks() + sync_revision_counter())
+
+
+def init_db():
+    """Create the missing tables, then upgrade the existing ones. Safe to run repeatedly."""
+    from app.models import change, firewall, policy, rule, user  # noqa: F401 (register the tables)
+    db.create_all()
+    return upgrade()
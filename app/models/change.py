@@ -0,0 +1,58 @@
+from .. import db
+from sqlalchemy import DDL, event
+import datetime
+
+
+class Change(db.Model):
+    """
+    One entry of the configuration change feed. The id doubles as a global,
+    monotonically increasing revision number, allocated from the
+    RevisionCounter rather than by the database so that revisions become
+    visible in commit order.
+    """
+    __tablename__ = 'change_log'
+    __table_args__ = {'sqlite_autoincrement': True}
+
+    id = db.Column(db.Integer, primary_key=True)
+    # Not a foreign key: changes outlive the firewalls they describe.
+    firewall_id = db.Column(db.Integer, nullable=False, index=True)
+    entity = db.Column(db.String(20), nullable=False)  # 'firewall', 'policy', 'rule'
+    entity_id = db.Column(db.Integer, nullable=False)
+    action = db.Column(db.String(10), nullable=False)  # 'create', 'update', 'delete'
+    data = db.Column(db.JSON, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.datetime.now)
+
+    def __repr__(self):
+        return f'<Change {self.id} {self.action} {self.entity} {self.entity_id}>'
+
+    def to_dict(self):
+        return {
+            "revision": self.id,
+            "firewall_id": self.firewall_id,
+            "entity": self.entity,
+            "entity_id": self.entity_id,
+            "action": self.action,
+            "data": self.data,
+            "created_at": self.created_at.isoformat() if self.created_at else None
+        }
+
+
+class RevisionCounter(db.Model):
+    """
+    The single row holding the latest allocated revision. Writers increment
+    it in the transaction recording their changes: the row stays locked
+    until they commit, so a reader never sees revision N + 1 before N, as
+    could happen with autoincrement ids on PostgreSQL.
+    """
+    __tablename__ = 'revision_counter'
+
+    id = db.Column(db.Integer, primary_key=True)
+    revision = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<RevisionCounter {self.revision}>'
+
+
+event.listen(RevisionCounter.__table__, 'after_create', DDL(
+    'INSERT INTO revision_counter (id, revision) VALUES (1, 0)'
+))
@@ -1,10 +1,15 @@
 from .. import db 
+import datetime
 
 class Firewall(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(50), unique=True, nullable=False)
     description = db.Column(db.String(200))
-    ip_address = db.Column(db.String(15), unique=True, nullable=False)
+    ip_address = db.Column(db.String(45), unique=True, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.datetime.now)
+    updated_at = db.Column(db.DateTime, default=datetime.datetime.now, onupdate=datetime.datetime.now)
+    # Incremented whenever the firewall, its policies or their rules change.
+    revision = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     policies = db.relationship('Policy', backref='firewall', lazy=True, cascade="all")
 
     def __repr__(self):
@@ -16,6 +21,9 @@ class Firewall(db.Model):
             "name": self.name,
             "description": self.description,
             "ip_address": self.ip_address,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+            "revision": self.revision,
             "policies": [policy.to_dict() for policy in self.policies] if self.policies else []
         }
         return firewall_dict
\ No newline at end of file
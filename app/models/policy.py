@@ -5,7 +5,7 @@ import datetime
 class Policy(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(50), nullable=False, unique=True)
-    firewall_id = db.Column(db.Integer, db.ForeignKey('firewall.id'), nullable=False)
+    firewall_id = db.Column(db.Integer, db.ForeignKey('firewall.id'), nullable=False, index=True)
     created_at = db.Column(db.DateTime, default=datetime.datetime.now)
     updated_at = db.Column(db.DateTime, default=datetime.datetime.now, onupdate=datetime.datetime.now)
     status = db.Column(db.String(20), default='active')
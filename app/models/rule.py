@@ -1,14 +1,47 @@
+from sqlalchemy.orm import validates
 from .. import db
+from .types import IPInteger
+from ..utils.ipnet import network_range
 import datetime
 
+
+def network_columns(destination_ip):
+    """
+    Values of the network columns of a rule on ``destination_ip``, all None
+    for a rule without a destination or with an unparsable one.
+    """
+    try:
+        start, end, prefixlen = network_range(destination_ip) if destination_ip else (None, None, None)
+    except ValueError:
+        start, end, prefixlen = None, None, None
+    return {"network_start": start, "network_end": end, "prefixlen": prefixlen}
+
+
 class Rule(db.Model):
+    # The composite index also serves lookups on policy_id alone.
+    __table_args__ = (
+        db.Index('ix_rule_policy_protocol_destination', 'policy_id', 'protocol', 'destination_ip'),
+        db.Index('ix_rule_network', 'network_start', 'network_end'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     policy_id = db.Column(db.Integer, db.ForeignKey('policy.id'), nullable=False)
-    destination_ip = db.Column(db.String(45), nullable=True)
-    protocol = db.Column(db.String(20), nullable=True)  # 'TCP', 'UDP', 'ICMP'
+    destination_ip = db.Column(db.String(45), nullable=True, index=True)
+    protocol = db.Column(db.String(20), nullable=True, index=True)  # 'TCP', 'UDP', 'ICMP'
+    # The destination network in the 128-bit space of app.utils.ipnet (IPv4
+    # mapped into ::ffff:0:0/96), kept in sync with destination_ip.
+    network_start = db.Column(IPInteger, nullable=True)
+    network_end = db.Column(IPInteger, nullable=True)
+    prefixlen = db.Column(db.SmallInteger, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.datetime.now)
     updated_at = db.Column(db.DateTime, default=datetime.datetime.now, onupdate=datetime.datetime.now)
 
+    @validates('destination_ip')
+    def _set_network_columns(self, key, destination_ip):
+        for column, value in network_columns(destination_ip).items():
+            setattr(self, column, value)
+        return destination_ip
+
     def to_dict(self):
         return {
             "id": self.id,
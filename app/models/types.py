@@ -0,0 +1,17 @@
+from sqlalchemy.types import String, TypeDecorator
+
+
+class IPInteger(TypeDecorator):
+    """
+    An integer of the 128-bit IPv6 space, stored as 32 hexadecimal digits:
+    no backend has a 128-bit integer type, and fixed-width hexadecimal sorts
+    like the numbers it encodes, so comparisons and range scans use indexes.
+    """
+    impl = String(32)
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else f'{value:032x}'
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else int(value, 16)
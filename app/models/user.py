@@ -34,4 +34,13 @@ class User(db.Model, UserMixin):
 class UserRoles(db.Model):
     __tablename__ = 'user_roles'
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
-    role_id = db.Column(db.Integer, db.ForeignKey('roles.id'), primary_key=True)
\ No newline at end of file
+    role_id = db.Column(db.Integer, db.ForeignKey('roles.id'), primary_key=True)
+
+class TokenRevocation(db.Model):
+    """
+    The time before which the tokens of a user are no longer accepted. Not a
+    foreign key: the revocation must outlive a deleted user.
+    """
+    __tablename__ = 'token_revocations'
+    user_id = db.Column(db.Integer, primary_key=True)
+    revoked_at = db.Column(db.Float, nullable=False)
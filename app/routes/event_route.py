@@ -0,0 +1,60 @@
+import json
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+from app.services.change_service import stream_changes
+
+event_bp = Blueprint('event', __name__)
+
+def _to_sse(changes):
+    for change in changes:
+        if change is None:
+            yield ': keep-alive\n\n'
+        else:
+            yield f"id: {change['revision']}\nevent: change\ndata: {json.dumps(change)}\n\n"
+    # The stream only ends when this client fell behind and was dropped.
+    yield 'event: reset\ndata: {}\n\n'
+
+@event_bp.route('', methods=['GET'])
+def handle_get_events():
+    """
+    Stream the configuration changes as Server-Sent Events.
+    ---
+    tags:
+      - Events
+    produces:
+      - text/event-stream
+    parameters:
+      - in: query
+        name: firewall_id
+        type: integer
+        description: Only stream the changes of this firewall.
+      - in: query
+        name: since
+        type: integer
+        description: Replay the changes recorded after this revision first.
+      - in: header
+        name: Last-Event-ID
+        type: integer
+        description: Set by the browser on reconnection; same as "since".
+    responses:
+      200:
+        description: >
+          One "change" event per committed change, with the revision as event
+          id. A "reset" event closes the stream of a client that fell behind;
+          it should reconnect with the last id it received.
+      400:
+        description: Invalid parameter.
+    """
+    try:
+        firewall_id = request.args.get('firewall_id', type=int)
+        since = request.headers.get('Last-Event-ID', request.args.get('since'))
+        if since is not None:
+            if not since.isdigit():
+                raise ValueError("'since' must be a positive integer.")
+            since = int(since)
+    except ValueError as ve:
+        return jsonify({"error": str(ve)}), 400
+    return Response(
+        stream_with_context(_to_sse(stream_changes(since, firewall_id))),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
@@ -1,10 +1,24 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, jsonify, request, stream_with_context
 from marshmallow import ValidationError
+from app.schemas.config_schema import FirewallConfigSchema
 from app.schemas.firewall_schema import FirewallSchema
-from app.services.firewall_service import create_firewall, get_firewalls, get_firewall, update_firewall, delete_firewall
-from app.utils.decorators import role_required
+from app.schemas.packet_schema import PacketBatchSchema, PacketSchema
+from app.services.change_service import MAX_CHANGES, MAX_WAIT_SECONDS, get_changes
+from app.services.config_service import sync_firewall_config
+from app.services.evaluation_service import evaluate_packets
+from app.services.render_service import FORMATS, render_firewall
+from app.services.firewall_service import (
+    FIREWALL_FIELDS, create_firewall, export_config, get_firewalls_tree, get_firewall, update_firewall,
+    delete_firewall
+)
+from app.utils.decorators import firewall_etag, role_required
+from app.utils.pagination import paginated_response, parse_collection_args
+from app.utils.serialization import to_ndjson
 
 firewall_schema = FirewallSchema()
+config_schema = FirewallConfigSchema()
+packet_schema = PacketSchema()
+packet_batch_schema = PacketBatchSchema()
 
 firewall_bp = Blueprint('firewall', __name__)
 
@@ -57,19 +71,117 @@ def handle_get_firewalls():
     ---
     tags:
       - Firewalls
+    parameters:
+      - in: query
+        name: limit
+        type: integer
+        description: Maximum number of firewalls to return (1-1000).
+      - in: query
+        name: cursor
+        type: integer
+        description: Value of the X-Next-Cursor header of the previous page.
+      - in: query
+        name: fields
+        type: string
+        description: Comma-separated firewall fields to return, e.g. "id,name".
+      - in: query
+        name: expand
+        type: string
+        description: Nested levels to include ("policies", "rules"); all by default, none if empty.
     responses:
       200:
         description: A list of firewalls.
+      400:
+        description: Invalid pagination, field or expand parameter.
+      500:
+        description: Internal server error.
+    """
+    try:
+        options = parse_collection_args(request.args, FIREWALL_FIELDS, expandable=('policies', 'rules'))
+    except ValueError as ve:
+        return jsonify({"error": str(ve)}), 400
+    try:
+        firewalls, next_cursor = get_firewalls_tree(**options)
+        return paginated_response(firewalls, next_cursor), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@firewall_bp.route('/changes', methods=['GET'])
+def handle_get_changes():
+    """
+    Get the configuration changes recorded after a given revision.
+    ---
+    tags:
+      - Firewalls
+    parameters:
+      - in: query
+        name: since
+        type: integer
+        description: Revision already known by the client; 0 (default) returns the whole history.
+      - in: query
+        name: firewall_id
+        type: integer
+        description: Only return the changes of this firewall.
+      - in: query
+        name: limit
+        type: integer
+        description: Maximum number of changes to return (1-1000, 1000 by default).
+      - in: query
+        name: wait
+        type: number
+        description: Seconds (up to 30) to wait for a change when none is available yet.
+    responses:
+      200:
+        description: The changes, oldest first, and the revision to pass as "since" next time.
+      400:
+        description: Invalid parameter.
       500:
         description: Internal server error.
     """
     try:
-        firewalls = get_firewalls()
-        return jsonify([firewall.to_dict() for firewall in firewalls]), 200
+        since = request.args.get('since', '0')
+        firewall_id = request.args.get('firewall_id')
+        limit = request.args.get('limit', str(MAX_CHANGES))
+        wait = request.args.get('wait', '0')
+        if not since.isdigit() or not limit.isdigit() or not (firewall_id is None or firewall_id.isdigit()):
+            raise ValueError("'since', 'limit' and 'firewall_id' must be positive integers.")
+        since, limit = int(since), int(limit)
+        firewall_id = None if firewall_id is None else int(firewall_id)
+        try:
+            wait = float(wait)
+        except ValueError:
+            raise ValueError("'wait' must be a number of seconds.") from None
+        if not 1 <= limit <= MAX_CHANGES or not 0 <= wait <= MAX_WAIT_SECONDS:
+            raise ValueError(f"'limit' must be between 1 and {MAX_CHANGES} and 'wait' between 0 and {MAX_WAIT_SECONDS}.")
+    except ValueError as ve:
+        return jsonify({"error": str(ve)}), 400
+    try:
+        changes, has_more = get_changes(since, firewall_id, limit, wait)
+        revision = changes[-1]["revision"] if changes else since
+        return jsonify({"revision": revision, "changes": changes, "has_more": has_more}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@firewall_bp.route('/export', methods=['GET'])
+@role_required('admin')
+def handle_export_config():
+    """
+    Stream the whole configuration as NDJSON: firewalls, then policies, then rules.
+    ---
+    tags:
+      - Firewalls
+    security:
+      - Bearer: []
+    produces:
+      - application/x-ndjson
+    responses:
+      200:
+        description: One JSON record per line, each tagged with its "type".
+    """
+    return Response(stream_with_context(to_ndjson(export_config())), mimetype='application/x-ndjson')
+
 @firewall_bp.route('/<int:id>', methods=['GET'])
+@firewall_etag('id')
 def handle_get_firewall(id):
     """
     Get a specific firewall by ID.
@@ -84,6 +196,8 @@ def handle_get_firewall(id):
     responses:
       200:
         description: Firewall found.
+      304:
+        description: Not modified since the ETag given in If-None-Match.
       404:
         description: Firewall not found.
       500:
@@ -137,8 +251,11 @@ def handle_update_firewall(id):
         description: Internal server error.
     """
     try:
-        firewall_updated = update_firewall(id, request.get_json())
+        validated_data = firewall_schema.load(request.get_json(), partial=True)
+        firewall_updated = update_firewall(id, validated_data)
         return jsonify(firewall_updated.to_dict()), 200
+    except ValidationError as err:
+        return jsonify({"error": err.messages}), 400
     except ValueError as ve:
         return jsonify({"error": str(ve)}), 404
     except Exception as e:
@@ -173,4 +290,177 @@ def handle_delete_firewall(id):
     except ValueError as ve:
         return jsonify({"error": str(ve)}), 404
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
\ No newline at end of file
+        return jsonify({"error": str(e)}), 500
+
+@firewall_bp.route('/<int:id>/config', methods=['PUT'])
+@role_required('admin')
+def handle_sync_firewall_config(id):
+    """
+    Replace the policies and rules of a firewall with the given ones.
+    ---
+    tags:
+      - Firewalls
+    security:
+      - Bearer: []
+    parameters:
+      - in: path
+        name: id
+        required: true
+        type: integer
+      - in: query
+        name: dry_run
+        type: boolean
+        description: Only report the changes that would be made.
+      - in: body
+        name: body
+        required: true
+        description: >
+          The desired policies, matched by name with the stored ones, and
+          their rules. Only the differences are written, in one transaction.
+        schema:
+          properties:
+            policies:
+              type: array
+              items:
+                properties:
+                  name:
+                    type: string
+                    example: "Web Policy"
+                  status:
+                    type: string
+                    example: "active"
+                  rules:
+                    type: array
+                    items:
+                      properties:
+                        destination_ip:
+                          type: string
+                          example: "10.0.0.0/24"
+                        protocol:
+                          type: string
+                          example: "TCP"
+    responses:
+      200:
+        description: The policies created, updated and deleted, the rule counts and the new revision.
+      400:
+        description: Validation error or policy name used by another firewall.
+      404:
+        description: Firewall not found.
+      500:
+        description: Internal server error.
+    """
+    try:
+        desired = config_schema.load(request.get_json())
+        if not get_firewall(id):
+            return jsonify({"error": "Firewall not found"}), 404
+        dry_run = request.args.get('dry_run', 'false').lower() in ('1', 'true', 'yes')
+        return jsonify(sync_firewall_config(id, desired['policies'], dry_run=dry_run)), 200
+    except ValidationError as err:
+        return jsonify({"error": err.messages}), 400
+    except ValueError as ve:
+        return jsonify({"error": str(ve)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@firewall_bp.route('/<int:id>/render', methods=['GET'])
+@firewall_etag('id')
+def handle_render_firewall(id):
+    """
+    Render the active policies of a firewall to a deployable ruleset.
+    ---
+    tags:
+      - Firewalls
+    produces:
+      - text/plain
+    parameters:
+      - in: path
+        name: id
+        required: true
+        type: integer
+      - in: query
+        name: format
+        type: string
+        enum: ["nftables", "iptables-restore", "ip6tables-restore"]
+        description: Ruleset format, "nftables" by default.
+    responses:
+      200:
+        description: >
+          The ruleset, one chain per active policy accepting the traffic
+          matched by its rules; anything else is dropped.
+      304:
+        description: Not modified since the ETag given in If-None-Match.
+      400:
+        description: Unknown format.
+      404:
+        description: Firewall not found.
+      500:
+        description: Internal server error.
+    """
+    format = request.args.get('format', 'nftables')
+    if format not in FORMATS:
+        return jsonify({"error": f"Unknown format, expected one of: {', '.join(FORMATS)}."}), 400
+    try:
+        return Response(render_firewall(id, format), mimetype='text/plain'), 200
+    except ValueError as ve:
+        return jsonify({"error": str(ve)}), 404
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@firewall_bp.route('/<int:id>/evaluate', methods=['POST'])
+def handle_evaluate_firewall(id):
+    """
+    Evaluate packets against the rules of the active policies of a firewall.
+    ---
+    tags:
+      - Firewalls
+    parameters:
+      - in: path
+        name: id
+        required: true
+        type: integer
+      - in: body
+        name: body
+        required: true
+        description: A single packet, or a batch of up to 10000 packets under "packets".
+        schema:
+          properties:
+            destination_ip:
+              type: string
+              example: "10.0.0.5"
+            protocol:
+              type: string
+              example: "TCP"
+            packets:
+              type: array
+              items:
+                properties:
+                  destination_ip:
+                    type: string
+                    example: "10.0.0.5"
+                  protocol:
+                    type: string
+                    example: "TCP"
+    responses:
+      200:
+        description: IDs of the matching rules, per packet for a batch.
+      400:
+        description: Validation error.
+      404:
+        description: Firewall not found.
+      500:
+        description: Internal server error.
+    """
+    try:
+        data = request.get_json()
+        if isinstance(data, dict) and 'packets' in data:
+            packets = packet_batch_schema.load(data)['packets']
+            results = evaluate_packets(id, packets)
+            return jsonify({"results": [{"matches": matches} for matches in results]}), 200
+        packet = packet_schema.load(data)
+        return jsonify({"matches": evaluate_packets(id, [packet])[0]}), 200
+    except ValidationError as err:
+        return jsonify({"error": err.messages}), 400
+    except ValueError as ve:
+        return jsonify({"error": str(ve)}), 404
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
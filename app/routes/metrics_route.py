@@ -0,0 +1,24 @@
+from flask import Blueprint, Response, jsonify
+from app import metrics
+
+metrics_bp = Blueprint('metrics', __name__)
+
+@metrics_bp.route('', methods=['GET'])
+def handle_get_metrics():
+    """
+    Request, database and worker metrics in the Prometheus text format.
+    ---
+    tags:
+      - Metrics
+    produces:
+      - text/plain
+    responses:
+      200:
+        description: The metrics of every worker process
+      500:
+        description: Internal server error
+    """
+    try:
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
@@ -1,10 +1,12 @@
 from flask import Blueprint, jsonify, request
 from marshmallow import ValidationError
 from app.schemas.policy_schema import PolicySchema
+from app.services.analysis_service import analyze_policy
 from app.services.policy_service import (
-    create_policy, get_policies_of_firewall, get_policy, update_policy, delete_policy
+    POLICY_FIELDS, create_policy, get_policies_tree, get_policy, update_policy, delete_policy
 )
-from app.utils.decorators import role_required
+from app.utils.decorators import firewall_etag, role_required
+from app.utils.pagination import paginated_response, parse_collection_args
 
 policy_schema = PolicySchema()
 policy_bp = Blueprint('policy', __name__)
@@ -57,6 +59,7 @@ def handle_create_policy(firewall_id):
         return jsonify({"error": str(e)}), 500
 
 @policy_bp.route('<int:firewall_id>/policies', methods=['GET'])
+@firewall_etag()
 def handle_get_policies(firewall_id):
     """
     Retrieve all policies for a specific firewall.
@@ -69,6 +72,22 @@ def handle_get_policies(firewall_id):
         required: true
         type: integer
         description: ID of the firewall to retrieve policies for.
+      - in: query
+        name: limit
+        type: integer
+        description: Maximum number of policies to return (1-1000).
+      - in: query
+        name: cursor
+        type: integer
+        description: Value of the X-Next-Cursor header of the previous page.
+      - in: query
+        name: fields
+        type: string
+        description: Comma-separated policy fields to return, e.g. "id,name,status".
+      - in: query
+        name: expand
+        type: string
+        description: Set to an empty value to omit the rules of each policy.
     responses:
       200:
         description: A list of policies.
@@ -76,20 +95,29 @@ def handle_get_policies(firewall_id):
           type: array
           items:
             $ref: '#/definitions/Policy'
+      304:
+        description: Not modified since the ETag given in If-None-Match.
+      400:
+        description: Invalid pagination, field or expand parameter.
       404:
         description: No policies found for this firewall.
       500:
         description: Internal server error.
     """
     try:
-        policies = get_policies_of_firewall(firewall_id)
-        if policies:
-            return jsonify([policy.to_dict() for policy in policies]), 200
+        options = parse_collection_args(request.args, POLICY_FIELDS, expandable=('rules',))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        policies, next_cursor = get_policies_tree([firewall_id], **options)
+        if policies or options["after_id"] is not None:
+            return paginated_response(policies, next_cursor), 200
         return jsonify({"error": "No policies found for this firewall"}), 404
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @policy_bp.route('<int:firewall_id>/policies/<int:policy_id>', methods=['GET'])
+@firewall_etag()
 def handle_get_policy(firewall_id, policy_id):
     """
     Retrieve a specific policy by ID for a given firewall.
@@ -110,6 +138,8 @@ def handle_get_policy(firewall_id, policy_id):
     responses:
       200:
         description: Policy found.
+      304:
+        description: Not modified since the ETag given in If-None-Match.
       404:
         description: Policy not found.
       500:
@@ -123,6 +153,45 @@ def handle_get_policy(firewall_id, policy_id):
     except Exception as e:
         return jsonify({"error": "An unexpected error occurred."}), 500
 
+@policy_bp.route('<int:firewall_id>/policies/<int:policy_id>/analysis', methods=['GET'])
+@firewall_etag()
+def handle_analyze_policy(firewall_id, policy_id):
+    """
+    Find the redundant rules of a policy.
+    ---
+    tags:
+      - Policies
+    parameters:
+      - in: path
+        name: firewall_id
+        required: true
+        type: integer
+        description: ID of the firewall associated with the policy.
+      - in: path
+        name: policy_id
+        required: true
+        type: integer
+        description: ID of the policy to analyze.
+    responses:
+      200:
+        description: >
+          The exact duplicates, the rules shadowed by an earlier rule covering
+          their destination and protocol, the networks that several rules
+          can be merged into, and the rules with an invalid destination.
+      304:
+        description: Not modified since the ETag given in If-None-Match.
+      404:
+        description: Policy not found.
+      500:
+        description: Internal server error.
+    """
+    try:
+        return jsonify(analyze_policy(policy_id, firewall_id)), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 404
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 @policy_bp.route('<int:firewall_id>/policies/<int:policy_id>', methods=['PUT'])
 @role_required('admin')
 def handle_update_policy(firewall_id, policy_id):
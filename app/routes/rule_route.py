@@ -1,13 +1,30 @@
+import json
 from flask import Blueprint, jsonify, request
-from marshmallow import ValidationError
-from app.schemas.rule_schema import RuleSchema
-from app.services.rule_service import create_rule, get_rules_of_policy, get_rule, update_rule, delete_rule
-from app.utils.decorators import role_required
+from marshmallow import EXCLUDE, ValidationError
+from app.schemas.rule_schema import RuleFilterSchema, RuleSchema
+from app.services.policy_service import get_policy
+from app.services.rule_service import (
+    RULE_FIELDS, create_rule, create_rules_bulk, get_rules_rows, get_rule, update_rule, delete_rule
+)
+from app.utils.decorators import firewall_etag, role_required
+from app.utils.pagination import paginated_response, parse_collection_args
 
 rule_schema = RuleSchema()
+rule_filter_schema = RuleFilterSchema(unknown=EXCLUDE)
 
 rule_bp = Blueprint('rule', __name__)
 
+NDJSON_MIMETYPES = ('application/x-ndjson', 'application/jsonl')
+
+def _iter_ndjson(stream):
+    for line in stream:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield None
+
 @rule_bp.route('/<int:firewall_id>/policies/<int:policy_id>/rules', methods=['POST'])
 @role_required('admin')
 def handle_create_rule(firewall_id, policy_id):
@@ -59,7 +76,76 @@ def handle_create_rule(firewall_id, policy_id):
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@rule_bp.route('/<int:firewall_id>/policies/<int:policy_id>/rules:bulk', methods=['POST'])
+@role_required('admin')
+def handle_bulk_create_rules(firewall_id, policy_id):
+    """
+    Create many rules for a policy in a single transaction.
+    ---
+    tags:
+      - Rules
+    security:
+      - Bearer: []
+    consumes:
+      - application/json
+      - application/x-ndjson
+    parameters:
+      - in: path
+        name: firewall_id
+        required: true
+        type: integer
+        description: ID of the firewall associated with the policy.
+      - in: path
+        name: policy_id
+        required: true
+        type: integer
+        description: ID of the policy to associate the rules with.
+      - in: query
+        name: atomic
+        type: boolean
+        description: Create no rule at all if any row is invalid.
+      - in: body
+        name: body
+        required: true
+        description: A JSON array of rules, or one rule per line with an NDJSON content type.
+        schema:
+          type: array
+          items:
+            properties:
+              protocol:
+                type: string
+                example: "tcp"
+              destination_ip:
+                type: string
+                example: "10.0.0.20"
+    responses:
+      201:
+        description: Rules created; invalid rows are listed in "errors".
+      400:
+        description: Malformed body, or invalid rows in atomic mode.
+      404:
+        description: Policy not found for this firewall.
+      500:
+        description: Internal server error.
+    """
+    atomic = request.args.get('atomic', 'false').lower() in ('1', 'true', 'yes')
+    if request.mimetype in NDJSON_MIMETYPES:
+        items = _iter_ndjson(request.stream)
+    else:
+        items = request.get_json(silent=True)
+        if not isinstance(items, list):
+            return jsonify({"error": "Expected a JSON array or an NDJSON body."}), 400
+    try:
+        created, errors = create_rules_bulk(firewall_id, policy_id, items, atomic=atomic)
+        status = 400 if atomic and errors else 201
+        return jsonify({"created": created, "errors": errors}), status
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 404
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 @rule_bp.route('/<int:firewall_id>/policies/<int:policy_id>/rules', methods=['GET'])
+@firewall_etag()
 def handle_get_rules(firewall_id, policy_id):
     """
     Retrieve all rules for a specific policy under a given firewall.
@@ -77,6 +163,26 @@ def handle_get_rules(firewall_id, policy_id):
         required: true
         type: integer
         description: ID of the policy to retrieve rules for.
+      - in: query
+        name: limit
+        type: integer
+        description: Maximum number of rules to return (1-1000).
+      - in: query
+        name: cursor
+        type: integer
+        description: Value of the X-Next-Cursor header of the previous page.
+      - in: query
+        name: fields
+        type: string
+        description: Comma-separated rule fields to return, e.g. "id,protocol".
+      - in: query
+        name: contains
+        type: string
+        description: Only return the rules whose destination contains this address, e.g. "10.0.0.5".
+      - in: query
+        name: within
+        type: string
+        description: Only return the rules whose destination lies within this network, e.g. "10.0.0.0/8".
     responses:
       200:
         description: A list of rules.
@@ -84,20 +190,35 @@ def handle_get_rules(firewall_id, policy_id):
           type: array
           items:
             $ref: '#/definitions/Rule'
+      304:
+        description: Not modified since the ETag given in If-None-Match.
+      400:
+        description: Invalid pagination, field or network parameter.
       404:
         description: No rules found for this policy.
       500:
         description: Internal server error.
     """
     try:
-        rules = get_rules_of_policy(policy_id)
-        if not rules:
+        options = parse_collection_args(request.args, RULE_FIELDS)
+        filters = rule_filter_schema.load(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except ValidationError as err:
+        return jsonify({"error": err.messages}), 400
+    try:
+        get_policy(firewall_id, policy_id)
+        rules, next_cursor = get_rules_rows([policy_id], **options, **filters)
+        if not rules and options["after_id"] is None and not filters:
             return jsonify({"error": "No rules found for this policy"}), 404
-        return jsonify([rule.to_dict() for rule in rules]), 200
+        return paginated_response(rules, next_cursor), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 404
     except Exception as e:
         return jsonify({"error": str(e)}), 500
     
 @rule_bp.route('/<int:firewall_id>/policies/<int:policy_id>/rules/<int:rule_id>', methods=['GET'])
+@firewall_etag()
 def get_rule_route(firewall_id, policy_id, rule_id):
     """
     Retrieve a specific rule by ID for a given policy and firewall.
@@ -123,13 +244,15 @@ def get_rule_route(firewall_id, policy_id, rule_id):
     responses:
       200:
         description: Rule found.
+      304:
+        description: Not modified since the ETag given in If-None-Match.
       404:
         description: Rule not found.
       500:
         description: Internal server error.
     """
     try:
-        rule = get_rule(rule_id)
+        rule = get_rule(rule_id, policy_id, firewall_id)
         return jsonify(rule.to_dict()), 200
     except ValueError as e:
         return jsonify({'error': str(e)}), 404 
@@ -190,6 +313,8 @@ def handle_update_rule(firewall_id, policy_id, rule_id):
         validated_data["rule_id"] = rule_id
         rule = update_rule(validated_data)
         return jsonify(rule.to_dict()), 200
+    except ValidationError as err:
+        return jsonify({"error": err.messages}), 400
     except ValueError as e:
         return jsonify({"error": str(e)}), 404
     except Exception as e:
@@ -6,6 +6,12 @@ from app import db
 from marshmallow import ValidationError
 from app.schemas.user_schema import UserSchema
 from app.services.user_service import register_user, login_user, get_user_service, update_user_service, delete_user_service
+from app.utils.passwords import HashingPoolSaturated
+
+def _too_many_requests(error):
+    response = jsonify({"error": str(error)})
+    response.headers['Retry-After'] = '1'
+    return response, 429
 
 user_bp = Blueprint("user", __name__)
 user_datastore = SQLAlchemyUserDatastore(db, User, Role)
@@ -40,12 +46,16 @@ def login():
               example: "eyJ0eXAiOiJKV1QiLCJh..."
       401:
         description: Unauthorized - Invalid credentials.
+      429:
+        description: Too many pending password verifications.
     """
     email = request.json.get('email')
     password = request.json.get('password')
     try:
         access_token = login_user(email, password)
         return jsonify(access_token=access_token), 200
+    except HashingPoolSaturated as e:
+        return _too_many_requests(e)
     except ValueError as e:
         return jsonify({"msg": str(e)}), 401
 
@@ -73,6 +83,8 @@ def register():
         description: User created successfully.
       400:
         description: Validation error or user already exists.
+      429:
+        description: Too many pending password hashes.
       500:
         description: Internal server error.
     """
@@ -82,6 +94,8 @@ def register():
         return jsonify({"msg": "User created successfully", "user": user.to_dict()}), 201
     except ValidationError as err:
         return jsonify({"error": err.messages}), 400
+    except HashingPoolSaturated as e:
+        return _too_many_requests(e)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -141,6 +155,8 @@ def update_user(id):
         description: User updated successfully.
       404:
         description: User not found.
+      429:
+        description: Too many pending password hashes.
       500:
         description: Internal server error.
     """
@@ -148,6 +164,8 @@ def update_user(id):
         data = request.get_json()
         user = update_user_service(id, data)
         return jsonify(user.to_dict()), 200
+    except HashingPoolSaturated as e:
+        return _too_many_requests(e)
     except ValueError as e:
         return jsonify({"error": str(e)}), 404
     except Exception as e:
@@ -0,0 +1,20 @@
+from marshmallow import Schema, ValidationError, fields, validates
+from app.schemas.policy_schema import PolicySchema
+from app.schemas.fields import IPNetworkString
+from app.schemas.rule_schema import RuleSchema
+
+class ConfigRuleSchema(RuleSchema):
+    destination_ip = IPNetworkString(required=True)
+
+class ConfigPolicySchema(PolicySchema):
+    rules = fields.List(fields.Nested(ConfigRuleSchema), load_default=list)
+
+class FirewallConfigSchema(Schema):
+    """The desired policies of a firewall, identified by name, and their rules."""
+    policies = fields.List(fields.Nested(ConfigPolicySchema), required=True)
+
+    @validates('policies')
+    def validate_unique_names(self, policies, **kwargs):
+        names = [policy['name'] for policy in policies]
+        if len(names) != len(set(names)):
+            raise ValidationError("Policy names must be unique.")
\ No newline at end of file
@@ -0,0 +1,32 @@
+import ipaddress
+from marshmallow import fields
+
+
+class IPAddressString(fields.String):
+    """An IPv4 or IPv6 address, loaded in its canonical text form."""
+    default_error_messages = {"invalid_ip": "Not a valid IP address."}
+
+    def _deserialize(self, value, attr, data, **kwargs):
+        value = super()._deserialize(value, attr, data, **kwargs)
+        try:
+            return str(ipaddress.ip_address(value))
+        except ValueError as error:
+            raise self.make_error("invalid_ip") from error
+
+
+class IPNetworkString(fields.String):
+    """
+    An IPv4 or IPv6 address or CIDR prefix, loaded in its canonical text
+    form; a prefix covering a single address is loaded as the address.
+    """
+    default_error_messages = {"invalid_network": "Not a valid IP address or CIDR prefix."}
+
+    def _deserialize(self, value, attr, data, **kwargs):
+        value = super()._deserialize(value, attr, data, **kwargs)
+        try:
+            network = ipaddress.ip_network(value)
+        except ValueError as error:
+            raise self.make_error("invalid_network") from error
+        if network.prefixlen == network.max_prefixlen:
+            return str(network.network_address)
+        return str(network)
@@ -1,6 +1,7 @@
 from marshmallow import Schema, fields
+from app.schemas.fields import IPAddressString
 
 class FirewallSchema(Schema):
     name = fields.String(required=True)
     description = fields.String()
-    ip_address = fields.String(required=True)
\ No newline at end of file
+    ip_address = IPAddressString(required=True)
\ No newline at end of file
@@ -0,0 +1,12 @@
+from marshmallow import Schema, fields, validate
+
+MAX_PACKETS = 10000
+
+class PacketSchema(Schema):
+    destination_ip = fields.IP(required=True)
+    protocol = fields.String(required=True)
+
+class PacketBatchSchema(Schema):
+    packets = fields.List(
+        fields.Nested(PacketSchema), required=True, validate=validate.Length(min=1, max=MAX_PACKETS)
+    )
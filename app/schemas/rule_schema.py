@@ -1,5 +1,11 @@
 from marshmallow import Schema, fields
+from app.schemas.fields import IPAddressString, IPNetworkString
 
 class RuleSchema(Schema):
     protocol = fields.String(required=True)
-    destination_ip = fields.String(allow_none=True)
\ No newline at end of file
+    destination_ip = IPNetworkString(allow_none=True)
+
+class RuleFilterSchema(Schema):
+    """Network filters of the rule listing, read from the query string."""
+    contains = IPAddressString()
+    within = IPNetworkString()
\ No newline at end of file
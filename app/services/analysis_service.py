@@ -0,0 +1,134 @@
+from sqlalchemy import select
+from app import db
+from app.models.policy import Policy
+from app.models.rule import Rule
+from app.utils.ipnet import ADDRESS_BITS, IPV4_MAPPED, int_to_network
+
+ANY_PROTOCOL = None
+ANY_NETWORK = (0, (1 << ADDRESS_BITS) - 1, 0)
+
+
+def _find_shadowed(candidates, reported):
+    """
+    Yield ``(rule_id, shadowed_by)`` for the rules of ``reported`` whose
+    network lies within the network of a rule of ``candidates`` with a
+    smaller id, ``shadowed_by`` being the earliest of them.
+
+    CIDR networks are either nested or disjoint, so once sorted by start
+    (largest network first) the networks containing a rule are exactly those
+    on the stack of the enclosing networks. Each stack entry carries the
+    smallest id among itself and its enclosing networks, which makes the
+    sweep O(n log n).
+    """
+    stack = []  # (end, earliest rule id of the enclosing networks)
+    for start, end, rule_id in sorted(candidates, key=lambda rule: (rule[0], -rule[1], rule[2])):
+        while stack and stack[-1][0] < start:
+            stack.pop()
+        if stack and stack[-1][1] < rule_id:
+            if rule_id in reported:
+                yield rule_id, stack[-1][1]
+            stack.append((end, stack[-1][1]))
+        else:
+            stack.append((end, rule_id))
+
+
+def _find_mergeable(networks):
+    """
+    Yield the ``(start, prefixlen, rule_ids)`` of the networks that several
+    rules of ``networks`` (``(start, prefixlen, rule_id)`` items) can be
+    merged into: sibling networks are merged into their parent bottom-up,
+    and networks lying within a previous one are absorbed.
+    """
+    stack = []  # [start, prefixlen, end, rule_ids]
+    for start, prefixlen, rule_id in sorted(networks):
+        if stack and start <= stack[-1][2]:
+            stack[-1][3].append(rule_id)
+            continue
+        stack.append([start, prefixlen, start | ((1 << (ADDRESS_BITS - prefixlen)) - 1), [rule_id]])
+        while len(stack) > 1:
+            (left, prefixlen, _, left_ids), (right, right_prefixlen, end, right_ids) = stack[-2:]
+            size = 1 << (ADDRESS_BITS - prefixlen)
+            mergeable = (
+                prefixlen == right_prefixlen and prefixlen > 0 and left + size == right
+                and left % (2 * size) == 0
+                # Do not merge IPv4 networks out of the IPv4-mapped range.
+                and not (prefixlen == 96 and left & ~0xffffffff == IPV4_MAPPED)
+            )
+            if not mergeable:
+                break
+            stack[-2:] = [[left, prefixlen - 1, end, left_ids + right_ids]]
+    for start, prefixlen, _, rule_ids in stack:
+        if len(rule_ids) > 1:
+            yield start, prefixlen, sorted(rule_ids)
+
+
+def analyze_rules(rules):
+    """
+    Analyze ``(rule_id, protocol, network_start, network_end, prefixlen)``
+    rows, as stored for the rules of a policy. Rules without a destination
+    apply to any address; rules with an unparsable destination (no network)
+    are reported as invalid and otherwise ignored.
+
+    Returns the exact duplicates, the rules covered by an earlier rule of the
+    same protocol or of any protocol, and the networks that rules of the same
+    protocol can be merged into. Runs in O(n log n).
+    """
+    groups, invalid, duplicates, first_of = {}, [], [], {}
+    for rule_id, protocol, start, end, prefixlen in rules:
+        if start is None:
+            invalid.append(rule_id)
+            continue
+        protocol = protocol.upper() if protocol else ANY_PROTOCOL
+        key = (protocol, start, end)
+        if key in first_of:
+            duplicates.append({"rule_id": rule_id, "duplicate_of": first_of[key]})
+            continue
+        first_of[key] = rule_id
+        groups.setdefault(protocol, []).append((start, end, prefixlen, rule_id))
+
+    shadowed = {}
+    any_protocol = groups.get(ANY_PROTOCOL, [])
+    for protocol, group in groups.items():
+        candidates = group if protocol is ANY_PROTOCOL else group + any_protocol
+        reported = {rule_id for *_, rule_id in group}
+        shadowed.update(_find_shadowed(
+            [(start, end, rule_id) for start, end, _, rule_id in candidates], reported
+        ))
+
+    mergeable = []
+    for protocol, group in groups.items():
+        networks = [(start, prefixlen, rule_id) for start, _, prefixlen, rule_id in group if rule_id not in shadowed]
+        for start, prefixlen, rule_ids in _find_mergeable(networks):
+            mergeable.append({
+                "network": str(int_to_network(start, prefixlen)),
+                "protocol": protocol,
+                "rule_ids": rule_ids,
+            })
+
+    return {
+        "duplicates": sorted(duplicates, key=lambda item: item["rule_id"]),
+        "shadowed": [{"rule_id": rule_id, "shadowed_by": shadowed[rule_id]} for rule_id in sorted(shadowed)],
+        "mergeable": sorted(mergeable, key=lambda item: item["rule_ids"][0]),
+        "invalid": sorted(invalid),
+    }
+
+
+def analyze_policy(policy_id, firewall_id=None):
+    """Analyze the rules of a policy, optionally checking that it belongs to ``firewall_id``."""
+    query = select(Policy.id).where(Policy.id == policy_id)
+    if firewall_id is not None:
+        query = query.where(Policy.firewall_id == firewall_id)
+    if db.session.execute(query).scalar() is None:
+        scope = " for this firewall" if firewall_id is not None else ""
+        raise ValueError(f"Policy with ID {policy_id} does not exist{scope}.")
+
+    rows = db.session.execute(
+        select(Rule.id, Rule.protocol, Rule.network_start, Rule.network_end, Rule.prefixlen, Rule.destination_ip)
+        .where(Rule.policy_id == policy_id)
+        .order_by(Rule.id)
+    )
+    rules = [
+        (rule_id, protocol, *(ANY_NETWORK if destination_ip is None else (start, end, prefixlen)))
+        for rule_id, protocol, start, end, prefixlen, destination_ip in rows
+    ]
+    return {"policy_id": policy_id, "rules": len(rules), **analyze_rules(rules)}
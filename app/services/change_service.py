@@ -0,0 +1,184 @@
+import time
+from sqlalchemy import event, func, select, update
+from app import db, event_broker
+from app.models.change import Change, RevisionCounter
+from app.models.firewall import Firewall
+from app.models.policy import Policy
+from app.models.rule import Rule
+from app.utils.statements import insert_returning
+
+MAX_CHANGES = 1000
+MAX_WAIT_SECONDS = 30
+POLL_INTERVAL_SECONDS = 0.5
+
+
+def allocate_revisions(count):
+    """
+    Reserve ``count`` consecutive revisions and return the last one. The
+    counter row stays locked until the current transaction ends, which
+    serializes the writers recording changes.
+    """
+    return db.session.execute(
+        update(RevisionCounter).where(RevisionCounter.id == 1)
+        .values(revision=RevisionCounter.revision + count).returning(RevisionCounter.revision),
+        execution_options={"synchronize_session": False},
+    ).scalar_one()
+
+
+def record_change(entity, entity_id, action, data=None, firewall_id=None, policy_id=None):
+    """
+    Append a change to the feed within the current transaction and set the
+    firewall revision to its id. The firewall is given directly or through
+    one of its policies. Callers commit.
+    """
+    if firewall_id is None:
+        firewall_id = select(Policy.firewall_id).where(Policy.id == policy_id).scalar_subquery()
+    change = Change(id=allocate_revisions(1), firewall_id=firewall_id, entity=entity, entity_id=entity_id, action=action, data=data)
+    db.session.add(change)
+    db.session.flush()
+    db.session.execute(
+        update(Firewall).where(Firewall.id == firewall_id).values(revision=change.id),
+        execution_options={"synchronize_session": False},
+    )
+    return change
+
+
+def record_changes(entity, action, rows, policy_id):
+    """Append one change per row (dicts with an ``id``) of a single policy."""
+    firewall_id = db.session.execute(select(Policy.firewall_id).where(Policy.id == policy_id)).scalar_one()
+    record_firewall_changes(firewall_id, [(entity, row['id'], action, row) for row in rows])
+
+
+def record_firewall_changes(firewall_id, changes):
+    """
+    Append ``(entity, entity_id, action, data)`` changes of a firewall with a
+    single executemany insert, and set the firewall revision to the last one.
+    """
+    if not changes:
+        return
+    first = allocate_revisions(len(changes)) - len(changes) + 1
+    rows = insert_returning(Change, Change.__table__.columns, [
+        {"id": revision, "firewall_id": firewall_id, "entity": entity, "entity_id": entity_id,
+         "action": action, "data": data}
+        for revision, (entity, entity_id, action, data) in enumerate(changes, first)
+    ])
+    # Core inserts bypass the flush hook: queue the changes for publication here.
+    _queue_changes(db.session(), [Change(**row._mapping).to_dict() for row in rows])
+    db.session.execute(
+        update(Firewall).where(Firewall.id == firewall_id).values(revision=rows[-1].id),
+        execution_options={"synchronize_session": False},
+    )
+
+
+def get_firewall_revision(firewall_id, policy_id=None, rule_id=None):
+    """
+    Return the ``(revision, updated_at)`` of a firewall, or None if it does not
+    exist or the given policy, or rule of that policy, is not one of its own.
+    """
+    query = select(Firewall.revision, Firewall.updated_at).where(Firewall.id == firewall_id)
+    if policy_id is not None:
+        query = query.join(Policy, (Policy.firewall_id == Firewall.id) & (Policy.id == policy_id))
+        if rule_id is not None:
+            query = query.join(Rule, (Rule.policy_id == Policy.id) & (Rule.id == rule_id))
+    return db.session.execute(query).one_or_none()
+
+
+def get_changes(since=0, firewall_id=None, limit=MAX_CHANGES, wait=0):
+    """
+    Return the changes recorded after revision ``since``, oldest first, and
+    whether more are available beyond ``limit``.
+
+    With ``wait`` (in seconds, at most MAX_WAIT_SECONDS) and no change
+    available yet, the database is polled until one is recorded or the
+    delay expires.
+    """
+    query = select(Change).where(Change.id > since).order_by(Change.id).limit(limit + 1)
+    if firewall_id is not None:
+        query = query.where(Change.firewall_id == firewall_id)
+
+    deadline = time.monotonic() + min(wait, MAX_WAIT_SECONDS)
+    while True:
+        changes = db.session.execute(query).scalars().all()
+        if changes or time.monotonic() >= deadline:
+            return [change.to_dict() for change in changes[:limit]], len(changes) > limit
+        # End the transaction so the next poll sees newly committed changes.
+        db.session.rollback()
+        time.sleep(POLL_INTERVAL_SECONDS)
+
+
+def stream_changes(since=None, firewall_id=None):
+    """
+    Yield the changes committed from now on, as they are published, or None
+    whenever nothing happened for a heartbeat interval.
+
+    With ``since``, the changes already recorded after that revision are
+    replayed from the database first. The generator ends when the client was
+    too slow and got dropped by the broker; it may then resume with the last
+    revision it received.
+
+    Live changes are only deduplicated against the replayed ones: commits
+    are published in no particular order, so a later change may arrive
+    before an earlier one and both are forwarded.
+    """
+    subscription = event_broker.subscribe(firewall_id)
+    try:
+        replayed = since or 0
+        if since is not None:
+            has_more = True
+            while has_more:
+                changes, has_more = get_changes(replayed, firewall_id)
+                for change in changes:
+                    replayed = change['revision']
+                    yield change
+            # Idle subscribers must not hold on to a database connection.
+            db.session.close()
+
+        while True:
+            change = subscription.get(timeout=event_broker.heartbeat_seconds)
+            if change is None:
+                if subscription.overflowed:
+                    return
+                yield None
+            elif change['revision'] > replayed:
+                yield change
+    finally:
+        event_broker.unsubscribe(subscription)
+
+
+def _latest_revision():
+    return db.session.execute(select(func.max(Change.id))).scalar() or 0
+
+
+def _changes_after(revision):
+    changes, _ = get_changes(revision)
+    return changes, changes[-1]['revision'] if changes else revision
+
+
+# Where the broker reads the changes committed by every process when polling.
+event_broker.poll_from(_latest_revision, _changes_after)
+
+
+@event.listens_for(db.session, 'after_flush')
+def _collect_changes(session, flush_context):
+    # Serialize while the rows are still loaded: after the commit they are
+    # expired and may not be refreshed from within the commit hook.
+    _queue_changes(session, [obj.to_dict() for obj in session.new if isinstance(obj, Change)])
+
+
+def _queue_changes(session, changes):
+    if changes:
+        session.info.setdefault('changes', []).extend(changes)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _publish_changes(session):
+    changes = session.info.pop('changes', None)
+    # A polling broker reads them back from the database like those of
+    # other processes, in revision order.
+    if changes and not event_broker.polling:
+        event_broker.publish(changes)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_changes(session):
+    session.info.pop('changes', None)
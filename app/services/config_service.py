@@ -0,0 +1,191 @@
+from collections import Counter
+from itertools import islice
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models.firewall import Firewall
+from app.models.policy import Policy
+from app.models.rule import Rule, network_columns
+from app.services.change_service import record_firewall_changes
+from app.services.policy_service import POLICY_FIELDS
+from app.services.rule_service import BULK_CHUNK_SIZE, RULE_FIELDS
+from app.utils.db_errors import violated_unique_column
+from app.utils.serialization import row_to_dict
+from app.utils.statements import insert_returning
+
+
+def _chunks(values, size=BULK_CHUNK_SIZE):
+    values = iter(values)
+    while chunk := list(islice(values, size)):
+        yield chunk
+
+
+def _rule_key(rule):
+    return rule['protocol'], rule['destination_ip']
+
+
+def _load_state(firewall_id):
+    """The stored policies of a firewall by name, each with its rules by key."""
+    policies = {
+        row.name: {"id": row.id, "status": row.status, "rules": {}}
+        for row in db.session.execute(
+            select(Policy.id, Policy.name, Policy.status).where(Policy.firewall_id == firewall_id)
+        )
+    }
+    by_id = {policy["id"]: policy for policy in policies.values()}
+    if by_id:
+        rows = db.session.execute(
+            select(Rule.id, Rule.policy_id, Rule.protocol, Rule.destination_ip)
+            .where(Rule.policy_id.in_(by_id))
+            .order_by(Rule.id)
+        )
+        for rule_id, policy_id, protocol, destination_ip in rows:
+            by_id[policy_id]["rules"].setdefault((protocol, destination_ip), []).append(rule_id)
+    return policies
+
+
+def diff_config(stored, desired):
+    """
+    Compare the stored state with the desired policies.
+
+    Policies are matched by name, rules by (protocol, destination) as a
+    multiset, so identical rules may appear several times. Returns the
+    policies to create, update and delete, and the rules to insert (per
+    policy name) and delete (by id).
+    """
+    desired_names = {policy['name'] for policy in desired}
+    created = [policy for policy in desired if policy['name'] not in stored]
+    updated = [
+        policy for policy in desired
+        if policy['name'] in stored and policy.get('status', 'active') != stored[policy['name']]['status']
+    ]
+    deleted = [name for name in stored if name not in desired_names]
+
+    rules_to_insert, rule_ids_to_delete, unchanged = {}, [], 0
+    for name in deleted:
+        for rule_ids in stored[name]['rules'].values():
+            rule_ids_to_delete.extend(rule_ids)
+    for policy in desired:
+        current = stored.get(policy['name'], {"rules": {}})['rules']
+        wanted = Counter(_rule_key(rule) for rule in policy['rules'])
+        have = Counter({key: len(rule_ids) for key, rule_ids in current.items()})
+        for key, count in (have - wanted).items():
+            # Keep the oldest rules, remove the surplus.
+            rule_ids_to_delete.extend(current[key][-count:])
+        inserts = wanted - have
+        if inserts:
+            rules_to_insert[policy['name']] = list(inserts.elements())
+        unchanged += sum((have & wanted).values())
+
+    return {
+        "policies": {"created": created, "updated": updated, "deleted": deleted},
+        "rules": {"insert": rules_to_insert, "delete": rule_ids_to_delete, "unchanged": unchanged},
+    }
+
+
+def _summary(diff, revision):
+    policies = diff["policies"]
+    return {
+        "revision": revision,
+        "policies": {
+            "created": [policy['name'] for policy in policies["created"]],
+            "updated": [policy['name'] for policy in policies["updated"]],
+            "deleted": policies["deleted"],
+        },
+        "rules": {
+            "created": sum(len(rules) for rules in diff["rules"]["insert"].values()),
+            "deleted": len(diff["rules"]["delete"]),
+            "unchanged": diff["rules"]["unchanged"],
+        },
+    }
+
+
+def _apply(firewall_id, stored, diff):
+    changes = []
+    policies = diff["policies"]
+
+    rule_ids = diff["rules"]["delete"]
+    for chunk in _chunks(rule_ids):
+        db.session.execute(delete(Rule).where(Rule.id.in_(chunk)))
+    policy_of_rule = {
+        rule_id: policy["id"]
+        for policy in stored.values() for ids in policy["rules"].values() for rule_id in ids
+    }
+    changes += [('rule', rule_id, 'delete', {"policy_id": policy_of_rule[rule_id]}) for rule_id in rule_ids]
+
+    deleted_ids = [stored[name]["id"] for name in policies["deleted"]]
+    for chunk in _chunks(deleted_ids):
+        db.session.execute(delete(Policy).where(Policy.id.in_(chunk)))
+    changes += [('policy', policy_id, 'delete', None) for policy_id in deleted_ids]
+
+    if policies["updated"]:
+        db.session.execute(update(Policy), [
+            {"id": stored[policy['name']]["id"], "status": policy.get('status', 'active')}
+            for policy in policies["updated"]
+        ])
+        rows = db.session.execute(
+            select(*(getattr(Policy, field) for field in POLICY_FIELDS))
+            .where(Policy.id.in_([stored[policy['name']]["id"] for policy in policies["updated"]]))
+        )
+        changes += [('policy', row.id, 'update', row_to_dict(row)) for row in rows]
+
+    policy_ids = {name: policy["id"] for name, policy in stored.items()}
+    if policies["created"]:
+        rows = insert_returning(Policy, [getattr(Policy, field) for field in POLICY_FIELDS], [
+            {"name": policy['name'], "status": policy.get('status', 'active'), "firewall_id": firewall_id}
+            for policy in policies["created"]
+        ])
+        for row in rows:
+            policy_ids[row.name] = row.id
+            changes.append(('policy', row.id, 'create', row_to_dict(row)))
+
+    inserts = [
+        {"policy_id": policy_ids[name], "protocol": protocol, "destination_ip": destination_ip,
+         **network_columns(destination_ip)}
+        for name, keys in diff["rules"]["insert"].items() for protocol, destination_ip in keys
+    ]
+    for chunk in _chunks(inserts):
+        rows = insert_returning(Rule, [getattr(Rule, field) for field in RULE_FIELDS], chunk)
+        changes += [('rule', row.id, 'create', row_to_dict(row)) for row in rows]
+
+    record_firewall_changes(firewall_id, changes)
+
+
+def sync_firewall_config(firewall_id, desired, dry_run=False):
+    """
+    Make the policies and rules of a firewall match ``desired`` (as loaded by
+    FirewallConfigSchema) in a single transaction, writing only the
+    differences, and return a summary of the changes.
+
+    Rules are matched on their content: a changed rule is deleted and
+    created anew. With ``dry_run`` the summary is computed but nothing is
+    written.
+    """
+    # Lock the firewall row (where the backend supports it) so concurrent
+    # syncs of the same firewall apply one after the other.
+    revision = db.session.execute(
+        select(Firewall.revision).where(Firewall.id == firewall_id).with_for_update()
+    ).scalar()
+    if revision is None:
+        raise ValueError(f"Firewall with ID {firewall_id} does not exist.")
+
+    stored = _load_state(firewall_id)
+    diff = diff_config(stored, desired)
+    summary = _summary(diff, revision)
+    changed = any(diff["policies"].values()) or diff["rules"]["insert"] or diff["rules"]["delete"]
+    if dry_run or not changed:
+        db.session.rollback()
+        return summary
+
+    try:
+        _apply(firewall_id, stored, diff)
+        summary["revision"] = db.session.execute(
+            select(Firewall.revision).where(Firewall.id == firewall_id)
+        ).scalar_one()
+        db.session.commit()
+    except IntegrityError as error:
+        db.session.rollback()
+        if violated_unique_column(error, ('name',)) is None:
+            raise
+        raise ValueError("A policy with one of these names already exists for another firewall.") from error
+    return summary
@@ -0,0 +1,104 @@
+from sqlalchemy import or_, select
+from app import db
+from app.models.policy import Policy
+from app.models.rule import Rule
+from app.services.change_service import get_firewall_revision
+from app.utils.ipnet import ADDRESS_BITS, address_to_int, network_to_int
+
+ANY_PROTOCOL = None
+
+_matchers = {}
+
+
+class RuleMatcher:
+    """
+    Rules of a firewall compiled for matching.
+
+    Rules are grouped by protocol, then by prefix length, each prefix length
+    mapping the network bits to the ids of the rules on that network. Matching
+    a packet costs one dict lookup per distinct prefix length of its protocol,
+    independently of the number of rules.
+    """
+
+    def __init__(self, rules=()):
+        self._index = {}
+        for rule_id, protocol, destination_ip in rules:
+            try:
+                network, prefixlen = network_to_int(destination_ip) if destination_ip else (0, 0)
+            except ValueError:
+                continue  # Unparsable destinations can never match a packet.
+            self._add(rule_id, protocol, network, prefixlen)
+        self._compile()
+
+    @classmethod
+    def from_networks(cls, rules):
+        """
+        Build a matcher from ``(rule_id, protocol, network_start, prefixlen)``
+        rows, i.e. the network columns of the rules, without parsing addresses.
+        """
+        matcher = cls()
+        for rule_id, protocol, network, prefixlen in rules:
+            matcher._add(rule_id, protocol, network or 0, prefixlen or 0)
+        matcher._compile()
+        return matcher
+
+    def _add(self, rule_id, protocol, network, prefixlen):
+        protocol = protocol.upper() if protocol else ANY_PROTOCOL
+        by_prefixlen = self._index.setdefault(protocol, {})
+        by_network = by_prefixlen.setdefault(prefixlen, {})
+        by_network.setdefault(network >> (ADDRESS_BITS - prefixlen), []).append(rule_id)
+
+    def _compile(self):
+        self._tables = {
+            protocol: [
+                (ADDRESS_BITS - prefixlen, by_network)
+                for prefixlen, by_network in sorted(by_prefixlen.items())
+            ]
+            for protocol, by_prefixlen in self._index.items()
+        }
+
+    def match(self, destination_ip, protocol):
+        address = address_to_int(destination_ip)
+        matches = []
+        for tables in (self._tables.get(protocol.upper(), ()), self._tables.get(ANY_PROTOCOL, ())):
+            for shift, by_network in tables:
+                rule_ids = by_network.get(address >> shift)
+                if rule_ids:
+                    matches.extend(rule_ids)
+        matches.sort()
+        return matches
+
+
+def get_matcher(firewall_id):
+    """
+    Return the compiled matcher of a firewall's active rules. Matchers are
+    cached per process and recompiled when the firewall revision changes.
+    """
+    validators = get_firewall_revision(firewall_id)
+    if validators is None:
+        raise ValueError(f"Firewall with ID {firewall_id} does not exist.")
+
+    cached = _matchers.get(firewall_id)
+    if cached and cached[0] == validators:
+        return cached[1]
+
+    # Rules whose destination could not be parsed have no network and are
+    # left out; rules without a destination match any address.
+    query = (
+        select(Rule.id, Rule.protocol, Rule.network_start, Rule.prefixlen)
+        .join(Policy, Rule.policy_id == Policy.id)
+        .where(
+            Policy.firewall_id == firewall_id,
+            Policy.status == 'active',
+            or_(Rule.network_start.isnot(None), Rule.destination_ip.is_(None)),
+        )
+    )
+    matcher = RuleMatcher.from_networks(db.session.execute(query))
+    _matchers[firewall_id] = (validators, matcher)
+    return matcher
+
+
+def evaluate_packets(firewall_id, packets):
+    """Return, for each packet, the ids of the firewall rules it matches."""
+    matcher = get_matcher(firewall_id)
+    return [matcher.match(packet['destination_ip'], packet['protocol']) for packet in packets]
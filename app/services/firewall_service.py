@@ -1,51 +1,121 @@
+from sqlalchemy import or_, select
+from sqlalchemy.exc import IntegrityError
 from app import db
 from app.models.firewall import Firewall
+from app.models.policy import Policy
+from app.models.rule import Rule
+from app.services.change_service import record_change
+from app.services.policy_service import POLICY_FIELDS, get_policies_tree
+from app.services.rule_service import RULE_FIELDS
+from app.utils.db_errors import violated_unique_column
+from app.utils.pagination import select_page
+from app.utils.statements import update_returning
+from app.utils.serialization import instance_to_dict, row_to_dict
+
+FIREWALL_FIELDS = ('id', 'name', 'description', 'ip_address', 'created_at', 'updated_at', 'revision')
+# The revision of a change is the id of the change itself.
+CHANGE_FIELDS = FIREWALL_FIELDS[:-1]
+EXPORT_BATCH_SIZE = 1000
+
+UNIQUE_FIREWALL_COLUMNS = ('name', 'ip_address')
+
+def _integrity_error(error, messages):
+    db.session.rollback()
+    column = violated_unique_column(error, UNIQUE_FIREWALL_COLUMNS)
+    if column is None:
+        return error
+    return ValueError(messages[column])
 
 def create_firewall(data):
-    existing_firewall_by_name = db.session.query(Firewall).filter_by(name=data['name']).first()
-    if existing_firewall_by_name:
-        raise ValueError(f"A firewall with the name '{data['name']}' already exists.")
-    
-    existing_firewall_by_ip = db.session.query(Firewall).filter_by(ip_address=data['ip_address']).first()
-    if existing_firewall_by_ip:
-        raise ValueError(f"A firewall with the IP address '{data['ip_address']}' already exists.")
-    
     firewall = Firewall(
         name=data['name'],
         description=data.get('description', ''),
         ip_address=data['ip_address']
     )
     db.session.add(firewall)
-    db.session.commit()
+    try:
+        db.session.flush()
+        record_change('firewall', firewall.id, 'create', instance_to_dict(firewall, CHANGE_FIELDS), firewall.id)
+        db.session.commit()
+    except IntegrityError as error:
+        raise _integrity_error(error, {
+            'name': f"A firewall with the name '{data['name']}' already exists.",
+            'ip_address': f"A firewall with the IP address '{data['ip_address']}' already exists.",
+        }) from error
     return firewall
 
 def get_firewalls():
     firewalls = db.session.query(Firewall).all()
     return firewalls
 
+def get_firewalls_tree(limit=None, after_id=None, fields=None, expand=('policies', 'rules')):
+    """
+    Serialize a page of firewalls with the nested levels listed in ``expand``.
+
+    Each level is loaded with a single query (firewalls, policies, rules)
+    regardless of its size, and built from row tuples instead of ORM instances.
+    Returns the firewalls and the cursor of the next page, if any.
+    """
+    firewalls, next_cursor = select_page(
+        Firewall, fields or FIREWALL_FIELDS, limit=limit, after_id=after_id
+    )
+    if not firewalls or not expand:
+        return firewalls, next_cursor
+
+    firewalls_by_id = {firewall['id']: firewall for firewall in firewalls}
+    for firewall in firewalls:
+        firewall['policies'] = []
+    paginated = limit is not None or after_id is not None
+    policies, _ = get_policies_tree(
+        list(firewalls_by_id) if paginated else None,
+        expand=('rules',) if 'rules' in expand else (),
+    )
+    for policy in policies:
+        firewalls_by_id[policy['firewall_id']]['policies'].append(policy)
+    return firewalls, next_cursor
+
+def export_config():
+    """
+    Yield every firewall, then every policy, then every rule as flat records
+    tagged with their ``type``. Rows are fetched in batches of
+    EXPORT_BATCH_SIZE, so memory use does not depend on the database size.
+    """
+    for record_type, model, fields in (
+        ('firewall', Firewall, FIREWALL_FIELDS),
+        ('policy', Policy, POLICY_FIELDS),
+        ('rule', Rule, RULE_FIELDS),
+    ):
+        query = (
+            select(*(getattr(model, field) for field in fields))
+            .order_by(model.id)
+            .execution_options(yield_per=EXPORT_BATCH_SIZE)
+        )
+        for row in db.session.execute(query):
+            yield dict(row_to_dict(row), type=record_type)
+
 def get_firewall(firewall_id):
     return db.session.get(Firewall, firewall_id)
 
 def update_firewall(firewall_id, data):
-    firewall = db.session.get(Firewall, firewall_id)
-    if not firewall:
-        raise ValueError("Firewall not found")
-    
-    if 'name' in data:
-        existing_firewall = Firewall.query.filter_by(name=data['name']).first()
-        if existing_firewall and existing_firewall.id != firewall_id:
-            raise ValueError("A firewall with this name already exists.")
-
-    if 'ip_address' in data:
-        existing_firewall = Firewall.query.filter_by(ip_address=data['ip_address']).first()
-        if existing_firewall and existing_firewall.id != firewall_id:
-            raise ValueError("A firewall with this IP address already exists.")
-
-    firewall.name = data.get('name', firewall.name)
-    firewall.description = data.get('description', firewall.description)
-    firewall.ip_address = data.get('ip_address', firewall.ip_address)
-    db.session.commit()
-    
+    values = {key: data[key] for key in ('name', 'description', 'ip_address') if key in data}
+    # Only a value that differs updates the firewall and bumps its revision.
+    criteria = [Firewall.id == firewall_id]
+    if values:
+        criteria.append(or_(*(getattr(Firewall, key).is_distinct_from(value) for key, value in values.items())))
+    try:
+        firewall = update_returning(Firewall, criteria, values) if values else None
+        if firewall is not None:
+            record_change('firewall', firewall_id, 'update', instance_to_dict(firewall, CHANGE_FIELDS), firewall_id)
+        db.session.commit()
+    except IntegrityError as error:
+        raise _integrity_error(error, {
+            'name': "A firewall with this name already exists.",
+            'ip_address': "A firewall with this IP address already exists.",
+        }) from error
+    if firewall is None:
+        firewall = db.session.get(Firewall, firewall_id)
+        if firewall is None:
+            raise ValueError("Firewall not found")
     return firewall
 
 def delete_firewall(firewall_id):
@@ -54,4 +124,5 @@ def delete_firewall(firewall_id):
         raise ValueError("Firewall not found")
     
     db.session.delete(firewall)
+    record_change('firewall', firewall_id, 'delete', firewall_id=firewall_id)
     db.session.commit()
\ No newline at end of file
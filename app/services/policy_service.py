@@ -1,32 +1,70 @@
+from sqlalchemy.exc import IntegrityError
 from app import db
 from app.models.policy import Policy
-from app.models.firewall import Firewall
+from app.services.change_service import record_change
+from app.services.rule_service import get_rules_rows
+from app.utils.db_errors import is_foreign_key_violation, violated_unique_column
+from app.utils.pagination import select_page
+from app.utils.serialization import instance_to_dict
+from app.utils.statements import update_returning
+
+POLICY_FIELDS = ('id', 'name', 'firewall_id', 'created_at', 'updated_at', 'status')
+
+def _integrity_error(error, data, unique_message):
+    db.session.rollback()
+    if is_foreign_key_violation(error):
+        return ValueError(f"Firewall with ID {data['firewall_id']} does not exist.")
+    if violated_unique_column(error, ('name',)) is None:
+        return error
+    return ValueError(unique_message)
 
 def create_policy(data):
-    firewall = db.session.get(Firewall, data['firewall_id'])
-    if not firewall:
-        raise ValueError(f"Firewall with ID {data['firewall_id']} does not exist.")
-    
     status = data.get('status', 'active')
     if status not in ['active', 'inactive']:
         raise ValueError("Invalid status. Must be either 'active' or 'inactive'.")
-    
-    existing_policy = db.session.query(Policy).filter_by(name=data['name'], firewall_id=data['firewall_id']).first()
-    if existing_policy:
-        raise ValueError(f"A policy with the name '{data['name']}' already exists for this firewall.")
-    
+
     policy = Policy(
         name=data['name'],
         firewall_id=data['firewall_id'],
         status=status,
     )
     db.session.add(policy)
-    db.session.commit()
+    try:
+        db.session.flush()
+        record_change(
+            'policy', policy.id, 'create', instance_to_dict(policy, POLICY_FIELDS), data['firewall_id']
+        )
+        db.session.commit()
+    except IntegrityError as error:
+        raise _integrity_error(
+            error, data, f"A policy with the name '{data['name']}' already exists for this firewall."
+        ) from error
     return policy
 
 def get_policies_of_firewall(firewall_id):
     return Policy.query.filter_by(firewall_id=firewall_id).all()
 
+def get_policies_tree(firewall_ids=None, limit=None, after_id=None, fields=None, expand=('rules',)):
+    """
+    Serialize policies, with their rules when ``expand`` asks for them, using
+    one query per level. Returns the policies and the next page cursor.
+    """
+    criteria = [] if firewall_ids is None else [Policy.firewall_id.in_(firewall_ids)]
+    policies, next_cursor = select_page(
+        Policy, fields or POLICY_FIELDS, *criteria, limit=limit, after_id=after_id
+    )
+    if not policies or 'rules' not in expand:
+        return policies, next_cursor
+
+    policies_by_id = {policy['id']: policy for policy in policies}
+    for policy in policies:
+        policy['rules'] = []
+    paginated = firewall_ids is not None or limit is not None or after_id is not None
+    rules, _ = get_rules_rows(list(policies_by_id) if paginated else None)
+    for rule in rules:
+        policies_by_id[rule['policy_id']]['rules'].append(rule)
+    return policies, next_cursor
+
 def get_policy(firewall_id, policy_id):
     policy = db.session.query(Policy).filter_by(id=policy_id, firewall_id=firewall_id).first()
     if not policy:
@@ -34,16 +72,22 @@ def get_policy(firewall_id, policy_id):
     return policy
 
 def update_policy(data):
-    policy = db.session.get(Policy, data["policy_id"])
-    new_name = data.get('name', policy.name)
-    existing_policy = db.session.query(Policy).filter_by(name=new_name).first()
-    
-    if existing_policy and existing_policy.id != policy.id:
-        raise ValueError(f"A policy with the name '{new_name}' already exists.")
-
-    policy.name = new_name
-    policy.status = data.get('status', policy.status)    
-    db.session.commit()
+    values = {key: data[key] for key in ('name', 'status') if key in data}
+    try:
+        policy = update_returning(
+            Policy, [Policy.id == data["policy_id"], Policy.firewall_id == data["firewall_id"]], values
+        )
+        if policy is not None:
+            record_change(
+                'policy', policy.id, 'update', instance_to_dict(policy, POLICY_FIELDS), policy.firewall_id
+            )
+        db.session.commit()
+    except IntegrityError as error:
+        raise _integrity_error(
+            error, data, f"A policy with the name '{data.get('name')}' already exists."
+        ) from error
+    if policy is None:
+        raise ValueError(f"Policy with ID {data['policy_id']} does not exist.")
     return policy
 
 def delete_policy(policy_id):
@@ -52,4 +96,5 @@ def delete_policy(policy_id):
         raise ValueError(f"Policy with ID {policy_id} does not exist.")
     
     db.session.delete(policy)
+    record_change('policy', policy_id, 'delete', firewall_id=policy.firewall_id)
     db.session.commit()
\ No newline at end of file
@@ -0,0 +1,254 @@
+import ipaddress
+import re
+from functools import lru_cache
+from sqlalchemy import select
+from app import db
+from app.models.firewall import Firewall
+from app.models.policy import Policy
+from app.models.rule import Rule
+from app.services.change_service import get_changes
+
+FORMATS = ('nftables', 'iptables-restore', 'ip6tables-restore')
+PROTOCOL_NAME = re.compile(r'^[a-z][a-z0-9-]*$')
+
+_renders = {}
+
+
+class PolicyChain:
+    """
+    The rules of one active policy, normalized once and rendered lazily to
+    each format. Chains are reused across revisions until the policy or one
+    of its rules changes.
+    """
+
+    def __init__(self, policy_id, name, rules):
+        self.id = policy_id
+        self.name = name
+        self.rules = []
+        self.skipped = []
+        for rule_id, protocol, destination_ip in rules:
+            try:
+                self.rules.append((rule_id, *_normalize(protocol, destination_ip)))
+            except ValueError as error:
+                self.skipped.append((rule_id, str(error)))
+        self._fragments = {}
+
+    def render(self, format):
+        if format not in self._fragments:
+            self._fragments[format] = ''.join(RENDERERS[format].chain(self))
+        return self._fragments[format]
+
+
+class FirewallRender:
+    """
+    Rendering state of a firewall at a given revision. Renders are replaced,
+    never modified, so concurrent requests may share them.
+    """
+
+    def __init__(self, created_at, name, revision, validators, chains):
+        self.created_at = created_at
+        self.name = name
+        self.revision = revision
+        self.validators = validators
+        self.chains = chains
+        self.texts = {}
+
+
+def _normalize(protocol, destination_ip):
+    """Return the ``(version, destination, protocol)`` of a rule, version being None for any address."""
+    protocol = protocol.lower() if protocol else None
+    if protocol and not PROTOCOL_NAME.match(protocol):
+        raise ValueError(f"unsupported protocol {protocol!r}")
+    if not destination_ip:
+        return None, None, protocol
+    return (*_parse_destination(destination_ip), protocol)
+
+
+@lru_cache(maxsize=65536)
+def _parse_destination(destination_ip):
+    """Return the ``(version, destination)`` of an address or CIDR prefix in canonical form."""
+    try:
+        # Most rules target a single host, which parses twice as fast as a network.
+        address = ipaddress.ip_address(destination_ip)
+        return address.version, str(address)
+    except ValueError:
+        pass
+    try:
+        network = ipaddress.ip_network(destination_ip, strict=False)
+    except ValueError:
+        raise ValueError(f"invalid destination {destination_ip!r}")
+    if network.prefixlen == network.max_prefixlen:
+        return network.version, str(network.network_address)
+    return network.version, str(network)
+
+
+def _comment(text):
+    return ' '.join(str(text).split()).replace('"', "'")
+
+
+class NftablesRenderer:
+    """One ``inet`` table replaced atomically by ``nft -f``, one chain per policy."""
+
+    @staticmethod
+    def chain(chain):
+        yield f'\t# Policy {chain.id}: {_comment(chain.name)}\n'
+        yield f'\tchain policy_{chain.id} {{\n'
+        for rule_id, version, destination, protocol in chain.rules:
+            match = []
+            if destination:
+                match.append(f"{'ip' if version == 4 else 'ip6'} daddr {destination}")
+            if protocol == 'icmp':
+                if version == 6:
+                    match.append('meta l4proto ipv6-icmp')
+                elif version == 4:
+                    match.append('meta l4proto icmp')
+                else:
+                    match.append('meta l4proto { icmp, ipv6-icmp }')
+            elif protocol:
+                match.append(f'meta l4proto {protocol}')
+            yield f"\t\t{' '.join(match + ['accept'])} comment \"rule {rule_id}\"\n"
+        for rule_id, reason in chain.skipped:
+            yield f'\t\t# rule {rule_id} skipped: {_comment(reason)}\n'
+        yield '\t}\n'
+
+    @staticmethod
+    def ruleset(render, chains):
+        yield f'# Generated by JouerFlux for firewall "{_comment(render.name)}" at revision {render.revision}.\n'
+        yield 'table inet jouerflux\n'
+        yield 'delete table inet jouerflux\n'
+        yield 'table inet jouerflux {\n'
+        yield '\tchain forward {\n'
+        yield '\t\ttype filter hook forward priority filter; policy drop;\n'
+        yield '\t\tct state established,related accept\n'
+        for chain in chains:
+            yield f'\t\tjump policy_{chain.id}\n'
+        yield '\t}\n'
+        for chain in chains:
+            yield chain.render('nftables')
+        yield '}\n'
+
+
+class IptablesRenderer:
+    """
+    An ``iptables-restore`` (or ``ip6tables-restore``) filter table, one
+    chain per policy. Rules on the other address family are left out.
+    """
+
+    def __init__(self, version):
+        self.version = version
+        self.format = 'iptables-restore' if version == 4 else 'ip6tables-restore'
+
+    def chain(self, chain):
+        for rule_id, version, destination, protocol in chain.rules:
+            if version not in (None, self.version):
+                continue
+            match = [f'-A JF-POLICY-{chain.id}']
+            if destination:
+                match.append(f'-d {destination}')
+            if protocol:
+                match.append(f"-p {'ipv6-icmp' if protocol == 'icmp' and self.version == 6 else protocol}")
+            yield f"{' '.join(match)} -m comment --comment \"rule {rule_id}\" -j ACCEPT\n"
+        for rule_id, reason in chain.skipped:
+            yield f'# rule {rule_id} skipped: {_comment(reason)}\n'
+
+    def ruleset(self, render, chains):
+        yield f'# Generated by JouerFlux for firewall "{_comment(render.name)}" at revision {render.revision}.\n'
+        yield '*filter\n'
+        yield ':JOUERFLUX - [0:0]\n'
+        for chain in chains:
+            yield f':JF-POLICY-{chain.id} - [0:0]\n'
+        yield '-A FORWARD -j JOUERFLUX\n'
+        yield '-A JOUERFLUX -m conntrack --ctstate ESTABLISHED,RELATED -j ACCEPT\n'
+        for chain in chains:
+            yield f'# Policy {chain.id}: {_comment(chain.name)}\n'
+            yield f'-A JOUERFLUX -j JF-POLICY-{chain.id}\n'
+            yield chain.render(self.format)
+        yield '-A JOUERFLUX -j DROP\n'
+        yield 'COMMIT\n'
+
+
+RENDERERS = {
+    'nftables': NftablesRenderer(),
+    'iptables-restore': IptablesRenderer(4),
+    'ip6tables-restore': IptablesRenderer(6),
+}
+
+
+def _load_chains(firewall_id, policy_ids=None):
+    """
+    Build the chains of the active policies of a firewall, or only of those
+    among ``policy_ids``, with a single query for their rules.
+    """
+    query = select(Policy.id, Policy.name).where(Policy.firewall_id == firewall_id, Policy.status == 'active')
+    if policy_ids is not None:
+        query = query.where(Policy.id.in_(policy_ids))
+    policies = db.session.execute(query).all()
+    rules = {policy_id: [] for policy_id, _ in policies}
+    if rules:
+        rows = db.session.execute(
+            select(Rule.policy_id, Rule.id, Rule.protocol, Rule.destination_ip)
+            .where(Rule.policy_id.in_(rules))
+            .order_by(Rule.policy_id, Rule.id)
+        )
+        for policy_id, *rule in rows:
+            rules[policy_id].append(rule)
+    return {policy_id: PolicyChain(policy_id, name, rules[policy_id]) for policy_id, name in policies}
+
+
+def _dirty_policies(changes):
+    """Ids of the policies touched by ``changes``, or None if they cannot all be told."""
+    dirty = set()
+    for change in changes:
+        if change['entity'] == 'policy':
+            dirty.add(change['entity_id'])
+        elif change['entity'] == 'rule':
+            if not change['data'] or 'policy_id' not in change['data']:
+                return None
+            dirty.add(change['data']['policy_id'])
+    return dirty
+
+
+def _rebuild_chains(previous, firewall_id, revision):
+    """Chains of the firewall at ``revision``, reusing those of ``previous`` that did not change."""
+    if previous is None or previous.revision > revision:
+        return _load_chains(firewall_id)
+    changes, has_more = get_changes(previous.revision, firewall_id)
+    dirty = None if has_more else _dirty_policies(changes)
+    if dirty is None:
+        return _load_chains(firewall_id)
+
+    chains = {policy_id: chain for policy_id, chain in previous.chains.items() if policy_id not in dirty}
+    if dirty:
+        chains.update(_load_chains(firewall_id, dirty))
+    return dict(sorted(chains.items()))
+
+
+def render_firewall(firewall_id, format):
+    """
+    Render the active policies of a firewall to a deployable ruleset.
+
+    Renders are cached per process and per firewall revision. When the
+    revision moves on, the change feed tells which policies were touched and
+    only their chains are rebuilt.
+    """
+    if format not in RENDERERS:
+        raise ValueError(f"Unknown format {format!r}, expected one of: {', '.join(FORMATS)}.")
+
+    firewall = db.session.execute(
+        select(Firewall.name, Firewall.created_at, Firewall.revision, Firewall.updated_at)
+        .where(Firewall.id == firewall_id)
+    ).one_or_none()
+    if firewall is None:
+        raise ValueError(f"Firewall with ID {firewall_id} does not exist.")
+    name, created_at, revision, updated_at = firewall
+
+    render = _renders.get(firewall_id)
+    if render is None or render.validators != (revision, updated_at):
+        # A new firewall may reuse the id of a deleted one.
+        previous = render if render is not None and render.created_at == created_at else None
+        chains = _rebuild_chains(previous, firewall_id, revision)
+        render = _renders[firewall_id] = FirewallRender(created_at, name, revision, (revision, updated_at), chains)
+
+    if format not in render.texts:
+        render.texts[format] = ''.join(RENDERERS[format].ruleset(render, list(render.chains.values())))
+    return render.texts[format]
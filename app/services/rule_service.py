@@ -1,8 +1,22 @@
+from itertools import islice
+from sqlalchemy import select
+from marshmallow import ValidationError
 from app.models.firewall import Firewall
 from app.models.policy import Policy
-from app.models.rule import Rule
+from app.models.rule import Rule, network_columns
+from app.schemas.rule_schema import RuleSchema
+from app.services.change_service import record_change, record_changes
+from app.utils.ipnet import covering_networks, network_range
+from app.utils.pagination import select_page
+from app.utils.serialization import instance_to_dict, row_to_dict
+from app.utils.statements import insert_returning
 from app import db
 
+RULE_FIELDS = ('id', 'policy_id', 'destination_ip', 'protocol', 'created_at', 'updated_at')
+BULK_CHUNK_SIZE = 1000
+
+bulk_rule_schema = RuleSchema(many=True)
+
 
 def create_rule(data):
     firewall = db.session.get(Firewall, data['firewall_id'])
@@ -23,14 +37,98 @@ def create_rule(data):
         protocol=data.get('protocol')
     )
     db.session.add(rule)
+    db.session.flush()
+    record_change('rule', rule.id, 'create', instance_to_dict(rule, RULE_FIELDS), policy.firewall_id)
     db.session.commit()
     return rule
 
+def _validate_chunk(chunk):
+    try:
+        loaded, messages = bulk_rule_schema.load(chunk), {}
+    except ValidationError as err:
+        loaded, messages = err.valid_data, err.messages
+
+    rows, errors = [], []
+    for index, row in enumerate(loaded):
+        if index in messages:
+            errors.append((index, messages[index]))
+        elif not row.get('destination_ip'):
+            errors.append((index, {"destination_ip": ["Destination IP and protocol are required."]}))
+        else:
+            rows.append(row)
+    return rows, errors
+
+def create_rules_bulk(firewall_id, policy_id, items, atomic=False):
+    """
+    Validate and insert an iterable of rule payloads in a single transaction.
+
+    Payloads are consumed in chunks of BULK_CHUNK_SIZE, each chunk validated
+    at once and inserted with a single executemany statement. Invalid rows are
+    reported by index and skipped, unless ``atomic`` is set, in which case any
+    error rolls back the whole batch. Returns the number of created rules and
+    the list of errors.
+    """
+    policy = db.session.query(Policy.id).filter_by(id=policy_id, firewall_id=firewall_id).first()
+    if not policy:
+        raise ValueError(f"Policy with ID {policy_id} does not exist for this firewall.")
+
+    items = iter(items)
+    created, errors, offset = 0, [], 0
+    while chunk := list(islice(items, BULK_CHUNK_SIZE)):
+        rows, chunk_errors = _validate_chunk(chunk)
+        errors.extend({"index": offset + index, "error": error} for index, error in chunk_errors)
+        offset += len(chunk)
+        if rows and not (atomic and errors):
+            inserted = insert_returning(
+                Rule,
+                [getattr(Rule, field) for field in RULE_FIELDS],
+                [dict(row, policy_id=policy_id, **network_columns(row['destination_ip'])) for row in rows],
+            )
+            record_changes('rule', 'create', [row_to_dict(row) for row in inserted], policy_id)
+            created += len(rows)
+
+    if atomic and errors:
+        db.session.rollback()
+        return 0, errors
+    db.session.commit()
+    return created, errors
+
 def get_rules_of_policy(policy_id):
     return Rule.query.filter_by(policy_id=policy_id).all()
 
-def get_rule(rule_id):
-    rule = db.session.get(Rule, rule_id)
+def network_criteria(contains=None, within=None):
+    """
+    Criteria selecting the rules whose destination contains the address
+    ``contains`` or lies within the network ``within``. Both are resolved on
+    the ix_rule_network index: a containing network starts at the address
+    masked to one of the 129 prefix lengths, a network within another starts
+    in its range.
+    """
+    criteria = []
+    if contains is not None:
+        criteria += [
+            Rule.network_start.in_(covering_networks(contains)),
+            Rule.network_end >= network_range(contains)[0],
+        ]
+    if within is not None:
+        start, end, _ = network_range(within)
+        criteria += [Rule.network_start.between(start, end), Rule.network_end <= end]
+    return criteria
+
+def get_rules_rows(policy_ids=None, limit=None, after_id=None, fields=None, contains=None, within=None):
+    """Serialize rules straight from row tuples, in a single query."""
+    criteria = [] if policy_ids is None else [Rule.policy_id.in_(policy_ids)]
+    criteria += network_criteria(contains, within)
+    return select_page(Rule, fields or RULE_FIELDS, *criteria, limit=limit, after_id=after_id)
+
+def get_rule(rule_id, policy_id=None, firewall_id=None):
+    """Return a rule, which must belong to ``policy_id`` and ``firewall_id`` when given."""
+    query = select(Rule).where(Rule.id == rule_id)
+    if policy_id is not None:
+        query = query.where(Rule.policy_id == policy_id)
+    if firewall_id is not None:
+        query = query.join(Policy, Policy.id == Rule.policy_id).where(Policy.firewall_id == firewall_id)
+    rule = db.session.execute(query).scalar_one_or_none()
     if not rule:
         raise ValueError(f"Rule with ID {rule_id} does not exist.")
     return rule
@@ -42,6 +140,8 @@ def update_rule(data):
 
     rule.destination_ip = data.get('destination_ip', rule.destination_ip)
     rule.protocol = data.get('protocol', rule.protocol)
+    db.session.flush()
+    record_change('rule', rule.id, 'update', instance_to_dict(rule, RULE_FIELDS), policy_id=rule.policy_id)
     db.session.commit()
     return rule
 
@@ -51,4 +151,5 @@ def delete_rule(rule_id):
         raise ValueError(f"Rule with ID {rule_id} does not exist.")
     
     db.session.delete(rule)
+    record_change('rule', rule_id, 'delete', {'policy_id': rule.policy_id}, policy_id=rule.policy_id)
     db.session.commit()
\ No newline at end of file
@@ -1,30 +1,66 @@
-from werkzeug.security import check_password_hash, generate_password_hash
+import time
 from flask_security import SQLAlchemyUserDatastore
-from app import db
+from app import db, password_hasher
 from app.models.user import User, Role
 from flask_jwt_extended import create_access_token
+from sqlalchemy.exc import IntegrityError
+from werkzeug.security import generate_password_hash
+from app.utils.db_errors import violated_unique_column
+from app.utils.token_revocation import revoke_user_tokens
 
 user_datastore = SQLAlchemyUserDatastore(db, User, Role)
 
 def login_user(email, password):
     user = User.query.filter_by(email=email).first()
-    if user and check_password_hash(user.password, password):
-        return create_access_token(identity=user.id)
+    if user and password_hasher.verify(user.password, password):
+        if password_hasher.needs_rehash(user.password):
+            user.password = password_hasher.hash(password)
+            db.session.commit()
+        return create_access_token(
+            identity=str(user.id),
+            additional_claims={"roles": [role.name for role in user.roles], "auth_time": time.time()}
+        )
     raise ValueError("Bad credentials")
 
+def seed_default_users(admin_email='admin@example.com', admin_password='password'):
+    """Create the admin and user roles and the default admin, unless they exist. Returns what was created."""
+    created = []
+    if not user_datastore.find_role("admin"):
+        user_datastore.create_role(name="admin", description="Admin Role")
+        created.append("role admin")
+    if not user_datastore.find_role("user"):
+        user_datastore.create_role(name="user", description="User Role")
+        created.append("role user")
+    if not user_datastore.find_user(email=admin_email):
+        user_datastore.create_user(
+            email=admin_email,
+            # Hashed inline: a one-off command has no use for the hashing pool.
+            password=generate_password_hash(admin_password, method=password_hasher.method),
+            roles=["admin"],
+            fs_uniquifier=admin_email
+        )
+        created.append(f"user {admin_email}")
+    db.session.commit()
+    return created
+
+def _commit_user(user, message):
+    try:
+        db.session.commit()
+    except IntegrityError as error:
+        db.session.rollback()
+        if violated_unique_column(error, ('email', 'fs_uniquifier')) is None:
+            raise
+        raise ValueError(message) from error
+    return user
+
 def register_user(data):
-    if user_datastore.find_user(email=data['email']):
-        raise ValueError("User already exists")
-    
     user = user_datastore.create_user(
         email=data['email'],
-        password=generate_password_hash(data['password'], method='pbkdf2:sha256'),
+        password=password_hasher.hash(data['password']),
         roles=["user"],
         fs_uniquifier=data['email']
     )
-    
-    db.session.commit()
-    return user
+    return _commit_user(user, "User already exists")
 
 def get_user_service(user_id):
     return User.query.get(user_id)
@@ -34,19 +70,14 @@ def update_user_service(user_id, data):
     if not user:
         raise ValueError("User not found")
 
-    if 'email' in data:
-        existing_user = User.query.filter_by(email=data['email']).first()
-        if existing_user and existing_user.id != user_id:
-            raise ValueError("Email already in use")
-
     if 'password' in data:
-        data['password'] = generate_password_hash(data['password'], method='pbkdf2:sha256')
+        data['password'] = password_hasher.hash(data['password'])
 
     for key, value in data.items():
         setattr(user, key, value)
 
-    db.session.commit()
-    return user
+    revoke_user_tokens(user.id)
+    return _commit_user(user, "Email already in use")
 
 def delete_user_service(user_id):
     user = User.query.get(user_id)
@@ -54,4 +85,5 @@ def delete_user_service(user_id):
         raise ValueError("User not found")
     
     db.session.delete(user)
+    revoke_user_tokens(user.id)
     db.session.commit()
\ No newline at end of file
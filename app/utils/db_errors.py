@@ -0,0 +1,17 @@
+def violated_unique_column(error, columns):
+    """
+    Return which of ``columns`` a unique constraint ``IntegrityError`` was
+    raised for, or None. Understands the SQLite ("UNIQUE constraint failed:
+    firewall.name"), PostgreSQL ('"firewall_name_key" ... Key (name)=') and
+    MySQL ("for key 'firewall.name'") messages.
+    """
+    message = str(error.orig)
+    for column in columns:
+        if f'.{column}' in message or f'({column})' in message or f'_{column}_key' in message:
+            return column
+    return None
+
+
+def is_foreign_key_violation(error):
+    """Tell whether an ``IntegrityError`` was raised by a foreign key constraint."""
+    return 'foreign key' in str(error.orig).lower()
@@ -1,20 +1,59 @@
+import datetime
 from functools import wraps
-from flask import request, jsonify
-from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
-from app.models.user import User
+from flask import make_response, request, jsonify
+from flask_jwt_extended import get_jwt, verify_jwt_in_request
+from app.services.change_service import get_firewall_revision
+from app.utils.profiling import timed
 
 def role_required(required_role):
+    """
+    Restrict a view to users holding ``required_role``. Roles are read from the
+    claims embedded in the token at login, so no database query is made.
+    """
     def decorator(func):
         @wraps(func)
         def wrapper(*args, **kwargs):
-            verify_jwt_in_request()
-            
-            user_id = get_jwt_identity()
-            
-            user = User.query.get(user_id)
-            if user is None or required_role not in [role.name for role in user.roles]:
+            with timed('auth'):
+                verify_jwt_in_request()
+                allowed = required_role in get_jwt().get('roles', ())
+
+            if not allowed:
                 return jsonify({"msg": "Unauthorized"}), 403
             
             return func(*args, **kwargs)
         return wrapper
-    return decorator
\ No newline at end of file
+    return decorator
+
+def firewall_etag(firewall_arg='firewall_id'):
+    """
+    Make a GET view under a firewall conditional on the firewall revision.
+
+    The ETag combines the revision and the last update of the firewall, which
+    change whenever the firewall, its policies or their rules do. A matching
+    If-None-Match is answered with 304 before the view runs, so nothing is
+    loaded or serialized beyond a one-row lookup. The ``policy_id`` and
+    ``rule_id`` of the URL must belong to the firewall; otherwise the view
+    runs without an ETag and answers 404.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            validators = get_firewall_revision(kwargs[firewall_arg], kwargs.get('policy_id'), kwargs.get('rule_id'))
+            if validators is None:
+                return func(*args, **kwargs)
+
+            revision, updated_at = validators
+            etag = f"{revision}-{updated_at.timestamp() if updated_at else 0}"
+            if request.if_none_match.contains(etag):
+                response = make_response('', 304)
+            else:
+                response = make_response(func(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            if updated_at:
+                response.last_modified = updated_at.astimezone(datetime.timezone.utc)
+            return response
+        return wrapper
+    return decorator
+
@@ -0,0 +1,140 @@
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """
+    The bounded inbox of one event stream client.
+
+    Once the inbox is full the broker drops the subscription instead of
+    buffering more events: ``overflowed`` is set and the client is expected
+    to reconnect and resume from the last event it received.
+    """
+
+    def __init__(self, maxsize, firewall_id=None):
+        self.firewall_id = firewall_id
+        self.overflowed = False
+        self._queue = queue.Queue(maxsize)
+
+    def accepts(self, event):
+        return self.firewall_id is None or event['firewall_id'] == self.firewall_id
+
+    def offer(self, event):
+        """Queue an event without blocking; return False if the inbox is full."""
+        try:
+            self._queue.put_nowait(event)
+            return True
+        except queue.Full:
+            self.overflowed = True
+            return False
+
+    def get(self, timeout):
+        """
+        Return the next event, or None if nothing arrived within ``timeout``
+        seconds. A dropped subscription returns None as soon as it is drained.
+        """
+        try:
+            return self._queue.get(block=not self.overflowed, timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class EventBroker:
+    """
+    In-process fan-out of committed changes to the event stream clients.
+
+    Publishing never blocks: each subscriber has an inbox of at most
+    ``EVENTS_QUEUE_SIZE`` events and a subscriber whose inbox is full is
+    dropped. Subscribers wait on a ``queue.Queue``, so under a gevent worker
+    every idle client is a parked greenlet rather than a thread.
+
+    With several worker processes, set ``EVENTS_POLL_SECONDS``: while a
+    process has subscribers, a background thread then reads the events
+    committed by any process from the source registered with ``poll_from``
+    and publishes them.
+    """
+
+    def __init__(self, app=None):
+        self.queue_size = 100
+        self.heartbeat_seconds = 15
+        self.poll_seconds = 0
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._app = None
+        self._source = None
+        self._poller = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.queue_size = app.config['EVENTS_QUEUE_SIZE']
+        self.heartbeat_seconds = app.config['EVENTS_HEARTBEAT_SECONDS']
+        self.poll_seconds = app.config['EVENTS_POLL_SECONDS']
+        self._app = app
+        app.extensions['event_broker'] = self
+
+    def poll_from(self, start, fetch):
+        """
+        Register where polling reads the events: ``start()`` returns the
+        cursor of the latest event, and ``fetch(cursor)`` the events after it
+        along with the next cursor. Both run in an application context.
+        """
+        self._source = (start, fetch)
+
+    @property
+    def polling(self):
+        return self.poll_seconds > 0 and self._source is not None
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def subscribe(self, firewall_id=None):
+        subscription = Subscription(self.queue_size, firewall_id)
+        with self._lock:
+            if self.polling and self._poller is None:
+                self._start_poller()
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self, events):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            for event in events:
+                if subscription.accepts(event) and not subscription.offer(event):
+                    self.unsubscribe(subscription)
+                    break
+
+    def _start_poller(self):
+        # Started on demand rather than with the app, so that no thread is
+        # lost when a pre-forking server forks its workers.
+        with self._app.app_context():
+            cursor = self._source[0]()
+        self._poller = threading.Thread(target=self._poll, args=(cursor,), name='event-poller', daemon=True)
+        self._poller.start()
+
+    def _poll(self, cursor):
+        fetch = self._source[1]
+        while True:
+            time.sleep(self.poll_seconds)
+            with self._lock:
+                if not self._subscribers or not self.polling:
+                    self._poller = None
+                    return
+            try:
+                with self._app.app_context():
+                    events, cursor = fetch(cursor)
+            except Exception:
+                logger.exception("Polling for events failed.")
+                continue
+            if events:
+                self.publish(events)
@@ -0,0 +1,48 @@
+import ipaddress
+
+ADDRESS_BITS = 128
+IPV4_MAPPED = 0xffff << 32
+
+
+def address_to_int(value):
+    """
+    Map an IPv4 or IPv6 address to an integer of the 128-bit IPv6 space,
+    IPv4 addresses being placed in the IPv4-mapped range (::ffff:0:0/96).
+    """
+    address = ipaddress.ip_address(value)
+    if address.version == 4:
+        return IPV4_MAPPED | int(address)
+    return int(address)
+
+
+def network_to_int(value):
+    """
+    Return the ``(network, prefixlen)`` of an address or CIDR prefix in the
+    same 128-bit space as ``address_to_int``.
+    """
+    network = ipaddress.ip_network(value, strict=False)
+    if network.version == 4:
+        return IPV4_MAPPED | int(network.network_address), network.prefixlen + 96
+    return int(network.network_address), network.prefixlen
+
+
+def network_range(value):
+    """
+    Return the ``(first, last, prefixlen)`` of an address or CIDR prefix in
+    the 128-bit space, the prefix length being counted in that space too.
+    """
+    network, prefixlen = network_to_int(value)
+    return network, network | ((1 << (ADDRESS_BITS - prefixlen)) - 1), prefixlen
+
+
+def covering_networks(value):
+    """First addresses of the networks of every prefix length containing an address."""
+    address = address_to_int(value)
+    return {address >> shift << shift for shift in range(ADDRESS_BITS + 1)}
+
+
+def int_to_network(network, prefixlen):
+    """Inverse of ``network_to_int``: the ipaddress network at ``network/prefixlen``."""
+    if prefixlen >= 96 and network >> 32 == 0xffff:
+        return ipaddress.IPv4Network((network & 0xffffffff, prefixlen - 96))
+    return ipaddress.IPv6Network((network, prefixlen))
@@ -0,0 +1,348 @@
+import glob
+import json
+import math
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from flask import current_app, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+
+try:
+    import fcntl
+except ImportError:  # Windows: several worker processes are not an option there.
+    fcntl = None
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+SIZE_BUCKETS = (128, 512, 2048, 8192, 32768, 131072, 524288, 2097152, 8388608)
+# Counts of the processes that exited, merged in one file of METRICS_DIR.
+EXITED_FILE = 'exited.json'
+
+
+class Counter:
+    """A monotonic counter per label values."""
+
+    type = 'counter'
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def snapshot(self):
+        with self._lock:
+            return [[list(labels), value] for labels, value in self._values.items()]
+
+    @staticmethod
+    def merge(total, values):
+        for labels, value in values:
+            key = tuple(labels)
+            total[key] = total.get(key, 0) + value
+
+    def samples(self, values):
+        for labels, value in sorted(values.items()):
+            yield self.name, self.labelnames, labels, value
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label values, as Prometheus expects it."""
+
+    type = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, labels=()):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            values = self._values.get(labels)
+            if values is None:
+                # Counts per bucket (the last one being +Inf), then the sum.
+                values = self._values[labels] = [0] * (len(self.buckets) + 2)
+            values[index] += 1
+            values[-1] += value
+
+    def snapshot(self):
+        with self._lock:
+            return [[list(labels), list(values)] for labels, values in self._values.items()]
+
+    @staticmethod
+    def merge(total, values):
+        for labels, counts in values:
+            key = tuple(labels)
+            if key in total:
+                total[key] = [a + b for a, b in zip(total[key], counts)]
+            else:
+                total[key] = list(counts)
+
+    def samples(self, values):
+        bucket_labelnames = self.labelnames + ('le',)
+        for labels, counts in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                yield f'{self.name}_bucket', bucket_labelnames, labels + (_format_value(bound),), cumulative
+            yield f'{self.name}_sum', self.labelnames, labels, counts[-1]
+            yield f'{self.name}_count', self.labelnames, labels, cumulative
+
+
+class InstrumentedQueuePool(QueuePool):
+    """A QueuePool timing how long checkouts wait for a connection."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            pool_wait.observe(time.perf_counter() - start)
+
+
+http_requests = Counter(
+    'jouerflux_http_requests_total', 'HTTP requests by route and status.',
+    ('blueprint', 'route', 'method', 'status'),
+)
+http_latency = Histogram(
+    'jouerflux_http_request_duration_seconds', 'Time to produce the response, streaming bodies excluded.',
+    ('blueprint', 'route', 'method'),
+)
+http_response_size = Histogram(
+    'jouerflux_http_response_size_bytes', 'Size of the response bodies of known length.',
+    ('blueprint', 'route', 'method'), SIZE_BUCKETS,
+)
+db_queries = Histogram(
+    'jouerflux_db_query_duration_seconds', 'SQL statements by the route that executed them.',
+    ('route',), QUERY_BUCKETS,
+)
+pool_wait = Histogram(
+    'jouerflux_db_pool_checkout_wait_seconds', 'Time spent waiting for a pooled connection.',
+    (), QUERY_BUCKETS,
+)
+METRICS = (http_requests, http_latency, http_response_size, db_queries, pool_wait)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _route_labels():
+    rule = request.url_rule
+    return request.blueprint or '', rule.rule if rule is not None else 'unmatched', request.method
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('metrics_query_start')
+    if starts:
+        route = 'none'
+        if has_request_context():
+            route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        db_queries.observe(time.perf_counter() - starts.pop(), (route,))
+
+
+def pool_status(pool, stat):
+    """The ``checkedout``, ``size`` or ``overflow`` of a queue pool, None for other pools."""
+    return getattr(pool, stat)() if isinstance(pool, QueuePool) else None
+
+
+def _read_snapshot(path):
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None  # Removed or being replaced meanwhile.
+
+
+def _write_snapshot(path, snapshot):
+    with open(f'{path}.tmp', 'w') as file:
+        json.dump(snapshot, file)
+    os.replace(f'{path}.tmp', path)
+
+
+@contextmanager
+def _directory_lock(directory):
+    with open(os.path.join(directory, '.lock'), 'a') as file:
+        if fcntl is not None:
+            fcntl.flock(file, fcntl.LOCK_EX)
+        yield
+
+
+def _merge_exited(directory, pid):
+    # Callers hold the directory lock.
+    path = os.path.join(directory, f'metrics-{pid}.json')
+    snapshot = _read_snapshot(path)
+    if snapshot is None:
+        return
+    exited_path = os.path.join(directory, EXITED_FILE)
+    exited = _read_snapshot(exited_path) or {"pid": None, "metrics": {}, "gauges": {}}
+    for metric in METRICS:
+        values = {}
+        for counts in (exited["metrics"], snapshot["metrics"]):
+            metric.merge(values, counts.get(metric.name, ()))
+        exited["metrics"][metric.name] = [[list(labels), value] for labels, value in values.items()]
+    _write_snapshot(exited_path, exited)
+    os.remove(path)
+
+
+def collect_exited_process(directory, pid):
+    """
+    Merge the counts of an exited process into the exited file of
+    ``directory`` and remove its own file, e.g. from gunicorn's
+    ``child_exit`` hook, so that recycled workers do not pile up files.
+    """
+    with _directory_lock(directory):
+        _merge_exited(directory, pid)
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class MetricsRegistry:
+    """
+    Request, SQL and pool metrics in the Prometheus text format.
+
+    Each process counts in memory behind one uncontended lock per metric.
+    With ``METRICS_DIR`` set, processes also write their counts to a file of
+    that directory (at most every ``METRICS_FLUSH_SECONDS``), and a scrape
+    served by any worker adds up the files of all of them. The files of
+    exited processes are merged into a single one, without their gauges,
+    which are read when scraped.
+    """
+
+    def __init__(self, app=None):
+        self.directory = None
+        self.flush_seconds = 1.0
+        self._gauges = {}
+        self._flushed_at = 0.0
+        self._flush_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Register the hooks. Must run before ``db.init_app`` to time pool checkouts."""
+        self.directory = app.config['METRICS_DIR']
+        self.flush_seconds = app.config['METRICS_FLUSH_SECONDS']
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+
+        options = dict(app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+        options.setdefault('poolclass', InstrumentedQueuePool)
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+        if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        app.extensions['metrics'] = self
+
+    def gauge(self, name, help, callback):
+        """Report ``callback()`` as a gauge, read at every scrape."""
+        self._gauges[name] = (help, callback)
+
+    @staticmethod
+    def _start():
+        request.environ['jouerflux.metrics_start'] = time.perf_counter()
+
+    def _finish(self, response):
+        start = request.environ.get('jouerflux.metrics_start')
+        if start is None:
+            return response
+        labels = _route_labels()
+        http_latency.observe(time.perf_counter() - start, labels)
+        http_requests.inc(labels + (str(response.status_code),))
+        size = None if response.is_streamed else response.calculate_content_length()
+        if size is not None:
+            http_response_size.observe(size, labels)
+        if self.directory and time.monotonic() - self._flushed_at >= self.flush_seconds:
+            self.flush()
+        return response
+
+    def _snapshot(self):
+        gauges = {}
+        for name, (_, callback) in self._gauges.items():
+            try:
+                gauges[name] = callback()
+            except Exception as e:
+                current_app.logger.warning("Cannot read gauge %s: %s", name, e)
+        return {
+            "pid": os.getpid(),
+            "metrics": {metric.name: metric.snapshot() for metric in METRICS},
+            "gauges": gauges,
+        }
+
+    def flush(self):
+        """Write the counts of this process to its file of ``METRICS_DIR``."""
+        with self._flush_lock:
+            self._flushed_at = time.monotonic()
+            _write_snapshot(os.path.join(self.directory, f'metrics-{os.getpid()}.json'), self._snapshot())
+
+    def _snapshots(self):
+        if not self.directory:
+            return [self._snapshot()]
+        self.flush()
+        snapshots = []
+        with _directory_lock(self.directory):
+            for path in glob.glob(os.path.join(self.directory, 'metrics-*.json')):
+                snapshot = _read_snapshot(path)
+                if snapshot is None:
+                    continue
+                if snapshot["pid"] != os.getpid() and not _process_alive(snapshot["pid"]):
+                    _merge_exited(self.directory, snapshot["pid"])
+                else:
+                    snapshots.append(snapshot)
+            exited = _read_snapshot(os.path.join(self.directory, EXITED_FILE))
+        return snapshots + ([exited] if exited else [])
+
+    def render(self):
+        """The metrics of all processes in the Prometheus text exposition format."""
+        snapshots = self._snapshots()
+        lines = []
+        for metric in METRICS:
+            values = {}
+            for snapshot in snapshots:
+                metric.merge(values, snapshot["metrics"].get(metric.name, ()))
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            for name, labelnames, labels, value in metric.samples(values):
+                pairs = ','.join(f'{key}="{_escape(label)}"' for key, label in zip(labelnames, labels))
+                lines.append(f'{name}{{{pairs}}} {_format_value(value)}' if pairs else f'{name} {_format_value(value)}')
+
+        for name, (help, _) in sorted(self._gauges.items()):
+            values = [snapshot["gauges"][name] for snapshot in snapshots if snapshot["gauges"].get(name) is not None]
+            lines.append(f'# HELP {name} {help}')
+            lines.append(f'# TYPE {name} gauge')
+            lines.append(f'{name} {_format_value(sum(values))}')
+        return '\n'.join(lines) + '\n'
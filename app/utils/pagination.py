@@ -0,0 +1,76 @@
+from flask import jsonify
+from sqlalchemy import select
+from app import db
+from app.utils.serialization import rows_to_dicts
+
+MAX_LIMIT = 1000
+
+
+def _split(value):
+    return tuple(item.strip() for item in value.split(',') if item.strip())
+
+
+def parse_collection_args(args, allowed_fields, expandable=()):
+    """
+    Parse the ``limit``, ``cursor``, ``fields`` and ``expand`` query parameters
+    of a collection endpoint. Raises ValueError on invalid input.
+
+    Without ``expand`` every nested level is returned, as before pagination
+    existed; ``expand=`` (empty) returns the top-level resources only.
+    """
+    limit = args.get('limit')
+    if limit is not None:
+        if not limit.isdigit() or not 1 <= int(limit) <= MAX_LIMIT:
+            raise ValueError(f"'limit' must be an integer between 1 and {MAX_LIMIT}.")
+        limit = int(limit)
+
+    cursor = args.get('cursor')
+    if cursor is not None:
+        if not cursor.isdigit():
+            raise ValueError("'cursor' must be the value of a previous X-Next-Cursor header.")
+        cursor = int(cursor)
+
+    fields = None
+    if 'fields' in args:
+        fields = _split(args['fields'])
+        unknown = [field for field in fields if field not in allowed_fields]
+        if unknown:
+            raise ValueError(f"Unknown field(s): {', '.join(unknown)}.")
+
+    options = {"limit": limit, "after_id": cursor, "fields": fields}
+    if expandable:
+        expand = _split(args['expand']) if 'expand' in args else expandable
+        unknown = [level for level in expand if level not in expandable]
+        if unknown:
+            raise ValueError(f"Cannot expand: {', '.join(unknown)}.")
+        options["expand"] = expand
+    return options
+
+
+def select_page(model, fields, *criteria, limit=None, after_id=None):
+    """
+    Select ``fields`` of ``model`` as dicts, ordered by id and paginated with a
+    keyset on id. Returns the rows and the cursor of the next page, if any.
+    Datetimes are not converted: the rows are meant for ``jsonify``.
+    """
+    if 'id' not in fields:
+        fields = ('id',) + tuple(fields)
+    query = select(*(getattr(model, field) for field in fields)).where(*criteria).order_by(model.id)
+    if after_id is not None:
+        query = query.where(model.id > after_id)
+    if limit is not None:
+        query = query.limit(limit + 1)
+
+    rows = db.session.execute(query).all()
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = rows[-1].id
+    return rows_to_dicts(rows), next_cursor
+
+
+def paginated_response(items, next_cursor):
+    response = jsonify(items)
+    if next_cursor is not None:
+        response.headers['X-Next-Cursor'] = str(next_cursor)
+    return response
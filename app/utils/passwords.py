@@ -0,0 +1,83 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class HashingPoolSaturated(Exception):
+    """Raised when too many password hashes are already pending."""
+
+
+class PasswordHasher:
+    """
+    Hashes and verifies pbkdf2 passwords in a dedicated process pool, so a
+    login storm saturates the pool instead of every request worker.
+
+    At most ``PASSWORD_HASH_MAX_PENDING`` operations may be running or queued;
+    beyond that ``HashingPoolSaturated`` is raised immediately. With
+    ``PASSWORD_HASH_WORKERS = 0`` hashing runs inline on the calling thread.
+    """
+
+    def __init__(self, app=None):
+        self.method = 'pbkdf2:sha256'
+        self.workers = 0
+        self._slots = None
+        self._executor = None
+        self._executor_pid = None
+        self._lock = threading.Lock()
+        self._executor_lock = threading.Lock()
+        self._pending = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.configure(
+            iterations=app.config['PASSWORD_HASH_ITERATIONS'],
+            workers=app.config['PASSWORD_HASH_WORKERS'],
+            max_pending=app.config['PASSWORD_HASH_MAX_PENDING'],
+        )
+        app.extensions['password_hasher'] = self
+
+    def configure(self, iterations, workers, max_pending):
+        self.method = f'pbkdf2:sha256:{iterations}'
+        self.workers = workers
+        self._slots = threading.BoundedSemaphore(max_pending) if max_pending else None
+        self.max_pending = max_pending
+
+    @property
+    def queue_depth(self):
+        """Number of hashing operations currently running or waiting."""
+        return self._pending
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, pwhash, password):
+        return self._run(check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        return pwhash.split('$', 1)[0] != self.method
+
+    def _get_executor(self):
+        # Executors do not survive a fork: pre-forking servers get a fresh
+        # pool in each worker process.
+        with self._executor_lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                self._executor_pid = os.getpid()
+            return self._executor
+
+    def _run(self, func, *args):
+        if self._slots is not None and not self._slots.acquire(blocking=False):
+            raise HashingPoolSaturated("Too many authentication requests, please retry later.")
+        with self._lock:
+            self._pending += 1
+        try:
+            if not self.workers:
+                return func(*args)
+            return self._get_executor().submit(func, *args).result()
+        finally:
+            with self._lock:
+                self._pending -= 1
+            if self._slots is not None:
+                self._slots.release()
@@ -0,0 +1,154 @@
+import cProfile
+import datetime
+import json
+import logging
+import os
+import re
+import time
+from contextlib import contextmanager
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger('app.profiling')
+
+
+@contextmanager
+def timed(name):
+    """
+    Add the time spent in the block to the ``name`` timing of the current
+    request, when it is being profiled.
+    """
+    if not has_request_context() or 'profile' not in g:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings = g.profile['timings']
+        timings[name] = timings.get(name, 0) + time.perf_counter() - start
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'profile' in g:
+        conn.info.setdefault('profile_query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('profile_query_start')
+    if starts and has_request_context() and 'profile' in g:
+        g.profile['sql_count'] += 1
+        timings = g.profile['timings']
+        timings['db'] = timings.get('db', 0) + time.perf_counter() - starts.pop()
+
+
+class RequestProfiler:
+    """
+    Opt-in per-request instrumentation, enabled with ``PROFILING_ENABLED``.
+
+    Each request reports its wall time, SQL statement count and time, JSON
+    serialization time and the ``timed`` sections (e.g. auth) in a
+    ``Server-Timing`` header and a JSON log line on the ``app.profiling``
+    logger. With ``PROFILING_DUMP_DIR`` set, requests are run under cProfile
+    (or pyinstrument with ``PROFILING_ENGINE = 'pyinstrument'``) and those
+    slower than ``PROFILING_THRESHOLD_MS`` leave a profile in that directory.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+        # jsonify builds its responses through the provider's response().
+        json_response = app.json.response
+
+        def timed_response(*args, **kwargs):
+            with timed('serialize'):
+                return json_response(*args, **kwargs)
+
+        app.json.response = timed_response
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        app.extensions['request_profiler'] = self
+
+    def _start(self):
+        config = current_app.config
+        if not config['PROFILING_ENABLED']:
+            return
+        g.profile = {'start': time.perf_counter(), 'sql_count': 0, 'timings': {}, 'profiler': None}
+        if config['PROFILING_DUMP_DIR']:
+            g.profile['profiler'] = self._start_profiler(config['PROFILING_ENGINE'])
+
+    @staticmethod
+    def _start_profiler(engine):
+        if engine == 'pyinstrument':
+            try:
+                from pyinstrument import Profiler
+            except ImportError:
+                logger.warning("pyinstrument is not installed, falling back to cProfile.")
+            else:
+                profiler = Profiler()
+                profiler.start()
+                return profiler
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+
+    def _finish(self, response):
+        profile = g.pop('profile', None)
+        if profile is None:
+            return response
+        duration = time.perf_counter() - profile['start']
+        timings = profile['timings']
+
+        record = {
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "duration_ms": round(duration * 1000, 3),
+            "sql_count": profile['sql_count'],
+            **{f"{name}_ms": round(value * 1000, 3) for name, value in timings.items()},
+        }
+        profiler = profile['profiler']
+        if profiler is not None:
+            profiler_path = self._stop_profiler(
+                profiler, duration, current_app.config['PROFILING_THRESHOLD_MS'],
+                current_app.config['PROFILING_DUMP_DIR'],
+            )
+            if profiler_path:
+                record["profile"] = profiler_path
+
+        metrics = [f'app;dur={duration * 1000:.3f}']
+        metrics += [
+            f'{name};dur={value * 1000:.3f}' + (f';desc="{profile["sql_count"]} queries"' if name == 'db' else '')
+            for name, value in timings.items()
+        ]
+        response.headers.add('Server-Timing', ', '.join(metrics))
+        logger.info(json.dumps(record))
+        return response
+
+    @staticmethod
+    def _stop_profiler(profiler, duration, threshold_ms, directory):
+        if isinstance(profiler, cProfile.Profile):
+            profiler.disable()
+        else:
+            profiler.stop()
+        if duration * 1000 < threshold_ms:
+            return None
+
+        os.makedirs(directory, exist_ok=True)
+        stamp = datetime.datetime.now().strftime('%Y%m%dT%H%M%S%f')
+        name = re.sub(r'[^A-Za-z0-9]+', '_', request.path).strip('_') or 'root'
+        if isinstance(profiler, cProfile.Profile):
+            path = os.path.join(directory, f'{stamp}-{request.method}-{name}.prof')
+            profiler.dump_stats(path)
+        else:
+            path = os.path.join(directory, f'{stamp}-{request.method}-{name}.html')
+            with open(path, 'w') as file:
+                file.write(profiler.output_html())
+        return path
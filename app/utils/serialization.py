@@ -0,0 +1,34 @@
+import json
+import datetime
+
+
+def row_to_dict(row):
+    return {
+        key: value.isoformat() if isinstance(value, datetime.datetime) else value
+        for key, value in row._mapping.items()
+    }
+
+
+def rows_to_dicts(rows):
+    """
+    Dicts of result rows, for JSON responses only: datetimes are left as is
+    for the JSON provider to encode, which saves a conversion per value.
+    """
+    if not rows:
+        return []
+    keys = rows[0]._fields
+    return [dict(zip(keys, row)) for row in rows]
+
+
+def to_ndjson(records):
+    for record in records:
+        yield json.dumps(record) + '\n'
+
+
+def instance_to_dict(instance, fields):
+    """Flat dict of the ``fields`` of a model instance, without its relationships."""
+    values = {field: getattr(instance, field) for field in fields}
+    return {
+        key: value.isoformat() if isinstance(value, datetime.datetime) else value
+        for key, value in values.items()
+    }
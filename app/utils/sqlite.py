@@ -0,0 +1,16 @@
+from sqlalchemy import event
+
+
+def register_sqlite_pragmas(engine, pragmas):
+    """Apply ``pragmas`` (name -> value) to every new connection of a SQLite engine."""
+    if engine.dialect.name != 'sqlite' or not pragmas:
+        return
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f'PRAGMA {name} = {value}')
+        finally:
+            cursor.close()
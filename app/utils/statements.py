@@ -0,0 +1,35 @@
+from sqlalchemy import insert, select, update
+from app import db
+
+
+def update_returning(model, criteria, values):
+    """
+    Update the ``model`` row matching ``criteria`` and return it, or None when
+    no row matches. Uses a single UPDATE ... RETURNING statement where the
+    dialect supports it, and a SELECT followed by the UPDATE elsewhere.
+    """
+    if db.engine.dialect.update_returning:
+        statement = update(model).where(*criteria).values(**values).returning(model)
+        return db.session.execute(statement).scalar_one_or_none()
+
+    instance = db.session.execute(select(model).where(*criteria)).scalar_one_or_none()
+    if instance is not None:
+        for key, value in values.items():
+            setattr(instance, key, value)
+    return instance
+
+
+def insert_returning(model, columns, rows):
+    """
+    Insert ``rows`` with executemany and return ``columns`` (which must include
+    the id) of the inserted rows, in the order of ``rows``.
+
+    SQLAlchemy only batches an ordered INSERT ... RETURNING where the backend
+    guarantees the order, and otherwise falls back to one statement per row,
+    as on SQLite. SQLite assigns increasing ids to the rows of a multi-row
+    INSERT, so there the rows are inserted in batches and sorted by id.
+    """
+    if db.engine.dialect.name != 'sqlite':
+        statement = insert(model).returning(*columns, sort_by_parameter_order=True)
+        return db.session.execute(statement, rows).all()
+    return sorted(db.session.execute(insert(model).returning(*columns), rows).all(), key=lambda row: row.id)
@@ -0,0 +1,55 @@
+import threading
+import time
+from flask import current_app
+from sqlalchemy import event, select
+from app import db
+from app.models.user import TokenRevocation
+
+# Per-process copy of the token_revocations table, keyed by user id (the token
+# subject). It is reloaded at most every TOKEN_REVOCATION_REFRESH_SECONDS, so
+# a revocation committed by another worker takes effect within that delay
+# while most requests are authorized without a query.
+_revoked_at = {}
+_loaded_at = None
+_lock = threading.Lock()
+
+
+def revoke_user_tokens(user_id):
+    """
+    Invalidate every token issued to a user before now, e.g. after a role
+    change. The revocation is part of the current transaction; callers commit.
+    """
+    revoked_at = time.time()
+    db.session.merge(TokenRevocation(user_id=user_id, revoked_at=revoked_at))
+    db.session().info.setdefault('revoked_tokens', {})[str(user_id)] = revoked_at
+
+
+def _revocations():
+    global _revoked_at, _loaded_at
+    refresh_seconds = current_app.config['TOKEN_REVOCATION_REFRESH_SECONDS']
+    if _loaded_at is None or time.monotonic() - _loaded_at >= refresh_seconds:
+        with _lock:
+            if _loaded_at is None or time.monotonic() - _loaded_at >= refresh_seconds:
+                rows = db.session.execute(select(TokenRevocation.user_id, TokenRevocation.revoked_at)).all()
+                _revoked_at = {str(user_id): revoked_at for user_id, revoked_at in rows}
+                _loaded_at = time.monotonic()
+    return _revoked_at
+
+
+def is_token_revoked(jwt_header, jwt_payload):
+    revoked_at = _revocations().get(jwt_payload['sub'])
+    return revoked_at is not None and jwt_payload.get('auth_time', 0) < revoked_at
+
+
+@event.listens_for(db.session, 'after_commit')
+def _apply_revocations(session):
+    # This worker applies its own revocations at once, without a reload.
+    global _revoked_at
+    revoked = session.info.pop('revoked_tokens', None)
+    if revoked:
+        _revoked_at = {**_revoked_at, **revoked}
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_revocations(session):
+    session.info.pop('revoked_tokens', None)
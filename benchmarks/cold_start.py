@@ -0,0 +1,75 @@
+"""
+Cold start of a worker process: importing the application and running
+``create_app``, each in a fresh interpreter, against an initialized
+database. ``--with-setup`` also times the schema creation and seeding that
+``create_app`` used to run on every start, for comparison.
+
+Exits with status 1 when the median ``create_app`` time exceeds
+``--target-ms``.
+
+    python -m benchmarks.cold_start --samples 10 --target-ms 100
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+WORKER = """
+import json, sys, time
+start = time.perf_counter()
+from app import create_app, db
+imported = time.perf_counter()
+app = create_app()
+created = time.perf_counter()
+timings = {'import': imported - start, 'create_app': created - imported}
+if '--with-setup' in sys.argv:
+    from app.migrations import init_db
+    from app.services.user_service import seed_default_users
+    with app.app_context():
+        init_db()
+        seed_default_users()
+    timings['setup'] = time.perf_counter() - created
+print(json.dumps(timings))
+"""
+
+
+def run_worker(env, *args):
+    output = subprocess.run(
+        [sys.executable, '-c', WORKER, *args], env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--samples', type=int, default=10)
+    parser.add_argument('--target-ms', type=float, default=100.0, help='Maximum median create_app time.')
+    parser.add_argument('--with-setup', action='store_true', help='Also time init-db and seed at every start.')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    env = {
+        **os.environ,
+        'FLASK_ENV': 'prod',
+        'DATABASE_URL': f"sqlite:///{os.path.join(directory, 'cold.db')}",
+        'PYTHONPATH': os.getcwd(),
+    }
+    # The first run creates and seeds the database, as `flask init-db` and `flask seed` would.
+    run_worker(env, '--with-setup')
+
+    samples = [run_worker(env, *(['--with-setup'] if args.with_setup else [])) for _ in range(args.samples)]
+    medians = {name: statistics.median(sample[name] for sample in samples) * 1000 for name in samples[0]}
+    for name, value in medians.items():
+        print(f"{name:<12} {value:9.1f} ms (median of {args.samples})")
+    print(f"{'total':<12} {sum(medians.values()):9.1f} ms")
+
+    if medians['create_app'] > args.target_ms:
+        print(f"create_app exceeds the {args.target_ms:.0f} ms target.")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+Time to turn a large rule listing into a JSON response: rows already
+fetched, converted to dicts and encoded by the JSON provider.
+
+Compares the former path (``row_to_dict`` and Flask's standard library
+provider) with ``rows_to_dicts`` and FastJSONProvider, with orjson and with
+its standard library fallback.
+
+    python -m benchmarks.json_encoding --rules 100000
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from unittest import mock
+
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import insert, select
+
+
+def timed(func, samples):
+    timings = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        result = func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rules', type=int, default=100000)
+    parser.add_argument('--samples', type=int, default=5)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    os.environ['TEST_DATABASE_URL'] = f"sqlite:///{os.path.join(directory, 'bench.db')}"
+    from app import create_app, db
+    from app.migrations import init_db
+    from app.models.firewall import Firewall
+    from app.models.policy import Policy
+    from app.models.rule import Rule
+    from app.services.rule_service import RULE_FIELDS
+    from app.utils import json_provider
+    from app.utils.serialization import row_to_dict, rows_to_dicts
+
+    app = create_app(config_name='test')
+    with app.app_context():
+        init_db()
+        db.session.execute(insert(Firewall), [{'id': 1, 'name': 'fw', 'ip_address': '10.0.0.1'}])
+        db.session.execute(insert(Policy), [{'id': 1, 'name': 'policy', 'firewall_id': 1}])
+        db.session.execute(insert(Rule), [
+            {'policy_id': 1, 'protocol': 'TCP', 'destination_ip': f'10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}'}
+            for i in range(args.rules)
+        ])
+        db.session.commit()
+        rows = db.session.execute(select(*(getattr(Rule, field) for field in RULE_FIELDS)).order_by(Rule.id)).all()
+
+        stdlib_provider = DefaultJSONProvider(app)
+        fast_provider = json_provider.FastJSONProvider(app)
+
+        def fallback():
+            with mock.patch.object(json_provider, 'orjson', None):
+                return fast_provider.response(rows_to_dicts(rows))
+
+        cases = {
+            'row_to_dict + stdlib provider (before)':
+                lambda: stdlib_provider.response([row_to_dict(row) for row in rows]),
+            'rows_to_dicts + orjson': lambda: fast_provider.response(rows_to_dicts(rows)),
+            'rows_to_dicts + stdlib fallback': fallback,
+        }
+
+        with app.test_request_context():
+            print(f"{len(rows)} rules, median of {args.samples}")
+            baseline = None
+            for name, func in cases.items():
+                if name.endswith('orjson') and json_provider.orjson is None:
+                    print(f"{name:<42} skipped, orjson is not installed")
+                    continue
+                elapsed, response = timed(func, args.samples)
+                baseline = baseline or elapsed
+                size = len(response.get_data()) / 1e6
+                print(f"{name:<42} {elapsed:9.1f} ms {size:7.1f} MB  x{baseline / elapsed:.1f}")
+        db.drop_all()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Latency of the policy and rule listings as the rule table grows, with the
+model indexes and without them.
+
+    python -m benchmarks.list_latency --sizes 10000 100000 1000000
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import insert, text
+
+
+def seed(db, Firewall, Policy, Rule, rules, rules_per_policy=20, policies_per_firewall=10):
+    policies = max(1, rules // rules_per_policy)
+    firewalls = max(1, policies // policies_per_firewall)
+    db.session.execute(insert(Firewall), [
+        {'id': i + 1, 'name': f'fw-{i}', 'ip_address': f'10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}'}
+        for i in range(firewalls)
+    ])
+    db.session.execute(insert(Policy), [
+        {'id': i + 1, 'name': f'policy-{i}', 'firewall_id': i % firewalls + 1} for i in range(policies)
+    ])
+    for start in range(0, rules, 50000):
+        db.session.execute(insert(Rule), [
+            {'policy_id': i % policies + 1, 'protocol': 'TCP', 'destination_ip': f'192.168.{i // 256 % 256}.{i % 256}'}
+            for i in range(start, min(start + 50000, rules))
+        ])
+    db.session.commit()
+    return firewalls, policies
+
+
+def measure(func, samples):
+    timings = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 500000])
+    parser.add_argument('--samples', type=int, default=50)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    os.environ['TEST_DATABASE_URL'] = f"sqlite:///{os.path.join(directory, 'bench.db')}"
+    from app import create_app, db
+    from app.models.firewall import Firewall
+    from app.models.policy import Policy
+    from app.models.rule import Rule
+    from app.services.policy_service import get_policies_tree
+    from app.services.rule_service import get_rules_rows
+
+    app = create_app(config_name='test')
+    print(f"{'rules':>10} {'indexes':>8} {'policies of firewall':>22} {'rules of policy':>16}")
+    with app.app_context():
+        for size in args.sizes:
+            for indexed in (True, False):
+                db.drop_all()
+                db.create_all()
+                if not indexed:
+                    with db.engine.begin() as connection:
+                        for table in (Policy.__table__, Rule.__table__):
+                            for index in table.indexes:
+                                connection.execute(text(f'DROP INDEX {index.name}'))
+                firewalls, policies = seed(db, Firewall, Policy, Rule, size)
+                list_policies = measure(
+                    lambda: get_policies_tree([random.randint(1, firewalls)], expand=()), args.samples
+                )
+                list_rules = measure(lambda: get_rules_rows([random.randint(1, policies)]), args.samples)
+                print(f"{size:>10} {'yes' if indexed else 'no':>8} {list_policies:>19.3f} ms {list_rules:>13.3f} ms")
+        db.drop_all()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+"""
+Throughput of the production server as the number of workers grows.
+
+For each ``--workers`` count, starts gunicorn with ``gunicorn.conf.py`` on a
+seeded SQLite database and has ``--clients`` processes send requests over
+keep-alive connections for ``--duration`` seconds, then reports the
+requests per second and the p50/p99 latency.
+
+    python -m benchmarks.load_test --workers 1,2,4 --clients 16 --duration 10
+
+Client processes compete with the workers for the CPU: on a small machine,
+run the clients elsewhere with ``--url`` against a server started by hand.
+"""
+import argparse
+import http.client
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import urlsplit
+
+from benchmarks.suite import percentile
+
+PATHS = ('/api/v1/firewalls/1', '/api/v1/firewalls/?limit=20', '/api/v1/firewalls/1/policies/1/rules')
+
+
+def client(url, deadline):
+    """Send requests until ``deadline`` and return their latencies in milliseconds."""
+    parts = urlsplit(url)
+    connection = http.client.HTTPConnection(parts.hostname, parts.port, timeout=30)
+    latencies, errors = [], 0
+    index = 0
+    while time.time() < deadline:
+        path = PATHS[index % len(PATHS)]
+        index += 1
+        start = time.perf_counter()
+        try:
+            connection.request('GET', parts.path.rstrip('/') + path)
+            response = connection.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            connection.close()
+            connection = http.client.HTTPConnection(parts.hostname, parts.port, timeout=30)
+            continue
+        if response.status != 200:
+            errors += 1
+        latencies.append((time.perf_counter() - start) * 1000)
+    connection.close()
+    return latencies, errors
+
+
+def load(url, clients, duration):
+    deadline = time.time() + duration
+    with multiprocessing.Pool(clients) as pool:
+        results = pool.starmap(client, [(url, deadline)] * clients)
+    latencies = sorted(latency for result, _ in results for latency in result)
+    return {
+        'requests_per_second': len(latencies) / duration,
+        'p50': percentile(latencies, 0.50) if latencies else 0,
+        'p99': percentile(latencies, 0.99) if latencies else 0,
+        'errors': sum(errors for _, errors in results),
+    }
+
+
+def seed_database(env):
+    script = """
+from sqlalchemy import insert
+from app import create_app, db
+from app.migrations import init_db
+from app.models.firewall import Firewall
+from app.models.policy import Policy
+from app.models.rule import Rule
+from app.services.user_service import seed_default_users
+app = create_app()
+with app.app_context():
+    init_db()
+    seed_default_users()
+    db.session.execute(insert(Firewall), [{'name': f'fw-{i}', 'ip_address': f'10.0.0.{i}'} for i in range(1, 51)])
+    db.session.execute(insert(Policy), [{'name': f'policy-{i}', 'firewall_id': 1} for i in range(10)])
+    db.session.execute(insert(Rule), [
+        {'policy_id': 1, 'protocol': 'TCP', 'destination_ip': f'172.16.0.{i}'} for i in range(100)
+    ])
+    db.session.commit()
+"""
+    subprocess.run([sys.executable, '-c', script], env=env, check=True, stdout=subprocess.DEVNULL)
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"The server did not listen on port {port} within {timeout} s.")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', default='1,2,4', help='Comma-separated worker counts to compare.')
+    parser.add_argument('--threads', type=int, default=4, help='Threads per worker.')
+    parser.add_argument('--clients', type=int, default=16, help='Concurrent client processes.')
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--url', help='Load an already running server instead of starting gunicorn.')
+    args = parser.parse_args()
+
+    if args.url:
+        result = load(args.url, args.clients, args.duration)
+        print(f"{result['requests_per_second']:.0f} req/s, p50 {result['p50']:.1f} ms, "
+              f"p99 {result['p99']:.1f} ms, {result['errors']} errors")
+        return
+
+    directory = tempfile.mkdtemp()
+    env = {
+        **os.environ,
+        'DATABASE_URL': f"sqlite:///{os.path.join(directory, 'load.db')}",
+        'WEB_THREADS': str(args.threads),
+        'WEB_ACCESS_LOG': '/dev/null',
+        'WEB_LOG_LEVEL': 'warning',
+    }
+    env.pop('METRICS_DIR', None)
+    seed_database(env)
+
+    print(f"{os.cpu_count()} CPUs, {args.clients} clients, {args.threads} threads per worker")
+    print(f"{'workers':>7} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for workers in (int(count) for count in args.workers.split(',')):
+        port = free_port()
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--bind', f'127.0.0.1:{port}', 'run:app'],
+            env={**env, 'WEB_WORKERS': str(workers)},
+        )
+        try:
+            wait_for_port(port)
+            url = f'http://127.0.0.1:{port}'
+            load(url, min(args.clients, 4), 1)  # Warm up every worker.
+            result = load(url, args.clients, args.duration)
+        finally:
+            server.terminate()
+            server.wait()
+        print(f"{workers:>7} {result['requests_per_second']:>9.0f} {result['p50']:>9.2f} "
+              f"{result['p99']:>9.2f} {result['errors']:>7}")
+
+
+if __name__ == '__main__':
+    main()
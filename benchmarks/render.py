@@ -0,0 +1,63 @@
+"""
+Latency of rendering a firewall to nftables: the first build, a render
+served from the cache, and a render after a single rule changed.
+
+    python -m benchmarks.render --rules 50000 --policies 50
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from sqlalchemy import insert
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rules', type=int, default=50000)
+    parser.add_argument('--policies', type=int, default=50)
+    parser.add_argument('--samples', type=int, default=1000)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    os.environ['TEST_DATABASE_URL'] = f"sqlite:///{os.path.join(directory, 'bench.db')}"
+    from app import create_app, db
+    from app.models.firewall import Firewall
+    from app.models.policy import Policy
+    from app.models.rule import Rule
+    from app.services import render_service
+    from app.services.rule_service import update_rule
+
+    app = create_app(config_name='test')
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.execute(insert(Firewall), [{'id': 1, 'name': 'fw', 'ip_address': '10.0.0.1'}])
+        db.session.execute(insert(Policy), [
+            {'id': i + 1, 'name': f'policy-{i}', 'firewall_id': 1} for i in range(args.policies)
+        ])
+        db.session.execute(insert(Rule), [
+            {'policy_id': i % args.policies + 1, 'protocol': 'TCP',
+             'destination_ip': f'10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}'}
+            for i in range(args.rules)
+        ])
+        db.session.commit()
+
+        start = time.perf_counter()
+        render_service.render_firewall(1, 'nftables')
+        print(f"first build:       {(time.perf_counter() - start) * 1000:10.3f} ms")
+
+        start = time.perf_counter()
+        for _ in range(args.samples):
+            render_service.render_firewall(1, 'nftables')
+        print(f"cached:            {(time.perf_counter() - start) * 1e6 / args.samples:10.3f} us")
+
+        update_rule({'rule_id': 1, 'destination_ip': '172.16.0.1', 'protocol': 'UDP'})
+        start = time.perf_counter()
+        render_service.render_firewall(1, 'nftables')
+        print(f"one rule changed:  {(time.perf_counter() - start) * 1000:10.3f} ms")
+        db.drop_all()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+Read throughput of a SQLite database under concurrent writers, with the
+default rollback journal and with the ProdConfig pragmas (WAL, ...).
+
+    python -m benchmarks.sqlite_pragmas --readers 4 --writers 2 --duration 5
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from sqlalchemy import create_engine, text
+
+from app.utils.sqlite import register_sqlite_pragmas
+from config import ProdConfig
+
+
+def run(pragmas, readers, writers, duration, rows):
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{os.path.join(directory, 'bench.db')}", pool_size=readers + writers)
+        register_sqlite_pragmas(engine, pragmas)
+        with engine.begin() as connection:
+            connection.execute(text('CREATE TABLE rule (id INTEGER PRIMARY KEY, policy_id INTEGER, destination_ip TEXT)'))
+            connection.execute(
+                text('INSERT INTO rule (policy_id, destination_ip) VALUES (:policy_id, :destination_ip)'),
+                [{'policy_id': i % 100, 'destination_ip': f'10.0.{i // 256 % 256}.{i % 256}'} for i in range(rows)],
+            )
+
+        stop = threading.Event()
+        counts = {'reads': 0, 'writes': 0, 'errors': 0}
+        lock = threading.Lock()
+
+        def reader():
+            done = 0
+            with engine.connect() as connection:
+                while not stop.is_set():
+                    connection.execute(text('SELECT * FROM rule WHERE policy_id = :p'), {'p': done % 100}).fetchall()
+                    connection.rollback()
+                    done += 1
+            with lock:
+                counts['reads'] += done
+
+        def writer():
+            done = errors = 0
+            while not stop.is_set():
+                try:
+                    with engine.begin() as connection:
+                        connection.execute(
+                            text('INSERT INTO rule (policy_id, destination_ip) VALUES (:p, :ip)'),
+                            {'p': done % 100, 'ip': '192.168.0.1'},
+                        )
+                    done += 1
+                except Exception:
+                    errors += 1
+            with lock:
+                counts['writes'] += done
+                counts['errors'] += errors
+
+        threads = [threading.Thread(target=reader) for _ in range(readers)]
+        threads += [threading.Thread(target=writer) for _ in range(writers)]
+        for thread in threads:
+            thread.start()
+        time.sleep(duration)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        engine.dispose()
+        return {key: value / duration for key, value in counts.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--duration', type=float, default=5)
+    parser.add_argument('--rows', type=int, default=50000)
+    args = parser.parse_args()
+
+    for label, pragmas in (('default journal', {'busy_timeout': 5000}), ('ProdConfig pragmas', ProdConfig.SQLITE_PRAGMAS)):
+        result = run(pragmas, args.readers, args.writers, args.duration, args.rows)
+        print(f"{label:>20}: {result['reads']:10.0f} reads/s {result['writes']:8.0f} writes/s "
+              f"{result['errors']:6.0f} errors/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+"""
+Latency of the service functions and of the REST endpoints on a synthetic
+dataset: p50/p95/p99 in milliseconds and SQL queries per call.
+
+Results are written as JSON (benchmarks/results/<commit>.json by default),
+and ``--compare`` prints the p50 change against an earlier result file.
+
+    python -m benchmarks.suite --firewalls 20 --policies 10 --rules 100
+    python -m benchmarks.suite --compare benchmarks/results/abc1234.json
+"""
+import argparse
+import datetime
+import itertools
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+
+from sqlalchemy import event, insert
+
+RESULTS_DIRECTORY = os.path.join(os.path.dirname(__file__), 'results')
+
+
+def seed(db, Firewall, Policy, Rule, firewalls, policies, rules):
+    """Insert ``firewalls`` firewalls of ``policies`` policies of ``rules`` rules each."""
+    from app.models.rule import network_columns
+
+    db.session.execute(insert(Firewall), [
+        {'id': f + 1, 'name': f'fw-{f}', 'ip_address': f'10.{f // 65536 % 256}.{f // 256 % 256}.{f % 256}'}
+        for f in range(firewalls)
+    ])
+    db.session.execute(insert(Policy), [
+        {'id': p + 1, 'name': f'policy-{p}', 'firewall_id': p // policies + 1}
+        for p in range(firewalls * policies)
+    ])
+    total = firewalls * policies * rules
+    for start in range(0, total, 50000):
+        destinations = ((r, f'172.{16 + r // 65536 % 16}.{r // 256 % 256}.{r % 256}')
+                        for r in range(start, min(start + 50000, total)))
+        db.session.execute(insert(Rule), [
+            {'policy_id': r // rules + 1, 'protocol': 'TCP' if r % 2 else 'UDP',
+             'destination_ip': destination_ip, **network_columns(destination_ip)}
+            for r, destination_ip in destinations
+        ])
+    db.session.commit()
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+class QueryCounter:
+    """Counts the statements executed on an engine."""
+
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, 'before_cursor_execute', self._count)
+
+    def _count(self, *args):
+        self.count += 1
+
+
+def measure(func, samples, counter):
+    timings, queries = [], 0
+    for _ in range(samples):
+        before = counter.count
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+        queries += counter.count - before
+    timings.sort()
+    return {
+        'p50': percentile(timings, 0.50),
+        'p95': percentile(timings, 0.95),
+        'p99': percentile(timings, 0.99),
+        'queries': queries / samples,
+    }
+
+
+def check(response, status=200):
+    assert response.status_code == status, (response.status_code, response.get_data(as_text=True)[:200])
+    return response
+
+
+def cases(app, args):
+    """Yield ``(name, callable)`` pairs, the service calls first, then the endpoints."""
+    from app.services.evaluation_service import evaluate_packets
+    from app.services.firewall_service import get_firewall, get_firewalls_tree
+    from app.services.policy_service import get_policies_tree
+    from app.services.render_service import render_firewall
+    from app.services.rule_service import get_rules_rows
+
+    firewall_id, policy_id = 1, 1
+    packets = [{'destination_ip': f'172.16.0.{i}', 'protocol': 'TCP'} for i in range(100)]
+    yield 'service: list firewalls (100, nested)', lambda: get_firewalls_tree(limit=100)
+    yield 'service: get firewall', lambda: get_firewall(firewall_id)
+    yield 'service: list policies of firewall', lambda: get_policies_tree([firewall_id])
+    yield 'service: list rules of policy', lambda: get_rules_rows([policy_id])
+    yield 'service: evaluate 100 packets', lambda: evaluate_packets(firewall_id, packets)
+    yield 'service: render nftables', lambda: render_firewall(firewall_id, 'nftables')
+
+    client = app.test_client()
+    credentials = {'email': 'admin@example.com', 'password': 'password'}
+    token = check(client.post('/api/v1/users/login', json=credentials)).get_json()['access_token']
+    headers = {'Authorization': f'Bearer {token}'}
+    firewall_url = f'/api/v1/firewalls/{firewall_id}'
+    rules_url = f'{firewall_url}/policies/{policy_id}/rules'
+    etag = check(client.get(firewall_url)).headers['ETag']
+    names = itertools.count()
+    bulk = [{'destination_ip': f'192.168.{i // 256}.{i % 256}', 'protocol': 'TCP'} for i in range(args.bulk)]
+
+    def create_firewall():
+        n = next(names)
+        check(client.post('/api/v1/firewalls/', headers=headers, json={
+            'name': f'bench-{n}', 'ip_address': f'100.64.{n // 256 % 256}.{n % 256}'
+        }), 201)
+
+    yield 'http: POST /users/login', lambda: check(client.post('/api/v1/users/login', json=credentials))
+    yield 'http: GET /firewalls/?limit=100', lambda: check(client.get('/api/v1/firewalls/?limit=100'))
+    yield 'http: GET /firewalls/<id>', lambda: check(client.get(firewall_url))
+    yield 'http: GET /firewalls/<id> (304)', lambda: check(client.get(firewall_url, headers={'If-None-Match': etag}), 304)
+    yield 'http: GET .../rules', lambda: check(client.get(rules_url))
+    yield 'http: POST /firewalls/', create_firewall
+    yield f'http: POST .../rules:bulk ({args.bulk})', lambda: check(client.post(f'{rules_url}:bulk', headers=headers, json=bulk), 201)
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--firewalls', type=int, default=20)
+    parser.add_argument('--policies', type=int, default=10, help='Policies per firewall.')
+    parser.add_argument('--rules', type=int, default=100, help='Rules per policy.')
+    parser.add_argument('--bulk', type=int, default=100, help='Rules per bulk request.')
+    parser.add_argument('--samples', type=int, default=200)
+    parser.add_argument('--output', help='Result file, benchmarks/results/<commit>.json by default.')
+    parser.add_argument('--compare', help='Earlier result file to compare with.')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    os.environ['TEST_DATABASE_URL'] = f"sqlite:///{os.path.join(directory, 'bench.db')}"
+    from app import create_app, db
+    from app.migrations import init_db
+    from app.models.firewall import Firewall
+    from app.models.policy import Policy
+    from app.models.rule import Rule
+    from app.services.user_service import seed_default_users
+
+    app = create_app(config_name='test')
+    results = {}
+    with app.app_context():
+        init_db()
+        seed_default_users()
+        seed(db, Firewall, Policy, Rule, args.firewalls, args.policies, args.rules)
+        counter = QueryCounter(db.engine)
+        print(f"{'case':<42} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'queries':>8}")
+        for name, func in cases(app, args):
+            func()  # Warm up caches and lazy imports.
+            result = results[name] = measure(func, args.samples, counter)
+            print(f"{name:<42} {result['p50']:>9.3f} {result['p95']:>9.3f} {result['p99']:>9.3f} {result['queries']:>8.1f}")
+        db.drop_all()
+
+    commit = git_commit()
+    report = {
+        'commit': commit,
+        'date': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'dataset': {'firewalls': args.firewalls, 'policies': args.policies, 'rules': args.rules},
+        'samples': args.samples,
+        'results': results,
+    }
+    output = args.output or os.path.join(RESULTS_DIRECTORY, f'{commit}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as file:
+        json.dump(report, file, indent=2)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        print(f"\nChange of p50 against {baseline['commit']} ({baseline['date']}):")
+        for name, result in results.items():
+            previous = baseline['results'].get(name)
+            if previous:
+                change = (result['p50'] - previous['p50']) / previous['p50'] * 100
+                print(f"{name:<42} {previous['p50']:>9.3f} -> {result['p50']:>9.3f} ms ({change:+.1f}%)")
+
+
+if __name__ == '__main__':
+    main()
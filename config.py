@@ -3,11 +3,45 @@ import os
 class Config:
     SECRET_KEY = 'a-secret-key'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    PASSWORD_HASH_ITERATIONS = int(os.getenv('PASSWORD_HASH_ITERATIONS', 600000))
+    PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', os.cpu_count() or 1))
+    PASSWORD_HASH_MAX_PENDING = int(os.getenv('PASSWORD_HASH_MAX_PENDING', 64))
+    TOKEN_REVOCATION_REFRESH_SECONDS = float(os.getenv('TOKEN_REVOCATION_REFRESH_SECONDS', 5))
+    SQLITE_PRAGMAS = {'foreign_keys': 'ON'}
+    EVENTS_QUEUE_SIZE = int(os.getenv('EVENTS_QUEUE_SIZE', 100))
+    EVENTS_HEARTBEAT_SECONDS = int(os.getenv('EVENTS_HEARTBEAT_SECONDS', 15))
+    EVENTS_POLL_SECONDS = float(os.getenv('EVENTS_POLL_SECONDS', 0))
+    PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', '').lower() in ('1', 'true', 'yes')
+    PROFILING_THRESHOLD_MS = float(os.getenv('PROFILING_THRESHOLD_MS', 500))
+    PROFILING_DUMP_DIR = os.getenv('PROFILING_DUMP_DIR')
+    PROFILING_ENGINE = os.getenv('PROFILING_ENGINE', 'cprofile')
+    METRICS_DIR = os.getenv('METRICS_DIR')
+    METRICS_FLUSH_SECONDS = float(os.getenv('METRICS_FLUSH_SECONDS', 1))
 
 class ProdConfig(Config):
     JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY', 'your_secret_key')
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///prod.db'
+    SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL', 'sqlite:///prod.db')
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': int(os.getenv('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 20)),
+        'pool_timeout': int(os.getenv('DB_POOL_TIMEOUT', 30)),
+    }
+    # WAL lets readers proceed while a writer commits, and synchronous=NORMAL
+    # only fsyncs at checkpoints, which is safe in WAL mode.
+    SQLITE_PRAGMAS = {
+        **Config.SQLITE_PRAGMAS,
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,
+        'cache_size': -64000,
+        'mmap_size': 268435456,
+    }
+    # Workers are separate processes: each reads the changes committed by
+    # the others from the database for its event streams.
+    EVENTS_POLL_SECONDS = float(os.getenv('EVENTS_POLL_SECONDS', 0.5))
 
 class TestConfig(Config):
     TESTING = True
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///test.db'
\ No newline at end of file
+    SQLALCHEMY_DATABASE_URI = os.getenv('TEST_DATABASE_URL', 'sqlite:///test.db')
+    PASSWORD_HASH_ITERATIONS = 1000
+    PASSWORD_HASH_WORKERS = 0
\ No newline at end of file
@@ -0,0 +1,79 @@
+"""
+Production server settings: ``gunicorn -c gunicorn.conf.py run:app``.
+
+Every setting can be overridden through the environment (or on the command
+line). Workers are gevent ones: event streams and ``?wait=`` long polls
+wait in greenlets, up to ``WEB_WORKER_CONNECTIONS`` clients per worker,
+instead of each holding one of the ``WEB_THREADS`` threads of a ``gthread``
+worker (``WEB_WORKER_CLASS=gthread``).
+
+Workers share no memory: event streams poll the change log
+(``EVENTS_POLL_SECONDS``) and token revocations are read from the database,
+so any worker sees the writes of the others.
+"""
+import glob
+import os
+
+bind = os.getenv('WEB_BIND', f"0.0.0.0:{os.getenv('PORT', '8080')}")
+workers = int(os.getenv('WEB_WORKERS', (os.cpu_count() or 1) * 2 + 1))
+worker_class = os.getenv('WEB_WORKER_CLASS', 'gevent')
+threads = int(os.getenv('WEB_THREADS', 4))
+worker_connections = int(os.getenv('WEB_WORKER_CONNECTIONS', 1000))
+
+if worker_class == 'gevent':
+    # Patch before the application is preloaded, so that its locks, queues,
+    # sleeps and database drivers all yield to the other greenlets.
+    from gevent import monkey
+    monkey.patch_all()
+    from psycogreen.gevent import patch_psycopg
+    patch_psycopg()
+
+# Each worker would otherwise start a password hashing pool of one process
+# per CPU: share the CPUs out, keeping at least one hashing process per
+# worker. Fewer pending hashes than threads leaves threads for the rest of
+# the API during a login burst, which gets 429 responses instead; gevent
+# workers keep the same bound so that logins do not queue up either.
+os.environ.setdefault('PASSWORD_HASH_WORKERS', str(max(1, (os.cpu_count() or 1) // workers)))
+os.environ.setdefault('PASSWORD_HASH_MAX_PENDING', str(max(1, threads - 1)))
+
+# Import the application once in the master: workers are forked with the
+# modules already loaded and share their memory pages.
+preload_app = os.getenv('WEB_PRELOAD', '1').lower() not in ('0', 'false', 'no')
+
+# Behind a load balancer, keep idle connections open a little longer than
+# its own idle timeout so that it never reuses a connection being closed.
+keepalive = int(os.getenv('WEB_KEEPALIVE', 75))
+timeout = int(os.getenv('WEB_TIMEOUT', 30))
+graceful_timeout = int(os.getenv('WEB_GRACEFUL_TIMEOUT', 30))
+# Recycle workers now and then to bound the growth of long-lived processes.
+max_requests = int(os.getenv('WEB_MAX_REQUESTS', 10000))
+max_requests_jitter = int(os.getenv('WEB_MAX_REQUESTS_JITTER', 1000))
+
+accesslog = os.getenv('WEB_ACCESS_LOG', '-')
+errorlog = '-'
+loglevel = os.getenv('WEB_LOG_LEVEL', 'info')
+
+
+def on_starting(server):
+    # Counts left by the workers of a previous run would be added to ours.
+    metrics_dir = os.getenv('METRICS_DIR')
+    if metrics_dir:
+        for path in glob.glob(os.path.join(metrics_dir, 'metrics-*.json')) + glob.glob(os.path.join(metrics_dir, 'exited.json')):
+            os.remove(path)
+
+
+def child_exit(server, worker):
+    # Fold the counts of an exited (e.g. recycled) worker into one file.
+    metrics_dir = os.getenv('METRICS_DIR')
+    if metrics_dir:
+        from app.utils.metrics import collect_exited_process
+        collect_exited_process(metrics_dir, worker.pid)
+
+
+def post_fork(server, worker):
+    # Connections opened by the master before the fork must not be shared:
+    # give each worker a pool of its own, leaving the master's untouched.
+    from app import db
+    app = server.app.wsgi()
+    with app.app_context():
+        db.engine.dispose(close=False)
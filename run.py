@@ -1,6 +1,14 @@
-from app import create_app
+from app import create_app, db
+from app.migrations import init_db
+from app.services.user_service import seed_default_users
 
 app = create_app()
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=8080, debug=True)
\ No newline at end of file
+    # The development server sets up its database; deployments run
+    # `flask init-db` and `flask seed` once instead.
+    with app.app_context():
+        init_db()
+        seed_default_users()
+        db.session.remove()
+    app.run(host='0.0.0.0', port=8080, debug=True)
@@ -0,0 +1,71 @@
+import glob
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+
+import pytest
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        '--postgres', action='store_true',
+        help='Run the suite against a throwaway local PostgreSQL cluster (needs initdb and pg_ctl).'
+    )
+
+
+class PostgresCluster:
+    """A temporary PostgreSQL cluster created with initdb and started with pg_ctl."""
+
+    def __init__(self):
+        self.directory = tempfile.mkdtemp(prefix='jouerflux-pg-')
+        self.data = os.path.join(self.directory, 'data')
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            self.port = sock.getsockname()[1]
+
+    @staticmethod
+    def _binary(name):
+        found = shutil.which(name) or sorted(glob.glob(f'/usr/lib/postgresql/*/bin/{name}'))
+        if not found:
+            raise pytest.UsageError(f"--postgres needs '{name}' on the PATH.")
+        return found if isinstance(found, str) else found[-1]
+
+    @property
+    def url(self):
+        return f'postgresql://postgres@127.0.0.1:{self.port}/postgres'
+
+    def start(self):
+        subprocess.run(
+            [self._binary('initdb'), '-D', self.data, '-U', 'postgres', '-A', 'trust', '--no-sync'],
+            check=True, stdout=subprocess.DEVNULL,
+        )
+        options = f"-p {self.port} -k {self.directory} -c listen_addresses=127.0.0.1 -c fsync=off"
+        subprocess.run(
+            [self._binary('pg_ctl'), '-D', self.data, '-o', options, '-l',
+             os.path.join(self.directory, 'postgres.log'), '-w', 'start'],
+            check=True, stdout=subprocess.DEVNULL,
+        )
+
+    def stop(self):
+        subprocess.run(
+            [self._binary('pg_ctl'), '-D', self.data, '-m', 'immediate', 'stop'],
+            stdout=subprocess.DEVNULL,
+        )
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def pytest_configure(config):
+    # Runs before the test modules import config.py, which reads TEST_DATABASE_URL.
+    if config.getoption('--postgres'):
+        cluster = PostgresCluster()
+        cluster.start()
+        os.environ['TEST_DATABASE_URL'] = cluster.url
+        config.postgres_cluster = cluster
+
+
+def pytest_unconfigure(config):
+    cluster = getattr(config, 'postgres_cluster', None)
+    if cluster is not None:
+        cluster.stop()
@@ -0,0 +1,104 @@
+import threading
+from unittest import mock
+import pytest
+from app import create_app, db
+from app.services import change_service
+
+BASE_URL = '/api/v1/firewalls/'
+
+@pytest.fixture
+def app():
+    app = create_app(config_name='test')
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.drop_all()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture(autouse=True)
+def mock_role_required():
+    with mock.patch('app.utils.decorators.role_required', lambda role: lambda f: f):
+        yield
+
+def create_test_firewall(client, name='Test Firewall', ip_address='192.168.1.1'):
+    response = client.post(BASE_URL, json={
+        'name': name,
+        'ip_address': ip_address
+    })
+    return response.get_json()['id']
+
+def summarize(changes):
+    return [(change['entity'], change['action']) for change in changes]
+
+def test_changes_record_every_write(client):
+    firewall_id = create_test_firewall(client)
+    policy_id = client.post(f'{BASE_URL}{firewall_id}/policies', json={'name': 'Test Policy'}).get_json()['id']
+    rules_url = f'{BASE_URL}{firewall_id}/policies/{policy_id}/rules'
+    rule_id = client.post(rules_url, json={'destination_ip': '10.0.0.5', 'protocol': 'TCP'}).get_json()['id']
+    client.post(f'{rules_url}:bulk', json=[{'destination_ip': '10.0.0.6', 'protocol': 'UDP'}])
+    client.put(f'{rules_url}/{rule_id}', json={'destination_ip': '10.0.0.7', 'protocol': 'TCP'})
+    client.delete(f'{rules_url}/{rule_id}')
+    client.put(f'{BASE_URL}{firewall_id}/policies/{policy_id}', json={'name': 'Renamed Policy'})
+
+    data = client.get(f'{BASE_URL}changes').get_json()
+    assert summarize(data['changes']) == [
+        ('firewall', 'create'), ('policy', 'create'), ('rule', 'create'), ('rule', 'create'),
+        ('rule', 'update'), ('rule', 'delete'), ('policy', 'update'),
+    ]
+    assert data['changes'][4]['data']['destination_ip'] == '10.0.0.7'
+    assert data['changes'][6]['data']['name'] == 'Renamed Policy'
+    assert data['revision'] == data['changes'][-1]['revision']
+    assert client.get(f'{BASE_URL}{firewall_id}').get_json()['revision'] == data['revision']
+
+def test_changes_since_and_firewall_filter(client):
+    first_id = create_test_firewall(client)
+    revision = client.get(f'{BASE_URL}changes').get_json()['revision']
+    second_id = create_test_firewall(client, name='Second Firewall', ip_address='192.168.1.2')
+    client.delete(f'{BASE_URL}{first_id}')
+
+    data = client.get(f'{BASE_URL}changes?since={revision}').get_json()
+    assert [(change['firewall_id'], change['action']) for change in data['changes']] == [
+        (second_id, 'create'), (first_id, 'delete')
+    ]
+    data = client.get(f'{BASE_URL}changes?since={revision}&firewall_id={first_id}&limit=1').get_json()
+    assert summarize(data['changes']) == [('firewall', 'delete')]
+    assert data['has_more'] is False
+
+    data = client.get(f"{BASE_URL}changes?since={data['revision']}").get_json()
+    assert data['changes'] == []
+    assert client.get(f'{BASE_URL}changes?limit=0').status_code == 400
+
+def test_changes_reject_invalid_parameters(client):
+    create_test_firewall(client)
+    for query in ('since=abc', 'since=-1', 'limit=ten', 'firewall_id=first', 'wait=soon', 'wait=nan', 'wait=60'):
+        response = client.get(f'{BASE_URL}changes?{query}')
+        assert response.status_code == 400, query
+        assert 'error' in response.get_json()
+
+def test_unchanged_firewall_update_records_nothing(client):
+    firewall_id = create_test_firewall(client)
+    revision = client.get(f'{BASE_URL}{firewall_id}').get_json()['revision']
+
+    for body in ({}, {'name': 'Test Firewall', 'ip_address': '192.168.1.1'}):
+        response = client.put(f'{BASE_URL}{firewall_id}', json=body)
+        assert response.status_code == 200
+        assert response.get_json()['revision'] == revision
+    assert summarize(client.get(f'{BASE_URL}changes').get_json()['changes']) == [('firewall', 'create')]
+    assert client.put(f'{BASE_URL}999', json={}).status_code == 404
+
+def test_changes_long_poll(app, client):
+    revision = client.get(f'{BASE_URL}changes').get_json()['revision']
+
+    def create_later():
+        with app.app_context():
+            app.test_client().post(BASE_URL, json={'name': 'Late Firewall', 'ip_address': '192.168.1.9'})
+
+    timer = threading.Timer(0.3, create_later)
+    with mock.patch.object(change_service, 'POLL_INTERVAL_SECONDS', 0.05):
+        timer.start()
+        data = client.get(f'{BASE_URL}changes?since={revision}&wait=5').get_json()
+    timer.join()
+    assert summarize(data['changes']) == [('firewall', 'create')]
@@ -0,0 +1,136 @@
+from unittest import mock
+import pytest
+from sqlalchemy import create_engine, event, select, text
+from app import create_app, db
+from app.migrations import upgrade
+from app.models.rule import Rule
+from app.models.user import User
+from app.services.change_service import allocate_revisions
+from app.services.rule_service import network_criteria
+from app.utils.sqlite import register_sqlite_pragmas
+from app.utils.statements import insert_returning
+from config import ProdConfig
+
+@pytest.fixture
+def app():
+    app = create_app(config_name='test')
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.drop_all()
+
+@pytest.fixture(autouse=True)
+def mock_role_required():
+    with mock.patch('app.utils.decorators.role_required', lambda role: lambda f: f):
+        yield
+
+def test_sqlite_pragmas_applied_on_connect(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'prod.db'}")
+    register_sqlite_pragmas(engine, ProdConfig.SQLITE_PRAGMAS)
+    with engine.connect() as connection:
+        assert connection.execute(text('PRAGMA journal_mode')).scalar() == 'wal'
+        assert connection.execute(text('PRAGMA synchronous')).scalar() == 1
+        assert connection.execute(text('PRAGMA busy_timeout')).scalar() == 5000
+        assert connection.execute(text('PRAGMA cache_size')).scalar() == -64000
+    engine.dispose()
+
+def test_create_app_leaves_the_database_alone(app):
+    db.drop_all()
+    create_app(config_name='test')
+    assert db.inspect(db.engine).get_table_names() == []
+
+def test_init_db_and_seed_commands_are_idempotent(app):
+    db.drop_all()
+    runner = app.test_cli_runner()
+
+    result = runner.invoke(args=['init-db'])
+    assert result.exit_code == 0, result.output
+    assert 'rule' in db.inspect(db.engine).get_table_names()
+    assert runner.invoke(args=['init-db']).output == "Schema ready.\n"
+
+    result = runner.invoke(args=['seed'])
+    assert result.output == "Created: role admin, role user, user admin@example.com\n"
+    assert runner.invoke(args=['seed']).output == "Nothing to seed.\n"
+    admin = db.session.execute(select(User).where(User.email == 'admin@example.com')).scalar_one()
+    assert [role.name for role in admin.roles] == ['admin']
+
+def test_upgrade_creates_missing_indexes(app):
+    with db.engine.begin() as connection:
+        connection.execute(text('DROP INDEX ix_rule_policy_protocol_destination'))
+        connection.execute(text('DROP INDEX ix_policy_firewall_id'))
+
+    assert sorted(upgrade()) == ['ix_policy_firewall_id', 'ix_rule_policy_protocol_destination']
+    assert upgrade() == []
+    indexes = {index['name'] for index in db.inspect(db.engine).get_indexes('rule')}
+    assert {'ix_rule_policy_protocol_destination', 'ix_rule_destination_ip', 'ix_rule_protocol'} <= indexes
+
+def test_rule_listing_uses_index(app):
+    if db.engine.dialect.name != 'sqlite':
+        pytest.skip('EXPLAIN QUERY PLAN is specific to SQLite')
+    plan = db.session.execute(text(
+        'EXPLAIN QUERY PLAN SELECT * FROM rule WHERE policy_id = 1 ORDER BY id'
+    )).all()
+    assert 'ix_rule_policy_protocol_destination' in ' '.join(row[-1] for row in plan)
+
+def test_upgrade_adds_missing_columns(app):
+    with db.engine.begin() as connection:
+        connection.execute(text('ALTER TABLE firewall DROP COLUMN revision'))
+        connection.execute(text('ALTER TABLE firewall DROP COLUMN updated_at'))
+
+    assert upgrade() == ['firewall.updated_at', 'firewall.revision']
+    assert upgrade() == []
+    columns = {column['name'] for column in db.inspect(db.engine).get_columns('firewall')}
+    assert {'revision', 'updated_at'} <= columns
+
+def test_upgrade_backfills_rule_networks(app):
+    with db.engine.begin() as connection:
+        connection.execute(text("INSERT INTO firewall (id, name, ip_address, revision) VALUES (1, 'fw', '10.0.0.1', 0)"))
+        connection.execute(text("INSERT INTO policy (id, name, firewall_id) VALUES (1, 'policy', 1)"))
+        connection.execute(text(
+            "INSERT INTO rule (id, policy_id, destination_ip, protocol) "
+            "VALUES (1, 1, '10.0.0.0/8', 'TCP'), (2, 1, 'not-an-ip', 'TCP')"
+        ))
+
+    assert upgrade() == ['rule.network_start (1 rows)']
+    assert upgrade() == []
+    rule = db.session.get(Rule, 1)
+    assert (rule.network_start, rule.network_end, rule.prefixlen) == (
+        0xffff0a000000, 0xffff0affffff, 104
+    )
+
+def test_upgrade_moves_revision_counter_past_recorded_changes(app):
+    with db.engine.begin() as connection:
+        connection.execute(text(
+            "INSERT INTO change_log (id, firewall_id, entity, entity_id, action) VALUES (7, 1, 'firewall', 1, 'create')"
+        ))
+
+    assert upgrade() == ['revision_counter.revision (7)']
+    assert upgrade() == []
+    assert allocate_revisions(3) == 10
+    db.session.rollback()
+
+def test_contains_query_uses_network_index(app):
+    if db.engine.dialect.name != 'sqlite':
+        pytest.skip('EXPLAIN QUERY PLAN is specific to SQLite')
+    query = select(Rule.id).where(*network_criteria(contains='10.0.0.5'))
+    plan = db.session.execute(text('EXPLAIN QUERY PLAN ' + str(query.compile(
+        dialect=db.engine.dialect, compile_kwargs={'literal_binds': True}
+    )))).all()
+    assert 'ix_rule_network' in ' '.join(row[-1] for row in plan)
+
+def test_insert_returning_keeps_parameter_order_in_one_statement(app):
+    db.session.execute(text("INSERT INTO firewall (id, name, ip_address, revision) VALUES (1, 'fw', '10.0.0.1', 0)"))
+    db.session.execute(text("INSERT INTO policy (id, name, firewall_id) VALUES (1, 'policy', 1)"))
+    rows = [{'policy_id': 1, 'protocol': 'TCP', 'destination_ip': f'10.0.0.{i}'} for i in (5, 3, 9, 1)]
+
+    statements = []
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        inserted = insert_returning(Rule, [Rule.id, Rule.destination_ip], rows)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+    assert len(statements) == 1
+    assert [row.destination_ip for row in inserted] == ['10.0.0.5', '10.0.0.3', '10.0.0.9', '10.0.0.1']
+    db.session.rollback()
@@ -0,0 +1,109 @@
+from unittest import mock
+import pytest
+from app import create_app, db
+from app.services.evaluation_service import RuleMatcher
+
+BASE_URL = '/api/v1/firewalls/'
+
+@pytest.fixture
+def app():
+    app = create_app(config_name='test')
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.drop_all()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture(autouse=True)
+def mock_role_required():
+    with mock.patch('app.utils.decorators.role_required', lambda role: lambda f: f):
+        yield
+
+def create_test_firewall(client):
+    response = client.post(BASE_URL, json={
+        'name': 'Test Firewall',
+        'description': 'A firewall for testing purposes',
+        'ip_address': '192.168.1.1'
+    })
+    return response.get_json()['id']
+
+def create_test_policy(client, firewall_id, name='Test Policy', status='active'):
+    response = client.post(f'{BASE_URL}{firewall_id}/policies', json={
+        'name': name,
+        'status': status
+    })
+    return response.get_json()['id']
+
+def create_test_rule(client, firewall_id, policy_id, destination_ip, protocol):
+    response = client.post(f'{BASE_URL}{firewall_id}/policies/{policy_id}/rules', json={
+        'destination_ip': destination_ip,
+        'protocol': protocol
+    })
+    return response.get_json()['id']
+
+def test_rule_matcher_prefixes_and_protocols():
+    matcher = RuleMatcher([
+        (1, 'TCP', '10.0.0.5'),
+        (2, 'tcp', '10.0.0.0/8'),
+        (3, 'UDP', '10.0.0.5'),
+        (4, 'TCP', '2001:db8::/32'),
+        (5, None, '0.0.0.0/0'),
+        (6, 'TCP', 'not-an-ip'),
+    ])
+    assert matcher.match('10.0.0.5', 'TCP') == [1, 2, 5]
+    assert matcher.match('10.200.0.1', 'tcp') == [2, 5]
+    assert matcher.match('10.0.0.5', 'UDP') == [3, 5]
+    assert matcher.match('2001:db8::1', 'TCP') == [4]
+    assert matcher.match('192.168.0.1', 'ICMP') == [5]
+
+def test_evaluate_single_packet(client):
+    firewall_id = create_test_firewall(client)
+    policy_id = create_test_policy(client, firewall_id)
+    host_rule = create_test_rule(client, firewall_id, policy_id, '10.1.2.3', 'TCP')
+    network_rule = create_test_rule(client, firewall_id, policy_id, '10.1.0.0/16', 'TCP')
+    create_test_rule(client, firewall_id, policy_id, '10.1.2.3', 'UDP')
+
+    response = client.post(f'{BASE_URL}{firewall_id}/evaluate', json={
+        'destination_ip': '10.1.2.3',
+        'protocol': 'tcp'
+    })
+    assert response.status_code == 200
+    assert response.get_json() == {'matches': [host_rule, network_rule]}
+
+def test_evaluate_batch_ignores_inactive_policies_and_sees_new_rules(client):
+    firewall_id = create_test_firewall(client)
+    active_policy = create_test_policy(client, firewall_id)
+    inactive_policy = create_test_policy(client, firewall_id, name='Inactive Policy', status='inactive')
+    active_rule = create_test_rule(client, firewall_id, active_policy, '10.0.0.5', 'TCP')
+    create_test_rule(client, firewall_id, inactive_policy, '10.0.0.5', 'TCP')
+
+    packets = [
+        {'destination_ip': '10.0.0.5', 'protocol': 'TCP'},
+        {'destination_ip': '10.0.0.6', 'protocol': 'TCP'},
+    ]
+    response = client.post(f'{BASE_URL}{firewall_id}/evaluate', json={'packets': packets})
+    assert response.status_code == 200
+    assert response.get_json() == {'results': [{'matches': [active_rule]}, {'matches': []}]}
+
+    new_rule = create_test_rule(client, firewall_id, active_policy, '10.0.0.6', 'TCP')
+    response = client.post(f'{BASE_URL}{firewall_id}/evaluate', json={'packets': packets})
+    assert response.get_json()['results'][1] == {'matches': [new_rule]}
+
+def test_evaluate_invalid_packet(client):
+    firewall_id = create_test_firewall(client)
+    response = client.post(f'{BASE_URL}{firewall_id}/evaluate', json={
+        'destination_ip': '10.0.0.300',
+        'protocol': 'TCP'
+    })
+    assert response.status_code == 400
+
+def test_evaluate_nonexistent_firewall(client):
+    response = client.post(f'{BASE_URL}999/evaluate', json={
+        'destination_ip': '10.0.0.5',
+        'protocol': 'TCP'
+    })
+    assert response.status_code == 404
+    assert response.get_json()['error'] == "Firewall with ID 999 does not exist."
@@ -0,0 +1,211 @@
+import http.client
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from unittest import mock
+import pytest
+from sqlalchemy import insert, update
+from app import create_app, db, event_broker
+from app.models.change import Change, RevisionCounter
+from app.services.change_service import stream_changes
+from app.utils.events import EventBroker
+from benchmarks.load_test import free_port, seed_database, wait_for_port
+
+BASE_URL = '/api/v1/firewalls/'
+EVENTS_URL = '/api/v1/events'
+
+@pytest.fixture
+def app():
+    app = create_app(config_name='test')
+    app.config['EVENTS_HEARTBEAT_SECONDS'] = 0.05
+    event_broker.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.drop_all()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture(autouse=True)
+def mock_role_required():
+    with mock.patch('app.utils.decorators.role_required', lambda role: lambda f: f):
+        yield
+
+def create_test_firewall(client, name='Test Firewall', ip_address='192.168.1.1'):
+    response = client.post(BASE_URL, json={
+        'name': name,
+        'ip_address': ip_address
+    })
+    return response.get_json()['id']
+
+def next_event(stream):
+    chunk = next(stream)
+    chunk = chunk.decode() if isinstance(chunk, bytes) else chunk
+    if chunk.startswith(':'):
+        return None
+    lines = dict(line.split(': ', 1) for line in chunk.strip().split('\n'))
+    return lines['event'], json.loads(lines['data'])
+
+def test_events_push_committed_changes(client):
+    response = client.get(EVENTS_URL, buffered=False)
+    assert response.mimetype == 'text/event-stream'
+    stream = iter(response.response)
+    assert next_event(stream) is None
+    assert event_broker.subscriber_count == 1
+
+    firewall_id = create_test_firewall(client)
+    client.post(f'{BASE_URL}{firewall_id}/policies', json={'name': 'Test Policy'})
+    # A rolled back write publishes nothing.
+    client.post(BASE_URL, json={'name': 'Test Firewall', 'ip_address': '192.168.1.1'})
+
+    event, change = next_event(stream)
+    assert (event, change['entity'], change['action']) == ('change', 'firewall', 'create')
+    event, change = next_event(stream)
+    assert (event, change['entity'], change['action']) == ('change', 'policy', 'create')
+    assert next_event(stream) is None
+
+    response.close()
+    assert event_broker.subscriber_count == 0
+
+def test_events_replay_since_revision_and_filter(client):
+    first_id = create_test_firewall(client)
+    second_id = create_test_firewall(client, name='Second Firewall', ip_address='192.168.1.2')
+    client.delete(f'{BASE_URL}{second_id}')
+
+    response = client.get(f'{EVENTS_URL}?firewall_id={first_id}', headers={'Last-Event-ID': '0'}, buffered=False)
+    stream = iter(response.response)
+    _, change = next_event(stream)
+    assert (change['firewall_id'], change['action']) == (first_id, 'create')
+    assert next_event(stream) is None
+
+    client.put(f'{BASE_URL}{second_id}', json={'name': 'Ignored'})
+    client.put(f'{BASE_URL}{first_id}', json={'name': 'Renamed Firewall'})
+    _, change = next_event(stream)
+    assert change['data']['name'] == 'Renamed Firewall'
+    response.close()
+
+    assert client.get(f'{EVENTS_URL}?since=-1').status_code == 400
+
+def test_stream_forwards_changes_published_out_of_order(client):
+    firewall_id = create_test_firewall(client)
+    stream = stream_changes(since=0)
+    assert next(stream)['entity_id'] == firewall_id
+    assert next(stream) is None
+
+    # Concurrent commits may publish a later revision first.
+    event_broker.publish([{'revision': 3, 'firewall_id': firewall_id}])
+    event_broker.publish([{'revision': 2, 'firewall_id': firewall_id}])
+    event_broker.publish([{'revision': 1, 'firewall_id': firewall_id}])
+    assert [next(stream)['revision'] for _ in range(2)] == [3, 2]
+    assert next(stream) is None
+    stream.close()
+    assert event_broker.subscriber_count == 0
+
+def test_events_poll_changes_committed_by_other_processes(app, client):
+    app.config['EVENTS_POLL_SECONDS'] = 0.05
+    event_broker.init_app(app)
+    firewall_id = create_test_firewall(client)
+    response = client.get(EVENTS_URL, buffered=False)
+    stream = iter(response.response)
+    assert next_event(stream) is None
+
+    # Committed by another worker, out of reach of this process's session hooks.
+    with db.engine.begin() as connection:
+        connection.execute(update(RevisionCounter).values(revision=2))
+        connection.execute(insert(Change).values(
+            id=2, firewall_id=firewall_id, entity='firewall', entity_id=firewall_id, action='update'
+        ))
+    # Local commits are read back from the database as well, only once.
+    client.put(f'{BASE_URL}{firewall_id}', json={'name': 'Renamed Firewall'})
+
+    revisions = []
+    deadline = time.monotonic() + 5
+    while len(revisions) < 2 and time.monotonic() < deadline:
+        event = next_event(stream)
+        if event is not None:
+            revisions.append(event[1]['revision'])
+    assert revisions == [2, 3]
+    assert next_event(stream) is None
+    response.close()
+    assert event_broker.subscriber_count == 0
+
+def test_broker_drops_slow_subscribers():
+    broker = EventBroker()
+    broker.queue_size = 2
+    slow = broker.subscribe()
+    other = broker.subscribe(firewall_id=2)
+
+    broker.publish([{'revision': revision, 'firewall_id': 1} for revision in range(1, 4)])
+
+    assert slow.overflowed and not other.overflowed
+    assert broker.subscriber_count == 1
+    assert [slow.get(timeout=1)['revision'] for _ in range(2)] == [1, 2]
+    assert slow.get(timeout=1) is None
+    assert other.get(timeout=0) is None
+
+def test_server_streams_to_more_subscribers_than_threads():
+    directory = tempfile.mkdtemp()
+    env = {
+        **os.environ,
+        'DATABASE_URL': f"sqlite:///{os.path.join(directory, 'events.db')}",
+        'PASSWORD_HASH_ITERATIONS': '1000',
+        'EVENTS_HEARTBEAT_SECONDS': '1',
+        'EVENTS_POLL_SECONDS': '0.1',
+        'WEB_WORKERS': '1',
+        'WEB_THREADS': '2',
+        'WEB_ACCESS_LOG': '/dev/null',
+        'WEB_LOG_LEVEL': 'warning',
+    }
+    for name in ('METRICS_DIR', 'WEB_WORKER_CLASS'):
+        env.pop(name, None)
+    seed_database(env)
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--bind', f'127.0.0.1:{port}', 'run:app'],
+        env=env,
+    )
+    connections = []
+
+    def connect():
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+        connections.append(connection)
+        return connection
+
+    try:
+        wait_for_port(port)
+        connection = connect()
+        connection.request('POST', '/api/v1/users/login', json.dumps({'email': 'admin@example.com', 'password': 'password'}),
+                           {'Content-Type': 'application/json'})
+        headers = {'Authorization': f"Bearer {json.loads(connection.getresponse().read())['access_token']}"}
+
+        streams = []
+        for _ in range(8):
+            stream = connect()
+            stream.request('GET', EVENTS_URL, headers=headers)
+            streams.append(stream.getresponse())
+        assert [stream.status for stream in streams] == [200] * 8
+
+        # The API still answers while every subscriber waits for changes.
+        connection.request('GET', f'{BASE_URL}1', headers=headers)
+        response = connection.getresponse()
+        assert response.status == 200
+        response.read()
+        connection.request('PUT', f'{BASE_URL}1', json.dumps({'name': 'Renamed Firewall'}),
+                           {**headers, 'Content-Type': 'application/json'})
+        response = connection.getresponse()
+        assert response.status == 200
+        response.read()
+        for stream in streams:
+            while not stream.fp.readline().startswith(b'event: change'):
+                pass
+    finally:
+        for connection in connections:
+            connection.close()
+        server.terminate()
+        server.wait()
+
@@ -1,6 +1,9 @@
+import json
 import pytest
 from unittest import mock
+from sqlalchemy import event
 from app import create_app, db
+from app.services.firewall_service import create_firewall, update_firewall
 
 BASE_URL = '/api/v1/firewalls/'
 
@@ -33,6 +36,20 @@ def test_create_firewall(client):
     assert data['name'] == 'Test Firewall'
     assert data['ip_address'] == '192.168.1.1'
 
+def test_create_firewall_validates_ip_address(client):
+    response = client.post(BASE_URL, json={
+        'name': 'IPv6 Firewall',
+        'ip_address': '2001:DB8:0:0:0:0:0:1'
+    })
+    assert response.status_code == 201
+    assert response.get_json()['ip_address'] == '2001:db8::1'
+
+    response = client.post(BASE_URL, json={'name': 'Invalid Firewall', 'ip_address': '192.168.1.300'})
+    assert response.status_code == 400
+    firewall_id = client.get(BASE_URL).get_json()[0]['id']
+    response = client.put(f'{BASE_URL}{firewall_id}', json={'ip_address': '10.0.0.0/8'})
+    assert response.status_code == 400
+
 def test_get_firewall(client):
     response = client.post(BASE_URL, json={
         'name': 'Test Firewall',
@@ -93,6 +110,7 @@ def test_create_firewall_duplicate_name(client):
     })
     print(response.get_data())
     assert response.status_code == 500 
+    assert response.get_json()['error'] == "A firewall with the name 'Duplicate Firewall' already exists."
 
 def test_create_firewall_duplicate_ip(client):
     client.post(BASE_URL, json={
@@ -105,4 +123,211 @@ def test_create_firewall_duplicate_ip(client):
         'description': 'A firewall with a duplicate IP',
         'ip_address': '192.168.1.3'
     })
-    assert response.status_code == 500  
\ No newline at end of file
+    assert response.status_code == 500
+    assert response.get_json()['error'] == "A firewall with the IP address '192.168.1.3' already exists."
+
+def capture_queries(app, func):
+    statements = []
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        result = func()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+    return result, statements
+
+def count_queries(app, func):
+    result, statements = capture_queries(app, func)
+    return result, len(statements)
+
+def seed_firewalls(client, count, policies=2, rules=2, start=0):
+    for i in range(start, start + count):
+        firewall_id = client.post(BASE_URL, json={
+            'name': f'Firewall {i}',
+            'ip_address': f'192.168.{i}.1'
+        }).get_json()['id']
+        for j in range(policies):
+            policy_id = client.post(f'{BASE_URL}{firewall_id}/policies', json={
+                'name': f'Policy {i}-{j}',
+                'status': 'active'
+            }).get_json()['id']
+            for k in range(rules):
+                client.post(f'{BASE_URL}{firewall_id}/policies/{policy_id}/rules', json={
+                    'destination_ip': f'10.{i}.{j}.{k}',
+                    'protocol': 'TCP'
+                })
+
+def test_get_firewalls_nested_tree(client):
+    seed_firewalls(client, 2)
+    response = client.get(BASE_URL)
+    assert response.status_code == 200
+    data = response.get_json()
+    assert [firewall['name'] for firewall in data] == ['Firewall 0', 'Firewall 1']
+    assert len(data[1]['policies']) == 2
+    assert data[1]['policies'][0]['firewall_id'] == data[1]['id']
+    assert [rule['destination_ip'] for rule in data[1]['policies'][1]['rules']] == ['10.1.1.0', '10.1.1.1']
+
+def test_get_firewalls_query_count_is_bounded(app, client):
+    seed_firewalls(client, 1)
+    _, small_count = count_queries(app, lambda: client.get(BASE_URL))
+    seed_firewalls(client, 5, policies=3, rules=4, start=1)
+    large, large_count = count_queries(app, lambda: client.get(BASE_URL))
+    assert len(large.get_json()) == 6
+    assert small_count == large_count <= 3
+
+def test_get_firewalls_cursor_pagination(client):
+    seed_firewalls(client, 5, policies=1, rules=1)
+    response = client.get(f'{BASE_URL}?limit=2')
+    assert response.status_code == 200
+    assert [firewall['name'] for firewall in response.get_json()] == ['Firewall 0', 'Firewall 1']
+    cursor = response.headers['X-Next-Cursor']
+
+    names = []
+    while cursor:
+        response = client.get(f'{BASE_URL}?limit=2&cursor={cursor}')
+        names += [firewall['name'] for firewall in response.get_json()]
+        cursor = response.headers.get('X-Next-Cursor')
+    assert names == ['Firewall 2', 'Firewall 3', 'Firewall 4']
+
+def test_get_firewalls_fields_and_expand(app, client):
+    seed_firewalls(client, 2)
+    response, query_count = count_queries(app, lambda: client.get(f'{BASE_URL}?fields=name&expand='))
+    assert response.status_code == 200
+    assert response.get_json() == [{'id': 1, 'name': 'Firewall 0'}, {'id': 2, 'name': 'Firewall 1'}]
+    assert query_count == 1
+
+    data = client.get(f'{BASE_URL}?expand=policies').get_json()
+    assert len(data[0]['policies']) == 2
+    assert 'rules' not in data[0]['policies'][0]
+
+def test_get_firewalls_invalid_collection_args(client):
+    assert client.get(f'{BASE_URL}?limit=0').status_code == 400
+    assert client.get(f'{BASE_URL}?cursor=abc').status_code == 400
+    assert client.get(f'{BASE_URL}?fields=password').status_code == 400
+    assert client.get(f'{BASE_URL}?expand=users').status_code == 400
+
+def test_export_config_ndjson(client):
+    seed_firewalls(client, 2, policies=1, rules=2)
+    response = client.get(f'{BASE_URL}export')
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    assert response.is_streamed
+
+    records = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [record['type'] for record in records] == ['firewall'] * 2 + ['policy'] * 2 + ['rule'] * 4
+    assert records[2]['name'] == 'Policy 0-0'
+    assert records[-1]['destination_ip'] == '10.1.0.1'
+
+def test_export_config_cli(app, client):
+    seed_firewalls(client, 1, policies=1, rules=1)
+    result = app.test_cli_runner().invoke(args=['export-config'])
+    assert result.exit_code == 0
+    assert [json.loads(line)['type'] for line in result.output.splitlines()] == ['firewall', 'policy', 'rule']
+
+def test_update_firewall_duplicate_name(client):
+    client.post(BASE_URL, json={'name': 'First Firewall', 'ip_address': '192.168.1.1'})
+    firewall_id = client.post(BASE_URL, json={'name': 'Second Firewall', 'ip_address': '192.168.1.2'}).get_json()['id']
+
+    response = client.put(f'{BASE_URL}{firewall_id}', json={'name': 'First Firewall'})
+    assert response.status_code == 404
+    assert response.get_json()['error'] == "A firewall with this name already exists."
+    assert client.get(f'{BASE_URL}{firewall_id}').get_json()['name'] == 'Second Firewall'
+
+def test_create_and_update_firewall_without_lookups(app):
+    firewall, create_statements = capture_queries(app, lambda: create_firewall({
+        'name': 'Test Firewall',
+        'ip_address': '192.168.1.1'
+    }))
+    firewall_id = firewall.id
+    _, update_statements = capture_queries(app, lambda: update_firewall(firewall_id, {'description': 'Updated'}))
+    assert not any(statement.startswith('SELECT') for statement in create_statements + update_statements)
+
+    with pytest.raises(ValueError, match="Firewall not found"):
+        update_firewall(999, {'description': 'Updated'})
+
+def test_get_firewall_conditional(app, client):
+    firewall_id = client.post(BASE_URL, json={
+        'name': 'Test Firewall',
+        'ip_address': '192.168.1.1'
+    }).get_json()['id']
+
+    response = client.get(f'{BASE_URL}{firewall_id}')
+    etag = response.headers['ETag']
+    revision = response.get_json()['revision']
+    assert response.headers['Last-Modified']
+
+    response, query_count = count_queries(
+        app, lambda: client.get(f'{BASE_URL}{firewall_id}', headers={'If-None-Match': etag})
+    )
+    assert response.status_code == 304
+    assert response.headers['ETag'] == etag
+    assert response.get_data() == b''
+    assert query_count == 1
+
+    client.post(f'{BASE_URL}{firewall_id}/policies', json={'name': 'Test Policy'})
+    response = client.get(f'{BASE_URL}{firewall_id}', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert response.get_json()['revision'] > revision
+
+def test_sync_firewall_config(client):
+    firewall_id = client.post(BASE_URL, json={'name': 'Test Firewall', 'ip_address': '192.168.1.1'}).get_json()['id']
+    config_url = f'{BASE_URL}{firewall_id}/config'
+    config = {'policies': [
+        {'name': 'Web', 'rules': [
+            {'destination_ip': '10.0.0.1', 'protocol': 'TCP'},
+            {'destination_ip': '10.0.0.2', 'protocol': 'TCP'},
+        ]},
+        {'name': 'DNS', 'status': 'inactive', 'rules': [{'destination_ip': '10.0.1.0/24', 'protocol': 'UDP'}]},
+    ]}
+
+    response = client.put(config_url, json=config)
+    assert response.status_code == 200
+    summary = response.get_json()
+    assert summary['policies'] == {'created': ['Web', 'DNS'], 'updated': [], 'deleted': []}
+    assert summary['rules'] == {'created': 3, 'deleted': 0, 'unchanged': 0}
+    assert summary['revision'] == client.get(f'{BASE_URL}{firewall_id}').get_json()['revision']
+
+    unchanged = client.put(config_url, json=config).get_json()
+    assert unchanged['revision'] == summary['revision']
+    assert unchanged['rules'] == {'created': 0, 'deleted': 0, 'unchanged': 3}
+
+    config = {'policies': [
+        {'name': 'Web', 'status': 'inactive', 'rules': [
+            {'destination_ip': '10.0.0.1', 'protocol': 'TCP'},
+            {'destination_ip': '10.0.0.3', 'protocol': 'TCP'},
+        ]},
+        {'name': 'Mail', 'rules': [{'destination_ip': '10.0.2.25', 'protocol': 'TCP'}]},
+    ]}
+    dry_run = client.put(f'{config_url}?dry_run=true', json=config).get_json()
+    assert dry_run['revision'] == summary['revision']
+    summary = client.put(config_url, json=config).get_json()
+    assert summary['policies'] == {'created': ['Mail'], 'updated': ['Web'], 'deleted': ['DNS']}
+    assert summary['rules'] == {'created': 2, 'deleted': 2, 'unchanged': 1}
+    assert {key: value for key, value in dry_run.items() if key != 'revision'} == {
+        key: value for key, value in summary.items() if key != 'revision'
+    }
+
+    tree = client.get(f'{BASE_URL}{firewall_id}/policies').get_json()
+    assert {
+        (policy['name'], policy['status']): sorted(rule['destination_ip'] for rule in policy['rules'])
+        for policy in tree
+    } == {('Web', 'inactive'): ['10.0.0.1', '10.0.0.3'], ('Mail', 'active'): ['10.0.2.25']}
+
+def test_sync_firewall_config_errors(client):
+    first_id = client.post(BASE_URL, json={'name': 'First Firewall', 'ip_address': '192.168.1.1'}).get_json()['id']
+    second_id = client.post(BASE_URL, json={'name': 'Second Firewall', 'ip_address': '192.168.1.2'}).get_json()['id']
+    client.put(f'{BASE_URL}{first_id}/config', json={'policies': [{'name': 'Shared'}]})
+
+    response = client.put(f'{BASE_URL}{second_id}/config', json={'policies': [
+        {'name': 'Own', 'rules': [{'destination_ip': '10.0.0.1', 'protocol': 'TCP'}]}, {'name': 'Shared'}
+    ]})
+    assert response.status_code == 400
+    assert client.get(f'{BASE_URL}{second_id}/policies').status_code == 404
+
+    assert client.put(f'{BASE_URL}{second_id}/config', json={'policies': [{'name': 'A'}, {'name': 'A'}]}).status_code == 400
+    assert client.put(f'{BASE_URL}{second_id}/config', json={'policies': [
+        {'name': 'A', 'rules': [{'protocol': 'TCP'}]}
+    ]}).status_code == 400
+    assert client.put(f'{BASE_URL}999/config', json={'policies': []}).status_code == 404
@@ -0,0 +1,57 @@
+import datetime
+import json
+from unittest import mock
+import pytest
+from app import create_app, db
+from app.utils import json_provider
+
+BASE_URL = '/api/v1/firewalls/'
+
+@pytest.fixture
+def app():
+    app = create_app(config_name='test')
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.drop_all()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture(autouse=True)
+def mock_role_required():
+    with mock.patch('app.utils.decorators.role_required', lambda role: lambda f: f):
+        yield
+
+@pytest.fixture(params=['orjson', 'stdlib'])
+def encoder(request):
+    if request.param == 'orjson':
+        pytest.importorskip('orjson')
+        yield request.param
+    else:
+        with mock.patch.object(json_provider, 'orjson', None):
+            yield request.param
+
+def test_encoding(app, encoder):
+    moment = datetime.datetime(2024, 5, 1, 12, 30, 15, 250000)
+    payload = {'b': moment, 'a': [datetime.date(2024, 5, 1), 1 << 70]}
+    with app.test_request_context():
+        response = app.json.response(payload)
+    assert response.mimetype == 'application/json'
+    assert json.loads(response.get_data()) == {
+        'a': ['2024-05-01', 1 << 70], 'b': '2024-05-01T12:30:15.250000'
+    }
+    assert json.loads(app.json.dumps({'moment': moment}, indent=2)) == {'moment': moment.isoformat()}
+    assert app.json.loads('{"a": [1, 2.5, null]}') == {'a': [1, 2.5, None]}
+
+def test_listing_matches_to_dict(client, encoder):
+    firewall = client.post(BASE_URL, json={'name': 'Test Firewall', 'ip_address': '192.168.1.1'}).get_json()
+    listed = client.get(f'{BASE_URL}?expand=').get_json()
+    assert listed == [{key: value for key, value in firewall.items() if key != 'policies'}]
+    assert client.get(f"{BASE_URL}{firewall['id']}").get_json() == firewall
+
+def test_invalid_json_body(client, encoder):
+    # Malformed bodies are rejected as by the standard library decoder.
+    response = client.post(BASE_URL, data='{"name": ', content_type='application/json')
+    assert response.get_json()['error'].startswith('400 Bad Request')
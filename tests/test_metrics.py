@@ -0,0 +1,113 @@
+import json
+import os
+from unittest import mock
+import pytest
+from app import create_app, db, metrics
+from app.utils.metrics import EXITED_FILE, Histogram, collect_exited_process
+
+BASE_URL = '/api/v1/firewalls/'
+METRICS_URL = '/metrics'
+
+@pytest.fixture
+def app():
+    app = create_app(config_name='test')
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.drop_all()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture(autouse=True)
+def mock_role_required():
+    with mock.patch('app.utils.decorators.role_required', lambda role: lambda f: f):
+        yield
+
+def parse_metrics(text):
+    samples = {}
+    for line in text.splitlines():
+        if line and not line.startswith('#'):
+            name, value = line.rsplit(' ', 1)
+            samples[name] = float(value)
+    return samples
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram('test_seconds', 'Test.', ('route',), (0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 5.0):
+        histogram.observe(value, ('/a',))
+    values = {}
+    histogram.merge(values, histogram.snapshot())
+
+    samples = {(name, labels): value for name, _, labels, value in histogram.samples(values)}
+    assert samples[('test_seconds_bucket', ('/a', '0.1'))] == 1
+    assert samples[('test_seconds_bucket', ('/a', '1'))] == 3
+    assert samples[('test_seconds_bucket', ('/a', '+Inf'))] == 4
+    assert samples[('test_seconds_count', ('/a',))] == 4
+    assert samples[('test_seconds_sum', ('/a',))] == pytest.approx(6.05)
+
+def test_metrics_endpoint(client):
+    route = 'route="/api/v1/firewalls/<int:id>",method="GET"'
+    before = parse_metrics(client.get(METRICS_URL).get_data(as_text=True))
+    client.post(BASE_URL, json={'name': 'Test Firewall', 'ip_address': '192.168.1.1'})
+    client.get(f'{BASE_URL}1')
+
+    response = client.get(METRICS_URL)
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    samples = parse_metrics(response.get_data(as_text=True))
+
+    requests = f'jouerflux_http_requests_total{{blueprint="firewall",{route},status="200"}}'
+    assert samples[requests] - before.get(requests, 0) == 1
+    latency = f'jouerflux_http_request_duration_seconds_count{{blueprint="firewall",{route}}}'
+    assert samples[latency] - before.get(latency, 0) == 1
+    assert samples[f'jouerflux_http_response_size_bytes_sum{{blueprint="firewall",{route}}}'] > 0
+    assert samples['jouerflux_db_query_duration_seconds_count{route="/api/v1/firewalls/<int:id>"}'] >= 1
+    assert samples['jouerflux_db_pool_checkout_wait_seconds_count'] >= 1
+    assert samples['jouerflux_password_hash_queue_depth'] == 0
+    assert samples['jouerflux_event_subscribers'] == 0
+    assert samples['jouerflux_db_pool_checked_out'] >= 1
+
+def test_metrics_aggregated_across_processes(app, client, tmp_path):
+    # Another worker, with one request and one open event stream.
+    other = {
+        "pid": os.getpid() + 1,
+        "metrics": {"jouerflux_http_requests_total": [
+            [["firewall", "/api/v1/firewalls/", "GET", "200"], 5],
+        ]},
+        "gauges": {"jouerflux_event_subscribers": 1},
+    }
+    (tmp_path / f'metrics-{other["pid"]}.json').write_text(json.dumps(other))
+    with mock.patch.object(metrics, 'directory', str(tmp_path)), \
+            mock.patch('app.utils.metrics._process_alive', return_value=True):
+        client.get(BASE_URL)
+        samples = parse_metrics(client.get(METRICS_URL).get_data(as_text=True))
+        assert os.path.exists(tmp_path / f'metrics-{os.getpid()}.json')
+
+        key = 'jouerflux_http_requests_total{blueprint="firewall",route="/api/v1/firewalls/",method="GET",status="200"}'
+        assert samples[key] >= 6
+        assert samples['jouerflux_event_subscribers'] == 1
+
+        with mock.patch('app.utils.metrics._process_alive', return_value=False):
+            samples = parse_metrics(client.get(METRICS_URL).get_data(as_text=True))
+        # A dead worker keeps its counts but not its gauges.
+        assert samples[key] >= 6
+        assert samples['jouerflux_event_subscribers'] == 0
+        # Its file is merged into the one of exited workers, counted once.
+        assert not os.path.exists(tmp_path / f'metrics-{other["pid"]}.json')
+        assert os.path.exists(tmp_path / EXITED_FILE)
+        assert parse_metrics(client.get(METRICS_URL).get_data(as_text=True))[key] == samples[key]
+
+
+def test_exited_worker_collected(tmp_path):
+    # What gunicorn's child_exit hook does for each worker that exits.
+    for pid, count in ((101, 2), (102, 3)):
+        worker = {"pid": pid, "metrics": {"jouerflux_http_requests_total": [[["firewall", "/", "GET", "200"], count]]}, "gauges": {}}
+        (tmp_path / f'metrics-{pid}.json').write_text(json.dumps(worker))
+        collect_exited_process(str(tmp_path), pid)
+    collect_exited_process(str(tmp_path), 102)
+
+    assert not list(tmp_path.glob('metrics-*.json'))
+    exited = json.loads((tmp_path / EXITED_FILE).read_text())
+    assert exited["metrics"]["jouerflux_http_requests_total"] == [[["firewall", "/", "GET", "200"], 5]]
@@ -1,6 +1,9 @@
+import json
 from unittest import mock
 import pytest
 from app import create_app, db
+from app.services.analysis_service import analyze_rules
+from app.utils.ipnet import network_range
 
 BASE_URL = '/api/v1/firewalls/'
 
@@ -151,4 +154,91 @@ def test_get_policies_for_nonexistent_firewall(client):
     response = client.get(f'{BASE_URL}999/policies')
     assert response.status_code == 404
     data = response.get_json()
-    assert data['error'] == "No policies found for this firewall"
\ No newline at end of file
+    assert data['error'] == "No policies found for this firewall"
+def test_get_policies_paginated_without_rules(client):
+    firewall_id = create_test_firewall(client)
+    for i in range(3):
+        policy_id = client.post(f'{BASE_URL}{firewall_id}/policies', json={'name': f'Policy {i}'}).get_json()['id']
+        client.post(f'{BASE_URL}{firewall_id}/policies/{policy_id}/rules', json={
+            'destination_ip': '10.0.0.5',
+            'protocol': 'TCP'
+        })
+
+    response = client.get(f'{BASE_URL}{firewall_id}/policies?limit=2&fields=name,status&expand=')
+    assert response.status_code == 200
+    assert [policy['name'] for policy in response.get_json()] == ['Policy 0', 'Policy 1']
+    assert set(response.get_json()[0]) == {'id', 'name', 'status'}
+
+    response = client.get(f"{BASE_URL}{firewall_id}/policies?limit=2&cursor={response.headers['X-Next-Cursor']}")
+    data = response.get_json()
+    assert [policy['name'] for policy in data] == ['Policy 2']
+    assert len(data[0]['rules']) == 1
+    assert 'X-Next-Cursor' not in response.headers
+
+def test_update_policy_duplicate_name(client):
+    firewall_id = create_test_firewall(client)
+    client.post(f'{BASE_URL}{firewall_id}/policies', json={'name': 'First Policy'})
+    policy_id = client.post(f'{BASE_URL}{firewall_id}/policies', json={'name': 'Second Policy'}).get_json()['id']
+
+    response = client.put(f'{BASE_URL}{firewall_id}/policies/{policy_id}', json={'name': 'First Policy'})
+    assert response.status_code == 404
+    assert response.get_json()['error'] == "A policy with the name 'First Policy' already exists."
+
+    response = client.put(f'{BASE_URL}{firewall_id}/policies/999', json={'name': 'Third Policy'})
+    assert response.status_code == 404
+    assert response.get_json()['error'] == "Policy with ID 999 does not exist."
+
+def test_analyze_rules_sweep():
+    def rule(rule_id, protocol, destination_ip):
+        return (rule_id, protocol, *network_range(destination_ip))
+
+    report = analyze_rules([
+        rule(1, 'TCP', '10.0.0.0/8'),
+        rule(2, 'tcp', '10.1.0.0/16'),
+        rule(3, 'TCP', '10.0.0.0/8'),
+        rule(4, 'UDP', '192.168.0.0/25'),
+        rule(5, 'UDP', '192.168.0.128/25'),
+        rule(6, 'UDP', '192.168.1.0/24'),
+        rule(7, 'UDP', '192.168.0.5'),
+        rule(8, None, '172.16.0.0/12'),
+        rule(9, 'ICMP', '172.16.1.1'),
+        rule(10, 'UDP', '2001:db8::/33'),
+        rule(11, 'UDP', '2001:db8:8000::/33'),
+        rule(12, 'TCP', '10.2.0.0/16'),
+        rule(13, 'TCP', '9.0.0.0/8'),
+        (14, 'TCP', None, None, None),
+    ])
+    assert report['duplicates'] == [{'rule_id': 3, 'duplicate_of': 1}]
+    assert report['shadowed'] == [
+        {'rule_id': 2, 'shadowed_by': 1}, {'rule_id': 7, 'shadowed_by': 4},
+        {'rule_id': 9, 'shadowed_by': 8}, {'rule_id': 12, 'shadowed_by': 1},
+    ]
+    assert report['mergeable'] == [
+        {'network': '192.168.0.0/23', 'protocol': 'UDP', 'rule_ids': [4, 5, 6]},
+        {'network': '2001:db8::/32', 'protocol': 'UDP', 'rule_ids': [10, 11]},
+    ]
+    assert report['invalid'] == [14]
+
+def test_analyze_policy_endpoint_and_cli(app, client):
+    firewall_id = create_test_firewall(client)
+    policy_id = client.post(f'{BASE_URL}{firewall_id}/policies', json={'name': 'Test Policy'}).get_json()['id']
+    client.post(f'{BASE_URL}{firewall_id}/policies/{policy_id}/rules:bulk', json=[
+        {'destination_ip': '10.0.0.0/25', 'protocol': 'TCP'},
+        {'destination_ip': '10.0.0.128/25', 'protocol': 'TCP'},
+        {'destination_ip': '10.0.0.7', 'protocol': 'TCP'},
+        {'destination_ip': '10.0.0.0/25', 'protocol': 'TCP'},
+    ])
+
+    response = client.get(f'{BASE_URL}{firewall_id}/policies/{policy_id}/analysis')
+    assert response.status_code == 200
+    report = response.get_json()
+    assert report['rules'] == 4
+    assert report['duplicates'] == [{'rule_id': 4, 'duplicate_of': 1}]
+    assert report['shadowed'] == [{'rule_id': 3, 'shadowed_by': 1}]
+    assert report['mergeable'] == [{'network': '10.0.0.0/24', 'protocol': 'TCP', 'rule_ids': [1, 2]}]
+    assert client.get(f'{BASE_URL}{firewall_id}/policies/999/analysis').status_code == 404
+
+    result = app.test_cli_runner().invoke(args=['analyze-policy', str(policy_id)])
+    assert result.exit_code == 0
+    assert json.loads(result.output) == report
+    assert app.test_cli_runner().invoke(args=['analyze-policy', '999']).exit_code == 1
@@ -0,0 +1,71 @@
+import glob
+import json
+import logging
+from unittest import mock
+import pytest
+from app import create_app, db
+
+BASE_URL = '/api/v1/firewalls/'
+
+@pytest.fixture
+def app():
+    app = create_app(config_name='test')
+    app.config['PROFILING_ENABLED'] = True
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.drop_all()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture(autouse=True)
+def mock_role_required():
+    with mock.patch('app.utils.decorators.role_required', lambda role: lambda f: f):
+        yield
+
+def server_timing(response):
+    metrics = {}
+    for metric in response.headers['Server-Timing'].split(', '):
+        name, *params = metric.split(';')
+        metrics[name] = dict(param.split('=', 1) for param in params)
+    return metrics
+
+def test_server_timing_and_log_line(client, caplog):
+    client.post(BASE_URL, json={'name': 'Test Firewall', 'ip_address': '192.168.1.1'})
+
+    with caplog.at_level(logging.INFO, logger='app.profiling'):
+        response = client.get(BASE_URL)
+
+    assert response.status_code == 200
+    metrics = server_timing(response)
+    assert {'app', 'db', 'serialize'} <= set(metrics)
+    assert float(metrics['db']['dur']) <= float(metrics['app']['dur'])
+
+    record = json.loads(caplog.records[-1].getMessage())
+    assert record['method'] == 'GET'
+    assert record['path'] == BASE_URL
+    assert record['status'] == 200
+    assert record['sql_count'] >= 1
+    assert metrics['db']['desc'] == f'"{record["sql_count"]} queries"'
+    assert 'profile' not in record
+
+def test_disabled_by_default(app, client):
+    app.config['PROFILING_ENABLED'] = False
+    response = client.get(BASE_URL)
+    assert 'Server-Timing' not in response.headers
+
+def test_profile_dumped_over_threshold(app, client, tmp_path, caplog):
+    app.config['PROFILING_DUMP_DIR'] = str(tmp_path)
+    app.config['PROFILING_THRESHOLD_MS'] = 10 ** 6
+    client.get(BASE_URL)
+    assert glob.glob(str(tmp_path / '*.prof')) == []
+
+    app.config['PROFILING_THRESHOLD_MS'] = 0
+    with caplog.at_level(logging.INFO, logger='app.profiling'):
+        client.get(BASE_URL)
+
+    dumps = glob.glob(str(tmp_path / '*-GET-api_v1_firewalls.prof'))
+    assert len(dumps) == 1
+    assert json.loads(caplog.records[-1].getMessage())['profile'] == dumps[0]
@@ -0,0 +1,120 @@
+from unittest import mock
+import pytest
+from app import create_app, db
+from app.models.rule import Rule
+from app.services import render_service
+
+BASE_URL = '/api/v1/firewalls/'
+
+@pytest.fixture
+def app():
+    app = create_app(config_name='test')
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.drop_all()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture(autouse=True)
+def mock_role_required():
+    with mock.patch('app.utils.decorators.role_required', lambda role: lambda f: f):
+        yield
+
+def create_test_firewall(client):
+    response = client.post(BASE_URL, json={
+        'name': 'Test Firewall',
+        'ip_address': '192.168.1.1'
+    })
+    return response.get_json()['id']
+
+def create_test_policy(client, firewall_id, name='Test Policy', status='active'):
+    response = client.post(f'{BASE_URL}{firewall_id}/policies', json={
+        'name': name,
+        'status': status
+    })
+    return response.get_json()['id']
+
+def create_test_rule(client, firewall_id, policy_id, destination_ip, protocol):
+    response = client.post(f'{BASE_URL}{firewall_id}/policies/{policy_id}/rules', json={
+        'destination_ip': destination_ip,
+        'protocol': protocol
+    })
+    return response.get_json()['id']
+
+def render(client, firewall_id, format='nftables'):
+    response = client.get(f'{BASE_URL}{firewall_id}/render?format={format}')
+    assert response.status_code == 200
+    return response.get_data(as_text=True)
+
+def test_render_nftables(client):
+    firewall_id = create_test_firewall(client)
+    policy_id = create_test_policy(client, firewall_id)
+    inactive_id = create_test_policy(client, firewall_id, name='Inactive Policy', status='inactive')
+    host_rule = create_test_rule(client, firewall_id, policy_id, '10.0.0.5', 'TCP')
+    v6_rule = create_test_rule(client, firewall_id, policy_id, '2001:db8::/32', 'ICMP')
+    # Rules are validated on input, but older databases may hold invalid ones.
+    legacy_rule = Rule(policy_id=policy_id, destination_ip='not-an-ip', protocol='TCP')
+    db.session.add(legacy_rule)
+    db.session.commit()
+    create_test_rule(client, firewall_id, inactive_id, '10.0.0.6', 'TCP')
+
+    ruleset = render(client, firewall_id)
+    assert ruleset.startswith('# Generated by JouerFlux for firewall "Test Firewall"')
+    assert f'\t\tjump policy_{policy_id}\n' in ruleset
+    assert f'policy_{inactive_id}' not in ruleset
+    assert f'\t\tip daddr 10.0.0.5 meta l4proto tcp accept comment "rule {host_rule}"\n' in ruleset
+    assert f'\t\tip6 daddr 2001:db8::/32 meta l4proto ipv6-icmp accept comment "rule {v6_rule}"\n' in ruleset
+    assert f"# rule {legacy_rule.id} skipped: invalid destination 'not-an-ip'" in ruleset
+    assert '10.0.0.6' not in ruleset
+
+def test_render_iptables_restore_per_family(client):
+    firewall_id = create_test_firewall(client)
+    policy_id = create_test_policy(client, firewall_id)
+    v4_rule = create_test_rule(client, firewall_id, policy_id, '10.0.0.0/24', 'UDP')
+    v6_rule = create_test_rule(client, firewall_id, policy_id, '2001:db8::1', 'TCP')
+
+    ruleset = render(client, firewall_id, 'iptables-restore')
+    assert f':JF-POLICY-{policy_id} - [0:0]\n' in ruleset
+    assert f'-A JF-POLICY-{policy_id} -d 10.0.0.0/24 -p udp -m comment --comment "rule {v4_rule}" -j ACCEPT\n' in ruleset
+    assert '2001:db8::1' not in ruleset
+    assert ruleset.endswith('-A JOUERFLUX -j DROP\nCOMMIT\n')
+
+    ruleset = render(client, firewall_id, 'ip6tables-restore')
+    assert f'-A JF-POLICY-{policy_id} -d 2001:db8::1 -p tcp -m comment --comment "rule {v6_rule}" -j ACCEPT\n' in ruleset
+    assert '10.0.0.0/24' not in ruleset
+
+    assert client.get(f'{BASE_URL}{firewall_id}/render?format=pf').status_code == 400
+    assert client.get(f'{BASE_URL}999/render').status_code == 404
+
+def test_render_is_cached_and_rebuilds_changed_policies_only(client):
+    firewall_id = create_test_firewall(client)
+    first_policy = create_test_policy(client, firewall_id)
+    second_policy = create_test_policy(client, firewall_id, name='Second Policy')
+    create_test_rule(client, firewall_id, first_policy, '10.0.0.1', 'TCP')
+    rule_id = create_test_rule(client, firewall_id, second_policy, '10.0.0.2', 'TCP')
+
+    with mock.patch.object(render_service, '_load_chains', wraps=render_service._load_chains) as load_chains:
+        ruleset = render(client, firewall_id)
+        assert render(client, firewall_id) == ruleset
+        assert load_chains.call_count == 1
+
+        client.put(f'{BASE_URL}{firewall_id}/policies/{second_policy}/rules/{rule_id}', json={
+            'destination_ip': '10.0.0.3',
+            'protocol': 'UDP'
+        })
+        updated = render(client, firewall_id)
+        assert load_chains.call_args == mock.call(firewall_id, {second_policy})
+
+        client.delete(f'{BASE_URL}{firewall_id}/policies/{second_policy}/rules/{rule_id}')
+        deleted = render(client, firewall_id)
+        assert load_chains.call_args == mock.call(firewall_id, {second_policy})
+
+    assert 'ip daddr 10.0.0.2 meta l4proto tcp' in ruleset
+    assert 'ip daddr 10.0.0.3 meta l4proto udp' in updated and '10.0.0.2' not in updated
+    assert '10.0.0.3' not in deleted and 'ip daddr 10.0.0.1 meta l4proto tcp' in deleted
+
+    response = client.get(f'{BASE_URL}{firewall_id}/render')
+    assert client.get(f'{BASE_URL}{firewall_id}/render', headers={'If-None-Match': response.headers['ETag']}).status_code == 304
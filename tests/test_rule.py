@@ -106,4 +106,140 @@ def test_delete_rule(client):
     assert response.status_code == 204  
 
     response = client.get(f'{BASE_URL}{firewall_id}/policies/{policy_id}/rules/{rule_id}')
-    assert response.status_code == 404
\ No newline at end of file
+    assert response.status_code == 404
+def test_get_rules_paginated(client):
+    firewall_id = create_test_firewall(client)
+    policy_id = create_test_policy(client, firewall_id)
+    for i in range(3):
+        client.post(f'{BASE_URL}{firewall_id}/policies/{policy_id}/rules', json={
+            'destination_ip': f'10.0.0.{i}',
+            'protocol': 'TCP'
+        })
+
+    response = client.get(f'{BASE_URL}{firewall_id}/policies/{policy_id}/rules?limit=2&fields=destination_ip')
+    assert response.status_code == 200
+    assert response.get_json() == [{'id': 1, 'destination_ip': '10.0.0.0'}, {'id': 2, 'destination_ip': '10.0.0.1'}]
+
+    cursor = response.headers['X-Next-Cursor']
+    response = client.get(f'{BASE_URL}{firewall_id}/policies/{policy_id}/rules?limit=2&cursor={cursor}')
+    assert [rule['destination_ip'] for rule in response.get_json()] == ['10.0.0.2']
+
+def test_bulk_create_rules_reports_invalid_rows(client):
+    firewall_id = create_test_firewall(client)
+    policy_id = create_test_policy(client, firewall_id)
+
+    rules = [{'destination_ip': f'10.0.{i // 256}.{i % 256}', 'protocol': 'TCP'} for i in range(2500)]
+    rules[3] = {'destination_ip': '10.0.0.3'}
+    rules[2001] = {'protocol': 'UDP'}
+    response = client.post(f'{BASE_URL}{firewall_id}/policies/{policy_id}/rules:bulk', json=rules)
+
+    assert response.status_code == 201
+    data = response.get_json()
+    assert data['created'] == 2498
+    assert [error['index'] for error in data['errors']] == [3, 2001]
+    assert data['errors'][0]['error'] == {'protocol': ['Missing data for required field.']}
+
+    response = client.get(f'{BASE_URL}{firewall_id}/policies/{policy_id}/rules?limit=1000&fields=id')
+    assert response.status_code == 200
+    assert 'X-Next-Cursor' in response.headers
+
+def test_bulk_create_rules_ndjson_atomic(client):
+    firewall_id = create_test_firewall(client)
+    policy_id = create_test_policy(client, firewall_id)
+    url = f'{BASE_URL}{firewall_id}/policies/{policy_id}/rules:bulk'
+
+    body = '{"destination_ip": "10.0.0.1", "protocol": "TCP"}\n{not json}\n'
+    response = client.post(f'{url}?atomic=true', data=body, content_type='application/x-ndjson')
+    assert response.status_code == 400
+    assert response.get_json()['created'] == 0
+    assert response.get_json()['errors'][0]['index'] == 1
+    assert client.get(f'{BASE_URL}{firewall_id}/policies/{policy_id}/rules').status_code == 404
+
+    body = '{"destination_ip": "10.0.0.1", "protocol": "TCP"}\n\n{"destination_ip": "10.0.0.2", "protocol": "UDP"}\n'
+    response = client.post(url, data=body, content_type='application/x-ndjson')
+    assert response.status_code == 201
+    assert response.get_json() == {'created': 2, 'errors': []}
+
+def test_bulk_create_rules_unknown_policy(client):
+    firewall_id = create_test_firewall(client)
+    response = client.post(f'{BASE_URL}{firewall_id}/policies/999/rules:bulk', json=[])
+    assert response.status_code == 404
+
+def test_rule_changes_invalidate_etag(client):
+    firewall_id = create_test_firewall(client)
+    policy_id = create_test_policy(client, firewall_id)
+    url = f'{BASE_URL}{firewall_id}/policies/{policy_id}/rules'
+    rule_id = client.post(url, json={'destination_ip': '10.0.0.5', 'protocol': 'TCP'}).get_json()['id']
+
+    etag = client.get(url).headers['ETag']
+    assert client.get(url, headers={'If-None-Match': etag}).status_code == 304
+
+    client.put(f'{url}/{rule_id}', json={'destination_ip': '10.0.0.6', 'protocol': 'TCP'})
+    response = client.get(url, headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+
+    client.delete(f'{url}/{rule_id}')
+    assert client.get(f'{BASE_URL}{firewall_id}/policies', headers={'If-None-Match': etag}).status_code == 200
+
+def test_rules_of_another_firewall_are_not_found(client):
+    firewall_id = create_test_firewall(client)
+    other_id = client.post(BASE_URL, json={'name': 'Other Firewall', 'ip_address': '192.168.1.2'}).get_json()['id']
+    policy_id = create_test_policy(client, other_id)
+    url = f'{BASE_URL}{other_id}/policies/{policy_id}/rules'
+    rule_id = client.post(url, json={'destination_ip': '10.0.0.5', 'protocol': 'TCP'}).get_json()['id']
+
+    wrong_url = f'{BASE_URL}{firewall_id}/policies/{policy_id}/rules'
+    etag = client.get(f'{BASE_URL}{firewall_id}').headers['ETag']
+    for path in (wrong_url, f'{wrong_url}/{rule_id}'):
+        assert client.get(path).status_code == 404
+        assert client.get(path, headers={'If-None-Match': etag}).status_code == 404
+    own_policy_id = client.post(f'{BASE_URL}{firewall_id}/policies', json={'name': 'Own Policy'}).get_json()['id']
+    assert client.get(f'{BASE_URL}{firewall_id}/policies/{own_policy_id}/rules/{rule_id}').status_code == 404
+
+def test_create_rule_validates_destination(client):
+    firewall_id = create_test_firewall(client)
+    policy_id = create_test_policy(client, firewall_id)
+    rules_url = f'{BASE_URL}{firewall_id}/policies/{policy_id}/rules'
+
+    response = client.post(rules_url, json={'destination_ip': '2001:DB8::/32', 'protocol': 'TCP'})
+    assert response.status_code == 201
+    assert response.get_json()['destination_ip'] == '2001:db8::/32'
+    response = client.post(rules_url, json={'destination_ip': '10.0.0.5/32', 'protocol': 'TCP'})
+    assert response.get_json()['destination_ip'] == '10.0.0.5'
+
+    for destination_ip in ('not-an-ip', '10.0.0.5/8', '10.0.0.0/33'):
+        response = client.post(rules_url, json={'destination_ip': destination_ip, 'protocol': 'TCP'})
+        assert response.status_code == 400
+
+def test_update_rule_validates_destination(client):
+    firewall_id = create_test_firewall(client)
+    policy_id = create_test_policy(client, firewall_id)
+    rules_url = f'{BASE_URL}{firewall_id}/policies/{policy_id}/rules'
+    rule_id = client.post(rules_url, json={'destination_ip': '10.0.0.5', 'protocol': 'TCP'}).get_json()['id']
+
+    response = client.put(f'{rules_url}/{rule_id}', json={'destination_ip': 'not-an-ip', 'protocol': 'TCP'})
+    assert response.status_code == 400
+    assert 'destination_ip' in response.get_json()['error']
+    assert client.get(f'{rules_url}/{rule_id}').get_json()['destination_ip'] == '10.0.0.5'
+
+def test_get_rules_contains_and_within(client):
+    firewall_id = create_test_firewall(client)
+    policy_id = create_test_policy(client, firewall_id)
+    rules_url = f'{BASE_URL}{firewall_id}/policies/{policy_id}/rules'
+    client.post(f'{rules_url}:bulk', json=[
+        {'destination_ip': destination_ip, 'protocol': 'TCP'}
+        for destination_ip in ('10.0.0.5', '10.0.0.0/24', '10.0.0.0/8', '10.1.0.0/16', '192.168.0.0/16', '::/0')
+    ])
+
+    def destinations(query):
+        response = client.get(f'{rules_url}?{query}')
+        assert response.status_code == 200
+        return [rule['destination_ip'] for rule in response.get_json()]
+
+    assert destinations('contains=10.0.0.5') == ['10.0.0.5', '10.0.0.0/24', '10.0.0.0/8', '::/0']
+    assert destinations('contains=10.1.2.3') == ['10.0.0.0/8', '10.1.0.0/16', '::/0']
+    assert destinations('within=10.0.0.0/8') == ['10.0.0.5', '10.0.0.0/24', '10.0.0.0/8', '10.1.0.0/16']
+    assert destinations('within=10.0.0.0/16&contains=10.0.0.5') == ['10.0.0.5', '10.0.0.0/24']
+    assert destinations('within=172.16.0.0/12') == []
+    assert client.get(f'{rules_url}?contains=10.0.0.0/8').status_code == 400
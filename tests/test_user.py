@@ -0,0 +1,139 @@
+import threading
+import time
+from unittest import mock
+import pytest
+from flask import jsonify
+from flask_jwt_extended import decode_token
+from sqlalchemy import event, insert
+from werkzeug.security import generate_password_hash
+from app import create_app, db, password_hasher
+from app.models.user import TokenRevocation, User
+from app.services.user_service import seed_default_users
+from app.utils import decorators, token_revocation
+from app.utils.passwords import PasswordHasher
+
+BASE_URL = '/api/v1/users/'
+
+@pytest.fixture
+def app():
+    app = create_app(config_name='test')
+
+    @app.route('/admin-only')
+    @decorators.role_required('admin')
+    def admin_only():
+        return jsonify({"msg": "ok"})
+
+    @app.route('/users-only')
+    @decorators.role_required('user')
+    def users_only():
+        return jsonify({"msg": "ok"})
+
+    with app.app_context():
+        db.create_all()
+        seed_default_users()
+        yield app
+        db.drop_all()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+def login(client, email='admin@example.com', password='password'):
+    response = client.post(f'{BASE_URL}login', json={'email': email, 'password': password})
+    assert response.status_code == 200
+    return response.get_json()['access_token']
+
+def test_login_embeds_roles_in_token(app, client):
+    token = login(client)
+    claims = decode_token(token)
+    assert claims['roles'] == ['admin']
+
+def test_role_required_uses_token_claims_only(client):
+    headers = {'Authorization': f'Bearer {login(client)}'}
+    # Loads the revocations, which are then cached for a while.
+    client.get('/admin-only', headers=headers)
+    statements = []
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        assert client.get('/admin-only', headers=headers).status_code == 200
+        assert client.get('/users-only', headers=headers).status_code == 403
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+    assert statements == []
+
+def test_update_user_revokes_tokens(client):
+    token = login(client)
+    headers = {'Authorization': f'Bearer {token}'}
+    user_id = decode_token(token)['sub']
+
+    response = client.put(f'{BASE_URL}{user_id}', json={'active': True})
+    assert response.status_code == 200
+    assert client.get('/admin-only', headers=headers).status_code == 401
+
+    headers = {'Authorization': f'Bearer {login(client)}'}
+    assert client.get('/admin-only', headers=headers).status_code == 200
+
+def test_revocations_are_shared_through_the_database(app, client):
+    token = login(client)
+    headers = {'Authorization': f'Bearer {token}'}
+    user_id = int(decode_token(token)['sub'])
+    assert client.get('/admin-only', headers=headers).status_code == 200
+
+    # Committed by another worker: applied here once the cache is refreshed.
+    with db.engine.begin() as connection:
+        connection.execute(insert(TokenRevocation).values(user_id=user_id, revoked_at=time.time()))
+    assert client.get('/admin-only', headers=headers).status_code == 200
+    app.config['TOKEN_REVOCATION_REFRESH_SECONDS'] = 0
+    assert client.get('/admin-only', headers=headers).status_code == 401
+
+    # A restarted worker starts from the database.
+    with mock.patch.object(token_revocation, '_revoked_at', {}), \
+            mock.patch.object(token_revocation, '_loaded_at', None):
+        assert client.get('/admin-only', headers=headers).status_code == 401
+
+def test_delete_user_revokes_tokens(app, client):
+    client.post(f'{BASE_URL}register', json={'email': 'user@example.com', 'password': 'secret'})
+    token = login(client, 'user@example.com', 'secret')
+    headers = {'Authorization': f'Bearer {token}'}
+    assert client.get('/users-only', headers=headers).status_code == 200
+
+    assert client.delete(f"{BASE_URL}{decode_token(token)['sub']}").status_code == 204
+    assert client.get('/users-only', headers=headers).status_code == 401
+    assert db.session.get(TokenRevocation, int(decode_token(token)['sub'])) is not None
+
+def test_login_rehashes_password_when_cost_changes(app, client):
+    user = User.query.filter_by(email='admin@example.com').first()
+    user.password = generate_password_hash('password', method='pbkdf2:sha256:2000')
+    db.session.commit()
+
+    login(client)
+    db.session.expire_all()
+    user = User.query.filter_by(email='admin@example.com').first()
+    assert user.password.startswith(f"{password_hasher.method}$")
+    assert not password_hasher.needs_rehash(user.password)
+
+def test_login_rejected_when_hashing_pool_saturated(client):
+    slots = threading.BoundedSemaphore(1)
+    slots.acquire()
+    with mock.patch.object(password_hasher, '_slots', slots):
+        response = client.post(f'{BASE_URL}login', json={'email': 'admin@example.com', 'password': 'password'})
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '1'
+
+def test_password_hasher_process_pool():
+    hasher = PasswordHasher()
+    hasher.configure(iterations=1000, workers=1, max_pending=4)
+    pwhash = hasher.hash('secret')
+    assert pwhash.startswith('pbkdf2:sha256:1000$')
+    assert hasher.verify(pwhash, 'secret')
+    assert not hasher.verify(pwhash, 'wrong')
+    assert hasher.queue_depth == 0
+
+def test_register_duplicate_email(client):
+    payload = {'email': 'user@example.com', 'password': 'password'}
+    assert client.post(f'{BASE_URL}register', json=payload).status_code == 201
+    response = client.post(f'{BASE_URL}register', json=payload)
+    assert response.status_code == 500
+    assert response.get_json()['error'] == "User already exists"